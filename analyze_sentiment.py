@@ -2,29 +2,83 @@
 基于LLM的小红书评论情感分析脚本
 用于从评论中挖掘"最适合干皮的粉底液"推荐
 """
-import pandas as pd
+from __future__ import annotations
 import json
 import time
 import os
+import re
 import math
+import hashlib
+from collections import Counter
 from loguru import logger
-from typing import List, Dict, Optional
-from openai import OpenAI
+from typing import List, Dict, Optional, TYPE_CHECKING
 from dotenv import load_dotenv
+from xhs_utils.alias_util import ProductNormalizer
+from xhs_utils.relevance_util import RelevanceFilter, CharNgramModel
+from xhs_utils.llm_metrics_util import AnalysisMetrics, BudgetExceeded
+from xhs_utils.journal_util import ResultJournal
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # 加载环境变量
 load_dotenv()
 
+CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算token数：中文字符按1个token，其余字符按4个字符1个token
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    截取不超过 max_tokens（按 estimate_tokens 估算）的最长前缀
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+class LLMParseError(Exception):
+    """
+    LLM的回复无法解析为预期的JSON
+    """
+    pass
+
 
 class CommentAnalyzer:
     """评论分析器，使用LLM进行语义分析"""
     
-    def __init__(self, api_key: str = None, base_url: str = None, model: str = "deepseek-chat"):
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = "deepseek-chat", prefilter: bool = True,
+                 relevance_model: str = None, relevance_threshold: float = 0.5, llm_cache_path: str = None,
+                 max_tokens: int = None, max_cost: float = None, prompt_price: float = 0.0, completion_price: float = 0.0):
         """
         初始化分析器
         :param api_key: API密钥，如果为None则从环境变量读取
         :param base_url: API基础URL，如果为None则从环境变量读取
         :param model: 模型名称（默认：deepseek-chat，使用OpenAI网关时建议用gpt-3.5-turbo）
+        :param prefilter: 是否在调用LLM前过滤无关对话（表情/@/求链接、未提及产品或肤质关键词）
+        :param relevance_model: 相关性线性模型路径（bench_relevance.py --save-model 生成），不提供则只用规则和关键词
+        :param relevance_threshold: 相关性模型阈值，低于阈值的对话跳过
+        :param llm_cache_path: LLM回复缓存文件（JSONL），相同请求重复运行时不再调用API；为None时只在内存中缓存
+        :param max_tokens: token预算上限，达到后停止调用LLM并用已有结果生成报告
+        :param max_cost: 费用预算上限（元），需要同时设置价格
+        :param prompt_price: 输入token价格（元/百万token）
+        :param completion_price: 输出token价格（元/百万token）
         """
         self.api_key = api_key or os.getenv('DEEPSEEK_API_KEY') or os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_HK_API_KEY')
         # 优先使用环境变量中的base_url，否则根据api_key判断
@@ -52,7 +106,40 @@ class CommentAnalyzer:
         if not self.api_key:
             raise ValueError("请设置API_KEY环境变量或在初始化时传入api_key参数")
         
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # openai 和 pandas 导入较慢，第一次调用LLM时才创建客户端
+        self._client = None
+        
+        # 本地别称表：LLM返回后统一产品名，调用前预过滤无关对话
+        self.normalizer = ProductNormalizer()
+        self.prefilter = prefilter
+        self.relevance_filter = RelevanceFilter(
+            normalizer=self.normalizer,
+            model=CharNgramModel.load(relevance_model) if relevance_model else None,
+            threshold=relevance_threshold,
+        )
+        self.skipped_groups = []  # 被预过滤跳过的对话 [{root_id, reason, score, preview}]
+        
+        # 调用统计与预算
+        self.metrics = AnalysisMetrics(max_tokens=max_tokens, max_cost=max_cost, prompt_price=prompt_price, completion_price=completion_price)
+        if max_cost is not None and not (prompt_price or completion_price):
+            logger.warning("设置了费用预算但没有设置token价格，费用预算不会生效")
+        
+        # LLM回复缓存 {请求哈希: 回复文本}
+        self.llm_cache = {}
+        self.llm_cache_path = llm_cache_path
+        if llm_cache_path and os.path.exists(llm_cache_path):
+            with open(llm_cache_path, mode='r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        if item['content'] is None:
+                            # forget_cached 写入的作废记录
+                            self.llm_cache.pop(item['key'], None)
+                        else:
+                            self.llm_cache[item['key']] = item['content']
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+            logger.info(f"已加载 {len(self.llm_cache)} 条LLM缓存: {llm_cache_path}")
         
         # 系统Prompt - 改进版：更强调上下文理解和产品识别
         self.system_prompt = """你是一个专业的美妆数据分析师。我将给你一段小红书的评论对话（包含主评论和回复）。
@@ -74,17 +161,7 @@ class CommentAnalyzer:
 2. **产品别称识别（关键！）**：
    - 必须识别产品的多种别称和简称，并统一为标准产品名
    - 常见别称映射：
-     * "菁纯"、"兰蔻菁纯" → "兰蔻菁纯"
-     * "沁水"、"雅诗兰黛沁水"、"DW沁水" → "雅诗兰黛沁水"
-     * "DW"、"double wear"、"雅诗兰黛DW" → "雅诗兰黛DW"
-     * "虫草"、"bobbi brown虫草"、"BB虫草" → "芭比波朗虫草"
-     * "超方瓶"、"Nars超方瓶" → "Nars超方瓶"
-     * "蓝标"、"阿玛尼蓝标"、"大师"、"阿玛尼大师" → "阿玛尼蓝标"
-     * "果冻"、"香奈儿果冻" → "香奈儿果冻"
-     * "持妆"、"兰蔻持妆" → "兰蔻持妆"
-     * "红地球"、"red earth" → "红地球"
-     * "zelens" → "Zelens"
-     * "植村秀"、"植村秀小方瓶" → "植村秀小方瓶"
+{product_aliases}
    - 如果评论只提到简称（如"菁纯"），必须识别出完整产品名（如"兰蔻菁纯"）
    - 如果上下文中有完整产品名，简称应映射到该完整产品名
 
@@ -119,6 +196,18 @@ class CommentAnalyzer:
 - 如果用户只说"菁纯"但上下文没有明确品牌，根据对话语境判断（通常指"兰蔻菁纯"）
 - 如果回复只是"确实"、"+1"等，必须根据被回复的内容确定产品
 - 如果对话中没有提到任何产品或与干皮无关，输出 {"products": []}。"""
+        self.system_prompt = self.system_prompt.replace('{product_aliases}', self.normalizer.format_prompt_aliases())
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
 
     def group_comments_by_conversation(self, df: pd.DataFrame) -> Dict[str, List[Dict]]:
         """
@@ -137,6 +226,7 @@ class CommentAnalyzer:
             'like_count': None,
             'upload_time': None,
             'note_id': None,
+            'thread_position': None,
         }
         
         # 中文列名映射
@@ -149,6 +239,7 @@ class CommentAnalyzer:
             '点赞数量': 'like_count',
             '上传时间': 'upload_time',
             '笔记id': 'note_id',
+            '楼内序号': 'thread_position',
         }
         
         # 检测实际列名
@@ -166,8 +257,10 @@ class CommentAnalyzer:
             for root_id in df[root_col].unique():
                 group = df[df[root_col] == root_id].copy()
                 
-                # 如果有时间列，按时间排序
-                if col_mapping['upload_time']:
+                # 有楼内序号时按序号排序（与接口返回的顺序一致），否则按时间排序
+                if col_mapping['thread_position']:
+                    group = group.sort_values(col_mapping['thread_position'])
+                elif col_mapping['upload_time']:
                     group = group.sort_values(col_mapping['upload_time'])
                 
                 # 构建评论映射 {comment_id: comment_data}
@@ -321,13 +414,12 @@ class CommentAnalyzer:
         
         return conversations
 
-    def analyze_conversation(self, conversation: List[Dict]) -> List[Dict]:
+    def build_conversation_text(self, conversation: List[Dict]):
         """
-        使用LLM分析一段对话
+        构建发送给LLM的对话文本（明确标注回复关系，帮助LLM理解上下文）
         :param conversation: 对话列表，包含主评论和回复
-        :return: 分析结果列表
+        :return: 对话文本, 对话总点赞数
         """
-        # 构建对话文本（明确标注回复关系，帮助LLM理解上下文）
         conversation_text = ""
         total_likes = 0
         
@@ -354,61 +446,137 @@ class CommentAnalyzer:
                     # 后续是回复
                     conversation_text += f"[回复{i}] {nickname}: {content}\n"
         
+        return conversation_text, total_likes
+
+    def chat_completion(self, messages: List[Dict], temperature: float = 0.3, purpose: str = 'conversation') -> str:
+        """
+        调用LLM并返回回复文本，相同请求命中缓存时不再调用API
+        每次调用的token、耗时、重试和缓存命中都记录到 self.metrics
+        :param messages: 消息列表
+        :param temperature: 温度
+        :param purpose: 调用用途，用于分类统计
+        :return: 回复文本
+        """
+        cache_key = self._cache_key(messages, temperature)
+        if cache_key in self.llm_cache:
+            self.metrics.record_call(purpose, cache_hit=True)
+            return self.llm_cache[cache_key]
+        
+        estimated_prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        self.metrics.check_budget(estimated_prompt_tokens)
+        start, retries = time.perf_counter(), 0
+        try:
+            response, retries = self._create_completion(messages, temperature)
+        except Exception as e:
+            self.metrics.record_call(purpose, latency=time.perf_counter() - start, retries=retries, error=str(e)[:200])
+            raise
+        latency = time.perf_counter() - start
+        
+        content = response.choices[0].message.content
+        usage = getattr(response, 'usage', None)
+        self.metrics.record_call(
+            purpose,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None) or estimated_prompt_tokens,
+            completion_tokens=getattr(usage, 'completion_tokens', None) or estimate_tokens(content),
+            latency=latency,
+            retries=retries,
+        )
+        self.llm_cache[cache_key] = content
+        if self.llm_cache_path:
+            with open(self.llm_cache_path, mode='a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': cache_key, 'content': content}, ensure_ascii=False) + '\n')
+        return content
+
+    def _cache_key(self, messages: List[Dict], temperature: float) -> str:
+        return hashlib.sha256(json.dumps([self.model, temperature, messages], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def forget_cached(self, messages: List[Dict], temperature: float = 0.3):
+        """
+        作废一条缓存的回复（如无法解析），下次相同请求重新调用API
+        """
+        cache_key = self._cache_key(messages, temperature)
+        if self.llm_cache.pop(cache_key, None) is not None and self.llm_cache_path:
+            with open(self.llm_cache_path, mode='a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': cache_key, 'content': None}) + '\n')
+
+    def _create_completion(self, messages: List[Dict], temperature: float):
+        """
+        调用chat completions接口，返回 response, 重试次数
+        """
+        # 某些网关可能需要完整的URL路径，尝试添加/v1
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+            )
+        except Exception as e:
+            # 如果失败，尝试在base_url后添加/v1
+            if "404" in str(e) or "ENDPOINT" in str(e).upper():
+                logger.warning(f"API端点错误，尝试使用完整路径: {e}")
+                # 临时修改base_url
+                original_base_url = self.client.base_url
+                if not str(original_base_url).rstrip('/').endswith('/v1'):
+                    self.client.base_url = str(original_base_url).rstrip('/') + '/v1'
+                try:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                    )
+                finally:
+                    # 恢复原始base_url
+                    self.client.base_url = original_base_url
+                return response, 1
+            raise
+        return response, 0
+
+    def parse_json_content(self, raw_content: str):
+        """
+        解析LLM返回的JSON，兼容markdown代码块和前后夹杂的说明文字
+        :param raw_content: LLM回复文本
+        :return: 解析后的对象，失败返回None
+        """
+        # 清洗可能存在的markdown符号
+        raw_content = raw_content or ''
+        if '```' in raw_content:
+            self.metrics.markdown_stripped += 1
+        clean_content = raw_content.replace('```json', '').replace('```', '').strip()
+        
+        # 解析JSON
+        try:
+            return json.loads(clean_content)
+        except json.JSONDecodeError:
+            # 如果直接解析失败，尝试提取JSON部分
+            self.metrics.regex_fallbacks += 1
+            json_match = re.search(r'\{.*\}', clean_content, re.DOTALL)
+            if json_match:
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    pass
+            self.metrics.parse_failures += 1
+            logger.warning(f"无法解析LLM返回的JSON: {clean_content[:200]}")
+            return None
+
+    def analyze_conversation(self, conversation: List[Dict], raise_errors: bool = False) -> List[Dict]:
+        """
+        使用LLM分析一段对话
+        :param conversation: 对话列表，包含主评论和回复
+        :param raise_errors: 调用出错或回复无法解析时是否抛出异常（默认记录日志并返回空列表）
+        :return: 分析结果列表
+        """
+        conversation_text, total_likes = self.build_conversation_text(conversation)
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"分析以下对话：\n{conversation_text}"}
+        ]
+        
         # 调用LLM API
         try:
-            # 某些网关可能需要完整的URL路径，尝试添加/v1
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self.system_prompt},
-                        {"role": "user", "content": f"分析以下对话：\n{conversation_text}"}
-                    ],
-                    temperature=0.3,  # 降低随机性，提高一致性
-                )
-            except Exception as e:
-                # 如果失败，尝试在base_url后添加/v1
-                if "404" in str(e) or "ENDPOINT" in str(e).upper():
-                    logger.warning(f"API端点错误，尝试使用完整路径: {e}")
-                    # 临时修改base_url
-                    original_base_url = self.client.base_url
-                    if not original_base_url.endswith('/v1'):
-                        self.client.base_url = original_base_url.rstrip('/') + '/v1'
-                    try:
-                        response = self.client.chat.completions.create(
-                            model=self.model,
-                            messages=[
-                                {"role": "system", "content": self.system_prompt},
-                                {"role": "user", "content": f"分析以下对话：\n{conversation_text}"}
-                            ],
-                            temperature=0.3,
-                        )
-                        # 恢复原始base_url
-                        self.client.base_url = original_base_url
-                    except Exception as e2:
-                        # 恢复原始base_url
-                        self.client.base_url = original_base_url
-                        raise e2
-                else:
-                    raise
-            
-            raw_content = response.choices[0].message.content
+            raw_content = self.chat_completion(messages, temperature=0.3)  # 降低随机性，提高一致性
             
-            # 清洗可能存在的markdown符号
-            clean_content = raw_content.replace('```json', '').replace('```', '').strip()
-            
-            # 解析JSON
-            try:
-                ai_analysis = json.loads(clean_content)
-            except json.JSONDecodeError:
-                # 如果直接解析失败，尝试提取JSON部分
-                import re
-                json_match = re.search(r'\{.*\}', clean_content, re.DOTALL)
-                if json_match:
-                    ai_analysis = json.loads(json_match.group())
-                else:
-                    logger.warning(f"无法解析LLM返回的JSON: {clean_content[:200]}")
-                    return []
+            ai_analysis = self.parse_json_content(raw_content)
             
             # 提取products列表
             if isinstance(ai_analysis, dict):
@@ -416,7 +584,12 @@ class CommentAnalyzer:
             elif isinstance(ai_analysis, list):
                 products = ai_analysis
             else:
-                logger.warning(f"LLM返回格式异常: {type(ai_analysis)}")
+                if ai_analysis is not None:
+                    logger.warning(f"LLM返回格式异常: {type(ai_analysis)}")
+                # 不让无法解析的回复留在缓存里，续跑时重新调用
+                self.forget_cached(messages, temperature=0.3)
+                if raise_errors:
+                    raise LLMParseError('LLM回复无法解析')
                 return []
             
             # 为每个产品添加对话的元信息
@@ -432,6 +605,8 @@ class CommentAnalyzer:
                     
                     results.append({
                         **product_info,
+                        'root_id': conversation[0].get('root_id', '') if conversation else '',
+                        'product': self.normalizer.canonicalize(product_info.get('product', '')),
                         'features': features_str,  # 特征描述（字符串格式）
                         'conversation_likes': total_likes,
                         'conversation_size': len(conversation),
@@ -441,6 +616,8 @@ class CommentAnalyzer:
             
             return results
             
+        except (BudgetExceeded, LLMParseError):
+            raise
         except Exception as e:
             error_str = str(e)
             # 检查是否是认证错误
@@ -456,6 +633,8 @@ class CommentAnalyzer:
             else:
                 logger.error(f"分析对话时出错: {e}")
                 logger.error(f"对话内容: {conversation_text[:200]}")
+                if raise_errors:
+                    raise RuntimeError(error_str) from e
             return []
 
     def calculate_recommendation_score(self, results_df: pd.DataFrame) -> pd.DataFrame:
@@ -463,6 +642,7 @@ class CommentAnalyzer:
         计算推荐指数
         公式: Score = (基础分 + 情感分) × (1 + 互动权重 × log(点赞数 + 1))
         """
+        import pandas as pd
         # 情感分映射
         sentiment_scores = {
             'Positive': 2,
@@ -533,13 +713,93 @@ class CommentAnalyzer:
         
         return ranking_df, results_df  # 返回results_df用于后续特征提取
 
-    def analyze_excel(self, excel_path: str, output_path: str = None, delay: float = 0.5):
+    def extract_product_features(self, ranking_df: pd.DataFrame, results_df: pd.DataFrame, top_n: int = 5,
+                                 delay: float = 0.5, max_context_tokens: int = 800, top_features: int = 8) -> pd.DataFrame:
+        """
+        提取产品特征描述
+        1. 所有产品：本地统计每行 features 中的特征词频，填充"产品特征"列，不调用LLM
+        2. 前top_n个产品：合并成一次LLM请求生成"特征总结"，每个产品附带的原始对话受token预算限制
+        :param ranking_df: 推荐排名
+        :param results_df: 详细分析结果
+        :param top_n: 需要LLM总结的产品数量
+        :param delay: 调用LLM前的等待时间（秒）
+        :param max_context_tokens: 每个产品附带的原始对话token上限
+        :param top_features: 每个产品保留的高频特征数量
+        :return: 填充了特征的推荐排名
+        """
+        import pandas as pd
+        ranking_df = ranking_df.copy()
+        if ranking_df.empty:
+            return ranking_df
+        
+        # 本地词频统计
+        feature_counters = {}
+        for product, features in zip(results_df['product'], results_df.get('features', pd.Series([''] * len(results_df)))):
+            counter = feature_counters.setdefault(product, Counter())
+            for feature in re.split(r'[、,，;；/]', str(features) if isinstance(features, str) else ''):
+                feature = feature.strip()
+                if feature:
+                    counter[feature] += 1
+        ranking_df['产品特征'] = [
+            '、'.join(f"{feature}({count})" for feature, count in feature_counters.get(product, Counter()).most_common(top_features))
+            for product in ranking_df['产品']
+        ]
+        
+        # 前top_n个产品：一次批量LLM请求
+        top_products = list(ranking_df['产品'].head(top_n))
+        if not top_products:
+            return ranking_df
+        sections = []
+        for product in top_products:
+            rows = results_df[results_df['product'] == product]
+            if 'conversation_likes' in rows.columns:
+                rows = rows.sort_values('conversation_likes', ascending=False)
+            excerpts, used_tokens, seen = [], 0, set()
+            for text in rows.get('full_conversation', pd.Series(dtype=str)):
+                if not isinstance(text, str) or text in seen:
+                    continue
+                seen.add(text)
+                tokens = estimate_tokens(text)
+                if used_tokens + tokens > max_context_tokens:
+                    if excerpts:
+                        continue
+                    # 第一段对话就超出预算时截断，不让产品没有任何对话上下文
+                    text = truncate_to_tokens(text, max_context_tokens - used_tokens)
+                    tokens = estimate_tokens(text)
+                    if not text.strip():
+                        continue
+                excerpts.append(text.strip())
+                used_tokens += tokens
+            top_counts = '、'.join(f"{feature}({count})" for feature, count in feature_counters.get(product, Counter()).most_common(top_features))
+            sections.append(f"## {product}\n高频特征（括号内为提及次数）：{top_counts or '无'}\n相关对话：\n" + '\n---\n'.join(excerpts))
+        
+        messages = [
+            {"role": "system", "content": "你是一个专业的美妆数据分析师。根据每个粉底液产品的高频特征和用户对话，为每个产品写一句不超过60字的特征总结（质地、遮瑕度、持久度、妆效、是否适合干皮）。"
+                                          "只输出JSON，格式为 {\"产品名\": \"特征总结\"}，产品名必须与输入完全一致。"},
+            {"role": "user", "content": '\n\n'.join(sections)},
+        ]
+        try:
+            time.sleep(delay)
+            summaries = self.parse_json_content(self.chat_completion(messages, temperature=0.3, purpose='feature_summary'))
+        except Exception as e:
+            logger.error(f"生成产品特征总结失败，仅保留本地统计的特征: {e}")
+            summaries = None
+        if isinstance(summaries, dict):
+            ranking_df['特征总结'] = [str(summaries.get(product, '')) if product in top_products else '' for product in ranking_df['产品']]
+        
+        return ranking_df
+
+    def analyze_excel(self, excel_path: str, output_path: str = None, delay: float = 0.5, resume: bool = False, journal_path: str = None):
         """
         分析Excel文件中的评论
+        每组对话分析完立即追加到结果日志（*_journal.jsonl），评分和输出都基于日志生成
         :param excel_path: Excel文件路径
         :param output_path: 输出文件路径
         :param delay: API调用间隔（秒），避免速率限制
+        :param resume: 是否从结果日志继续上一次中断的运行，已记录的对话不再调用LLM
+        :param journal_path: 结果日志路径，默认与输出文件同名（*_journal.jsonl）
         """
+        import pandas as pd
         logger.info(f"开始读取Excel文件: {excel_path}")
         df = pd.read_excel(excel_path)
         
@@ -571,9 +831,37 @@ class CommentAnalyzer:
         conversations = self.group_comments_by_conversation(df)
         logger.info(f"共识别 {len(conversations)} 组对话")
         
+        if output_path is None:
+            base_name = os.path.splitext(excel_path)[0]
+            output_path = f"{base_name}_analysis_result.xlsx"
+        
+        # 结果日志：续跑时跳过已记录的对话，否则重新开始
+        journal = ResultJournal(journal_path or f"{os.path.splitext(output_path)[0]}_journal.jsonl")
+        if resume:
+            finished = journal.load()
+            logger.info(f"从结果日志继续: {journal.path}，已完成 {len(finished)} 组对话")
+        else:
+            journal.reset()
+            finished = {}
+        self.metrics.conversations_total = len(conversations)
+        for root_id in list(conversations.keys()):
+            if root_id in finished:
+                del conversations[root_id]
+        
+        # 预过滤：表情/@/求链接等无关对话不调用LLM，跳过原因写入日志
+        if self.prefilter:
+            for root_id in list(conversations.keys()):
+                keep, reason, score = self.relevance_filter.check(conversations[root_id])
+                if not keep:
+                    journal.append(root_id, status='skipped', reason=reason, score=round(score, 4),
+                                   preview=' / '.join(c.get('content', '') for c in conversations[root_id])[:100])
+                    del conversations[root_id]
+                    self.metrics.conversations_skipped += 1
+            logger.info(f"预过滤跳过 {self.metrics.conversations_skipped} 组无关对话，剩余 {len(conversations)} 组需要调用LLM")
+        
         # 分析每段对话
-        all_results = []
         total = len(conversations)
+        failed = 0
         
         logger.info("开始调用LLM进行分析...")
         try:
@@ -581,18 +869,45 @@ class CommentAnalyzer:
                 if idx % 10 == 0:
                     logger.info(f"进度: {idx}/{total} ({idx/total*100:.1f}%)")
                 
-                results = self.analyze_conversation(conversation)
-                all_results.extend(results)
+                try:
+                    results = self.analyze_conversation(conversation, raise_errors=True)
+                except (BudgetExceeded, ValueError):
+                    raise
+                except Exception:
+                    # 调用失败或回复无法解析的对话不写日志，续跑时会重新分析
+                    failed += 1
+                    continue
+                journal.append(root_id, results)
+                self.metrics.conversations_analyzed += 1
                 
                 # 避免API速率限制
                 time.sleep(delay)
+        except KeyboardInterrupt:
+            logger.warning(f"分析被中断，已完成的结果保存在 {journal.path}，使用 --resume 继续")
+            self.metrics.stopped_reason = 'KeyboardInterrupt'
+            self.save_metrics(output_path)
+            raise
+        except BudgetExceeded as e:
+            # 预算用尽：停止调用LLM，用已有结果继续生成报告
+            logger.warning(f"分析提前结束：{e}，已分析 {self.metrics.conversations_analyzed}/{total} 组对话")
+            self.metrics.stopped_reason = str(e)
         except ValueError as e:
             # 如果是认证错误，直接抛出，不继续处理
-            logger.error("分析中断：API认证失败")
+            logger.error(f"分析中断：API认证失败，已完成的结果保存在 {journal.path}，使用 --resume 继续")
+            self.metrics.stopped_reason = str(e)
+            self.save_metrics(output_path)
             raise
+        if failed:
+            logger.warning(f"{failed} 组对话调用失败，可使用 --resume 重新分析")
+        
+        # 后续评分和输出都基于结果日志，而不是内存中的结果
+        entries = journal.load()
+        all_results = journal.results(entries)
+        self.skipped_groups = journal.skipped(entries)
         
         if not all_results:
             logger.warning("没有分析出任何结果，请检查数据或API配置")
+            self.save_metrics(output_path)
             return None
         
         # 转换为DataFrame
@@ -607,15 +922,14 @@ class CommentAnalyzer:
         ranking_df = self.extract_product_features(ranking_df, results_df, top_n=5, delay=delay)
         
         # 保存结果
-        if output_path is None:
-            base_name = os.path.splitext(excel_path)[0]
-            output_path = f"{base_name}_analysis_result.xlsx"
-        
         with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
             ranking_df.to_excel(writer, sheet_name='推荐排名', index=False)
             results_df.to_excel(writer, sheet_name='详细分析', index=False)
+            if self.skipped_groups:
+                pd.DataFrame(self.skipped_groups).to_excel(writer, sheet_name='跳过对话', index=False)
         
         logger.info(f"分析完成！结果已保存至: {output_path}")
+        self.save_metrics(output_path)
         
         # 打印前10名
         print("\n" + "="*60)
@@ -626,6 +940,20 @@ class CommentAnalyzer:
         
         return ranking_df, results_df
 
+    def save_metrics(self, output_path: str):
+        """
+        把本次运行的调用统计写到结果文件旁边（*_metrics.json）
+        :param output_path: 结果Excel路径
+        :return: 统计文件路径
+        """
+        metrics_path = f"{os.path.splitext(output_path)[0]}_metrics.json"
+        summary = self.metrics.summary()
+        with open(metrics_path, mode='w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'calls': self.metrics.to_records()}, f, ensure_ascii=False, indent=2)
+        logger.info(f"调用统计: {summary['api_calls']} 次API调用, {summary['cache_hits']} 次缓存命中, "
+                    f"{summary['total_tokens']} tokens, 约 {summary['cost']:.4f} 元, LLM耗时 {summary['latency_total']}s -> {metrics_path}")
+        return metrics_path
+
 
 def main():
     """主函数"""
@@ -638,6 +966,16 @@ def main():
     parser.add_argument('--base-url', help='API基础URL（可选，默认DeepSeek）')
     parser.add_argument('--model', default='deepseek-chat', help='模型名称（默认：deepseek-chat）')
     parser.add_argument('--delay', type=float, default=0.5, help='API调用间隔（秒，默认0.5）')
+    parser.add_argument('--no-prefilter', action='store_true', help='关闭预过滤，所有对话都调用LLM')
+    parser.add_argument('--relevance-model', help='相关性模型路径（可选，bench_relevance.py --save-model 生成）')
+    parser.add_argument('--relevance-threshold', type=float, default=0.5, help='相关性模型阈值（默认0.5）')
+    parser.add_argument('--resume', action='store_true', help='从结果日志继续上一次中断的分析，已完成的对话不再调用LLM')
+    parser.add_argument('--journal', help='结果日志路径（可选，默认：输出文件名_journal.jsonl）')
+    parser.add_argument('--llm-cache', help='LLM回复缓存文件路径（可选，重复运行时命中缓存不再调用API）')
+    parser.add_argument('--max-tokens', type=int, help='token预算上限（可选，达到后停止调用LLM并用已有结果生成报告）')
+    parser.add_argument('--max-cost', type=float, help='费用预算上限，元（可选，需要同时设置价格）')
+    parser.add_argument('--prompt-price', type=float, default=0.0, help='输入token价格，元/百万token')
+    parser.add_argument('--completion-price', type=float, default=0.0, help='输出token价格，元/百万token')
     
     args = parser.parse_args()
     
@@ -645,13 +983,23 @@ def main():
         analyzer = CommentAnalyzer(
             api_key=args.api_key,
             base_url=args.base_url,
-            model=args.model
+            model=args.model,
+            prefilter=not args.no_prefilter,
+            relevance_model=args.relevance_model,
+            relevance_threshold=args.relevance_threshold,
+            llm_cache_path=args.llm_cache,
+            max_tokens=args.max_tokens,
+            max_cost=args.max_cost,
+            prompt_price=args.prompt_price,
+            completion_price=args.completion_price
         )
         
         analyzer.analyze_excel(
             excel_path=args.input,
             output_path=args.output,
-            delay=args.delay
+            delay=args.delay,
+            resume=args.resume,
+            journal_path=args.journal
         )
         
     except Exception as e:
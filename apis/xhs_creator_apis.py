@@ -1,54 +1,126 @@
+import http.cookiejar
+import math
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from xhs_utils import json_util
 from xhs_utils.cookie_util import trans_cookies
+from xhs_utils.metrics_util import IN_FLIGHT, observe_request
+from xhs_utils.trace_util import cookie_id
 from xhs_utils.xhs_creator_util import get_common_headers, generate_xs, splice_str
-from xhs_utils.xhs_util import generate_x_b3_traceid
 
+# 笔记管理中“所有笔记”标签，notes_count 为发布的笔记总数
+ALL_NOTES_TAG = 'special.note_time_desc'
 
-class XHS_Creator_Apis():
-    def __init__(self):
-        self.base_url = "https://edith.xiaohongshu.com"
 
+class XHS_Creator_Apis():
+    def __init__(self, base_url: str = "https://edith.xiaohongshu.com", session: requests.Session = None, timeout: float = 10.0):
+        """
+        :param base_url: 接口域名，压测时可以指向本地模拟服务（benchmarks/mock_xhs_server.py）
+        :param session: 复用连接的会话，默认每个实例一个，多个创作者账号共用同一个实例即可
+        :param timeout: 每个请求的超时时间（秒）
+        """
+        self.base_url = base_url
+        self.session = session or requests.Session()
+        # cookie由每次请求显式传入，不让会话记住响应里的Set-Cookie，避免多个账号之间串cookie
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.timeout = timeout
 
-    # page: 页数
-    # time: 最近几天的时间
+    # page: 页数，None 为第一页
     def get_publish_note_info(self, page, cookies_str):
         success = False
         msg = '成功'
         res_json = None
-
+        api = "/web_api/sns/v5/creator/note/user/posted"
+        start = time.perf_counter()
+        IN_FLIGHT.inc(endpoint=api)
         try:
-            api = "/web_api/sns/v5/creator/note/user/posted"
             params = {
                 "tab": '0',
             }
-            if page >= 0:
+            if page is not None and page >= 0:
                 params["page"] = str(page)
             splice_api = splice_str(api, params)
             headers = get_common_headers()
             cookies = trans_cookies(cookies_str)
             xs, xt, _ = generate_xs(cookies['a1'], splice_api, '')
             headers['x-s'], headers['x-t'] = xs, str(xt)
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, verify=False)
-            res_json = response.json()
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, timeout=self.timeout)
+            res_json = json_util.loads(response.content)
             success = res_json["success"]
+            if not success:
+                msg = res_json.get("msg", "")
         except Exception as e:
             success, msg = False, str(e)
+        finally:
+            IN_FLIGHT.dec(endpoint=api)
+            observe_request(api, success, msg, time.perf_counter() - start, cookie_id(cookies_str))
         return success, msg, res_json
 
+    @staticmethod
+    def _notes_count(data: dict):
+        """
+        :return: 发布的笔记总数，返回中没有时为None
+        """
+        for tag in data.get('tags') or ():
+            if tag.get('id') == ALL_NOTES_TAG and tag.get('notes_count') is not None:
+                return int(tag['notes_count'])
+        return None
 
     # 获取全部的发布信息
-    def get_all_publish_note_info(self, cookies_str):
-        page = None
-        notes = []
-        while True:
+    def get_all_publish_note_info(self, cookies_str, known_ids=None, concurrency: int = 4):
+        """
+            获取全部发布的笔记（最新的在前）
+            第一页返回笔记总数时，其余的页并发请求；否则按返回的下一页页码逐页请求
+            :param known_ids: 已同步过的笔记id，传入时为增量同步：从最新的往前逐页请求，读到已同步过的笔记就停止，只返回新笔记
+            :param concurrency: 同时请求的页数
+            返回 (success, msg, 笔记列表)，失败时笔记列表为失败前已获取的部分
+        """
+        success, msg, res_json = self.get_publish_note_info(None, cookies_str)
+        if not success:
+            return False, msg, []
+        data = res_json['data']
+        notes = list(data['notes'])
+        page = data.get('page', -1)
+        if known_ids is not None:
+            known_ids = set(known_ids)
+            new_notes = []
+            while True:
+                for note in notes:
+                    if note['id'] in known_ids:
+                        logger.info(f'增量同步：新笔记 {len(new_notes)} 篇')
+                        return True, '成功', new_notes
+                    new_notes.append(note)
+                if page == -1 or not notes:
+                    return True, '成功', new_notes
+                success, msg, res_json = self.get_publish_note_info(page, cookies_str)
+                if not success:
+                    return False, msg, new_notes
+                notes, page = res_json['data']['notes'], res_json['data'].get('page', -1)
+
+        total = self._notes_count(data)
+        if page != -1 and total is not None and notes:
+            # 页数已知，剩下的页并发请求，按页码顺序拼接
+            pages = math.ceil(total / len(notes))
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                results = list(pool.map(lambda p: self.get_publish_note_info(p, cookies_str), range(page, pages)))
+            for success, msg, res_json in results:
+                if not success:
+                    return False, msg, notes
+                notes += res_json['data']['notes']
+            page = results[-1][2]['data'].get('page', -1) if results else page
+        # 总数未知，或者笔记在请求期间增加了，继续逐页请求
+        while page != -1:
             success, msg, res_json = self.get_publish_note_info(page, cookies_str)
-            print(success, msg, res_json)
             if not success:
                 return False, msg, notes
-            notes += res_json['data']['notes']
-            page = res_json['data']['page']
-            if page == -1:
+            if not res_json['data']['notes']:
                 break
+            notes += res_json['data']['notes']
+            page = res_json['data'].get('page', -1)
+        # 并发请求期间有新发布的笔记时，相邻页之间可能有重复
+        notes = list({note['id']: note for note in notes}.values())
         return True, '成功', notes
 
 
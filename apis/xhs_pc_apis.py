@@ -1,9 +1,17 @@
 # encoding: utf-8
+import functools
+import http.cookiejar
 import json
-import re
+import time
 import urllib
 import requests
-from xhs_utils.xhs_util import splice_str, generate_request_params, generate_x_b3_traceid, get_common_headers
+from xhs_utils import json_util
+from xhs_utils.page_util import Paginator
+from xhs_utils.cache_util import ResponseCache, cache_key
+from xhs_utils.media_util import MediaResolver, no_water_img_url
+from xhs_utils.xhs_util import splice_str, generate_request_params, generate_x_b3_traceid
+from xhs_utils.trace_util import span, cookie_id, proxy_id, is_enabled as is_tracing
+from xhs_utils.metrics_util import IN_FLIGHT, SIGNER_QUEUE, observe_request
 from loguru import logger
 
 """
@@ -11,8 +19,107 @@ from loguru import logger
     :param cookies_str: 你的cookies
 """
 class XHS_Apis():
-    def __init__(self):
-        self.base_url = "https://edith.xiaohongshu.com"
+    def __init__(self, base_url: str = "https://edith.xiaohongshu.com", session: requests.Session = None, cache: ResponseCache = None):
+        """
+        :param base_url: 接口域名，压测时可以指向本地模拟服务（benchmarks/mock_xhs_server.py）
+        :param session: 复用连接的会话，默认每个实例一个（每个worker进程各自的连接池）
+        :param cache: GET接口的响应缓存（xhs_utils/cache_util.py），默认不缓存
+        """
+        self.base_url = base_url
+        self.cache = cache
+        self.session = session or requests.Session()
+        # cookie由每次请求显式传入，不让会话记住响应里的Set-Cookie，避免多个账号之间串cookie
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+    def _request(self, method: str, api: str, cookies_str: str, data='', proxies: dict = None):
+        """
+            签名并发送请求，返回解析后的json
+            开启追踪时（xhs_utils/trace_util.py）记录 签名 / 建连 / 首字节 / 解析 各阶段耗时
+            同时更新运行指标（xhs_utils/metrics_util.py）
+            :param method: GET 或 POST
+            :param api: 接口路径，GET请求需要带上拼接好的参数
+            :param data: POST请求的数据
+            开启缓存时，有效期内的GET请求直接返回缓存，不签名也不发请求
+        """
+        endpoint = api.split('?')[0]
+        cache_endpoint = cache_key_ = None
+        if self.cache is not None and method == 'GET' and self.cache.ttl_for(endpoint):
+            cache_endpoint, cache_key_ = cache_key(api, cookies_str)
+            body = self.cache.get(cache_endpoint, cache_key_)
+            if body is not None:
+                return json_util.loads(body)
+        account, proxy = cookie_id(cookies_str), proxy_id(proxies)
+        attributes = {'endpoint': endpoint, 'method': method, 'cookie_id': account, 'proxy': proxy} if is_tracing() else {}
+        start = time.perf_counter()
+        success, msg = False, ''
+        IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            with span('xhs.request', **attributes) as request_span:
+                SIGNER_QUEUE.inc()
+                try:
+                    with span('sign'):
+                        headers, cookies, trans_data = generate_request_params(cookies_str, api, data, method)
+                finally:
+                    SIGNER_QUEUE.dec()
+                with span('http') as http_span:
+                    if method == 'GET':
+                        response = self.session.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
+                    else:
+                        response = self.session.post(self.base_url + api, headers=headers, data=trans_data.encode('utf-8'), cookies=cookies, proxies=proxies)
+                    http_span.set('ttfb_ms', round(response.elapsed.total_seconds() * 1000, 3))
+                    http_span.set('status_code', response.status_code)
+                    http_span.set('bytes', len(response.content))
+                with span('parse'):
+                    res_json = json_util.loads(response.content)
+                if isinstance(res_json, dict):
+                    success, msg = bool(res_json.get('success')), res_json.get('msg', '')
+                if response.status_code >= 400:
+                    success, msg = False, f'HTTP {response.status_code}: {msg}'
+                request_span.set('msg', msg)
+            if success and cache_key_ is not None:
+                self.cache.put(cache_endpoint, cache_key_, response.content)
+        except Exception as e:
+            msg = str(e)
+            raise
+        finally:
+            IN_FLIGHT.dec(endpoint=endpoint)
+            observe_request(endpoint, success, msg, time.perf_counter() - start, account, proxy)
+        return res_json
+
+    @staticmethod
+    def _collect(pages):
+        """
+            遍历 Paginator 收集全部结果
+            返回 (success, msg, 结果列表)，失败时结果列表为失败前已获取的部分
+        """
+        items = []
+        try:
+            for item in pages:
+                items.append(item)
+            success, msg = True, 'success'
+        except KeyError as e:
+            success = False
+            msg = f"访问数据字段失败: {str(e)}，可能是API返回格式变化"
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, items
+
+    @staticmethod
+    def _cursor_page(success, msg, res_json, key: str, required: bool = True, has_more_default: bool = True):
+        """
+            把一页接口返回转成 Paginator 需要的 (items, next_cursor, has_more)
+            :param key: data 中结果列表的字段
+            :param required: 结果列表字段必须存在，否则缺少时视为没有更多
+            :param has_more_default: 返回中没有 has_more 时的取值
+        """
+        if not success:
+            raise Exception(msg)
+        data = res_json["data"]
+        if not required and key not in data:
+            return [], None, False
+        cursor = data.get("cursor")
+        return data[key], str(cursor) if cursor is not None else None, data.get("has_more", has_more_default)
 
     def get_homefeed_all_channel(self, cookies_str: str, proxies: dict = None):
         """
@@ -22,9 +129,7 @@ class XHS_Apis():
         res_json = None
         try:
             api = "/api/sns/web/v1/homefeed/category"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -62,15 +167,33 @@ class XHS_Apis():
                 ],
                 "need_filter_image": False
             }
-            headers, cookies, trans_data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=trans_data, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('POST', api, cookies_str, data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_homefeed(self, category, cookies_str: str, proxies: dict = None, limit: int = None, prefetch: int = 1):
+        """
+            逐条获取主页推荐的笔记，游标（cursor_score / refresh_type / note_index）自动维护
+            :param category: 频道id，见 get_homefeed_all_channel
+            :param limit: 需要的数量，None 为一直翻页直到没有更多
+            :param prefetch: 预取的页数，0 为用到时才请求下一页（调用方可能随时停止时不浪费请求）
+            返回推荐笔记的迭代器（Paginator），包含重复的笔记，失败时遍历过程中抛出异常
+        """
+        def fetch(cursor):
+            cursor_score, refresh_type, note_index = cursor
+            success, msg, res_json = self.get_homefeed_recommend(category, cursor_score, refresh_type, note_index, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            if "items" not in res_json["data"]:
+                return [], None, False
+            notes = res_json["data"]["items"]
+            return notes, (res_json["data"]["cursor_score"], 3, note_index + 20), True
+
+        return Paginator(fetch, ("", 1, 0), limit=limit, prefetch=prefetch)
+
     def get_homefeed_recommend_by_num(self, category, require_num, cookies_str: str, proxies: dict = None):
         """
             根据数量获取主页推荐的笔记
@@ -79,28 +202,7 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             根据数量返回主页推荐的笔记
         """
-        cursor_score, refresh_type, note_index = "", 1, 0
-        note_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_homefeed_recommend(category, cursor_score, refresh_type, note_index, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                cursor_score = res_json["data"]["cursor_score"]
-                refresh_type = 3
-                note_index += 20
-                if len(note_list) > require_num:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
-        return success, msg, note_list
+        return self._collect(self.iter_homefeed(category, cookies_str, proxies, limit=require_num))
 
     def get_user_info(self, user_id: str, cookies_str: str, proxies: dict = None):
         """
@@ -116,9 +218,7 @@ class XHS_Apis():
                 "target_user_id": user_id
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -134,9 +234,7 @@ class XHS_Apis():
         res_json = None
         try:
             api = f"/api/sns/web/v1/user/selfinfo"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -153,9 +251,7 @@ class XHS_Apis():
         res_json = None
         try:
             api = f"/api/sns/web/v2/user/me"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -182,9 +278,7 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -199,8 +293,6 @@ class XHS_Apis():
            :param cookies_str: 你的cookies
            返回用户的所有笔记
         """
-        cursor = ''
-        note_list = []
         try:
             urlParse = urllib.parse.urlparse(user_url)
             user_id = urlParse.path.split("/")[-1]
@@ -208,22 +300,13 @@ class XHS_Apis():
             kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
             xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
             xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search"
-            while True:
-                success, msg, res_json = self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
         except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+            return False, str(e), []
+
+        def fetch(cursor):
+            return self._cursor_page(*self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), "notes")
+
+        return self._collect(Paginator(fetch, ''))
 
     def get_user_like_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
         """
@@ -245,9 +328,7 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -261,8 +342,6 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             返回用户的所有喜欢笔记
         """
-        cursor = ''
-        note_list = []
         try:
             urlParse = urllib.parse.urlparse(user_url)
             user_id = urlParse.path.split("/")[-1]
@@ -270,23 +349,13 @@ class XHS_Apis():
             kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
             xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
             xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_user"
-            while True:
-                success, msg, res_json = self.get_user_like_note_info(user_id, cursor, cookies_str, xsec_token,
-                                                                      xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
         except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+            return False, str(e), []
+
+        def fetch(cursor):
+            return self._cursor_page(*self.get_user_like_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), "notes")
+
+        return self._collect(Paginator(fetch, ''))
 
     def get_user_collect_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
         """
@@ -308,9 +377,7 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -324,8 +391,6 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             返回用户的所有收藏笔记
         """
-        cursor = ''
-        note_list = []
         try:
             urlParse = urllib.parse.urlparse(user_url)
             user_id = urlParse.path.split("/")[-1]
@@ -333,23 +398,13 @@ class XHS_Apis():
             kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
             xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
             xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search"
-            while True:
-                success, msg, res_json = self.get_user_collect_note_info(user_id, cursor, cookies_str, xsec_token,
-                                                                         xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
         except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, note_list
+            return False, str(e), []
+
+        def fetch(cursor):
+            return self._cursor_page(*self.get_user_collect_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies), "notes")
+
+        return self._collect(Paginator(fetch, ''))
 
     def get_note_info(self, url: str, cookies_str: str, proxies: dict = None):
         """
@@ -379,9 +434,7 @@ class XHS_Apis():
                 "xsec_source": kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search",
                 "xsec_token": kvDist['xsec_token']
             }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('POST', api, cookies_str, data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -403,9 +456,7 @@ class XHS_Apis():
                 "keyword": urllib.parse.quote(word)
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -510,9 +561,7 @@ class XHS_Apis():
                     "avif"
                 ]
             }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('POST', api, cookies_str, data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -533,26 +582,12 @@ class XHS_Apis():
             :param geo: 定位信息 经纬度
             返回搜索的结果
         """
-        page = 1
-        note_list = []
-        try:
-            while True:
-                success, msg, res_json = self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                page += 1
-                if len(note_list) >= require_num or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
-        return success, msg, note_list
+        def fetch(page):
+            success, msg, res_json = self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
+            return self._cursor_page(success, msg, res_json, "items", required=False)
+
+        # 页码翻页，下一页提前并发请求
+        return self._collect(Paginator(fetch, 1, limit=require_num, numbered=True, page_size=20))
 
     def search_user(self, query: str, cookies_str: str, page=1, proxies: dict = None):
         """
@@ -575,9 +610,7 @@ class XHS_Apis():
                     "request_id": "22471139-1723999898524"
                 }
             }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('POST', api, cookies_str, data, proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -592,26 +625,11 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回搜索的结果
         """
-        page = 1
-        user_list = []
-        try:
-            while True:
-                success, msg, res_json = self.search_user(query, cookies_str, page, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "users" not in res_json["data"]:
-                    break
-                users = res_json["data"]["users"]
-                user_list.extend(users)
-                page += 1
-                if len(user_list) >= require_num or not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        if len(user_list) > require_num:
-            user_list = user_list[:require_num]
-        return success, msg, user_list
+        def fetch(page):
+            success, msg, res_json = self.search_user(query, cookies_str, page, proxies)
+            return self._cursor_page(success, msg, res_json, "users", required=False)
+
+        return self._collect(Paginator(fetch, 1, limit=require_num, numbered=True, page_size=15))
 
     def get_note_out_comment(self, note_id: str, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
@@ -632,15 +650,36 @@ class XHS_Apis():
                 "xsec_token": xsec_token
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_note_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            逐条获取笔记的一级评论，处理当前页时下一页已在后台请求
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            返回一级评论的迭代器（Paginator），失败时遍历过程中抛出异常
+        """
+        def fetch(cursor):
+            success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            # 检查返回数据结构
+            if "data" not in res_json:
+                logger.error(f"API返回数据中没有data字段，完整响应: {res_json}")
+                raise Exception("API返回数据格式错误：缺少data字段")
+            if "comments" not in res_json["data"]:
+                # 如果没有comments字段，可能该笔记没有评论
+                logger.info(f"笔记 {note_id} 没有评论或评论功能被关闭")
+                return [], None, False
+            return self._cursor_page(success, msg, res_json, "comments", has_more_default=False)
+
+        return Paginator(fetch, '')
+
     def get_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
             获取笔记的全部一级评论
@@ -648,37 +687,9 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回笔记的全部一级评论
         """
-        cursor = ''
-        note_out_comment_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                # 检查返回数据结构
-                if "data" not in res_json:
-                    logger.error(f"API返回数据中没有data字段，完整响应: {res_json}")
-                    raise Exception("API返回数据格式错误：缺少data字段")
-                if "comments" not in res_json["data"]:
-                    # 如果没有comments字段，可能该笔记没有评论
-                    logger.info(f"笔记 {note_id} 没有评论或评论功能被关闭")
-                    break
-                comments = res_json["data"]["comments"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_out_comment_list.extend(comments)
-                if len(note_out_comment_list) == 0 or not res_json["data"].get("has_more", False):
-                    break
-        except KeyError as e:
-            success = False
-            msg = f"访问数据字段失败: {str(e)}，可能是API返回格式变化"
-            logger.error(f"获取评论时发生KeyError: {e}, note_id: {note_id}")
-        except Exception as e:
-            success = False
-            msg = str(e)
-            logger.error(f"获取评论时发生异常: {e}, note_id: {note_id}")
+        success, msg, note_out_comment_list = self._collect(self.iter_note_out_comment(note_id, xsec_token, cookies_str, proxies))
+        if not success:
+            logger.error(f"获取评论时发生异常: {msg}, note_id: {note_id}")
         return success, msg, note_out_comment_list
 
     def get_note_inner_comment(self, comment: dict, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
@@ -702,9 +713,7 @@ class XHS_Apis():
                 "xsec_token": xsec_token
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -718,47 +727,27 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回笔记的全部二级评论
         """
-        try:
-            if not comment.get('sub_comment_has_more', False):
-                # 确保有sub_comments字段
-                if 'sub_comments' not in comment:
-                    comment['sub_comments'] = []
-                return True, 'success', comment
-            cursor = comment.get('sub_comment_cursor', '')
-            if not cursor:
-                if 'sub_comments' not in comment:
-                    comment['sub_comments'] = []
-                return True, 'success', comment
-            inner_comment_list = []
-            while True:
-                success, msg, res_json = self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                # 检查返回数据中是否有comments字段
-                if "data" not in res_json:
-                    logger.warning(f"获取二级评论API返回数据中没有data字段")
-                    break
-                if "comments" not in res_json["data"]:
-                    break
-                comments = res_json["data"]["comments"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                inner_comment_list.extend(comments)
-                if not res_json["data"].get("has_more", False):
-                    break
-            if 'sub_comments' not in comment:
-                comment['sub_comments'] = []
-            comment['sub_comments'].extend(inner_comment_list)
-        except KeyError as e:
-            success = False
-            msg = f"访问数据字段失败: {str(e)}，可能是API返回格式变化"
-            logger.error(f"获取二级评论时发生KeyError: {e}, comment_id: {comment.get('id', 'unknown')}")
-        except Exception as e:
-            success = False
-            msg = str(e)
-            logger.error(f"获取二级评论时发生异常: {e}, comment_id: {comment.get('id', 'unknown')}")
+        # 确保有sub_comments字段
+        if 'sub_comments' not in comment:
+            comment['sub_comments'] = []
+        cursor = comment.get('sub_comment_cursor', '')
+        if not comment.get('sub_comment_has_more', False) or not cursor:
+            return True, 'success', comment
+
+        def fetch(cursor):
+            success, msg, res_json = self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            # 检查返回数据中是否有comments字段
+            if "data" not in res_json:
+                logger.warning(f"获取二级评论API返回数据中没有data字段")
+                return [], None, False
+            return self._cursor_page(success, msg, res_json, "comments", required=False, has_more_default=False)
+
+        success, msg, inner_comment_list = self._collect(Paginator(fetch, cursor))
+        if not success:
+            logger.error(f"获取二级评论时发生异常: {msg}, comment_id: {comment.get('id', 'unknown')}")
+        comment['sub_comments'].extend(inner_comment_list)
         return success, msg, comment
 
     def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None):
@@ -779,21 +768,18 @@ class XHS_Apis():
             if 'xsec_token' not in kvDist:
                 raise Exception("URL中缺少xsec_token参数")
             
-            success, msg, out_comment_list = self.get_note_all_out_comment(note_id, kvDist['xsec_token'], cookies_str, proxies)
-            if not success:
-                raise Exception(msg)
-            
-            # 如果没有评论，直接返回空列表
-            if not out_comment_list:
-                return True, "该笔记没有评论", []
-            
-            # 获取二级评论
-            for comment in out_comment_list:
+            # 处理当前页一级评论的二级评论时，下一页一级评论已在后台请求
+            for comment in self.iter_note_out_comment(note_id, kvDist['xsec_token'], cookies_str, proxies):
+                out_comment_list.append(comment)
                 success, msg, new_comment = self.get_note_all_inner_comment(comment, kvDist['xsec_token'], cookies_str, proxies)
                 if not success:
                     # 如果获取二级评论失败，继续处理其他评论，不中断整个流程
                     logger.warning(f"获取二级评论失败: {msg}, comment_id: {comment.get('id', 'unknown')}")
-                    continue
+
+            # 如果没有评论，直接返回空列表
+            if not out_comment_list:
+                return True, "该笔记没有评论", []
+            success, msg = True, 'success'
         except Exception as e:
             success = False
             msg = str(e)
@@ -808,15 +794,27 @@ class XHS_Apis():
         res_json = None
         try:
             api = "/api/sns/web/unread_count"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, res_json
 
+    def iter_messages(self, stream: str, cookies_str: str, proxies: dict = None, prefetch: int = 1):
+        """
+            逐条获取消息通知，最新的在前
+            :param stream: mentions 评论和@ / likes 赞和收藏 / connections 新增关注（与 get_unread_message 返回的字段对应）
+            :param prefetch: 预取的页数，0 为用到时才请求下一页（调用方读到已处理过的消息就停止时不浪费请求）
+            返回消息的迭代器（Paginator），失败时遍历过程中抛出异常
+        """
+        single = {'mentions': self.get_metions, 'likes': self.get_likesAndcollects, 'connections': self.get_new_connections}[stream]
+
+        def fetch(cursor):
+            return self._cursor_page(*single(cursor, cookies_str, proxies), "message_list")
+
+        return Paginator(fetch, '', prefetch=prefetch)
+
     def get_metions(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
             获取评论和@提醒
@@ -832,9 +830,7 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -847,25 +843,7 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             返回全部的评论和@提醒
         """
-        cursor = ''
-        metions_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_metions(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                metions = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                metions_list.extend(metions)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, metions_list
+        return self._collect(self.iter_messages('mentions', cookies_str, proxies))
 
     def get_likesAndcollects(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
@@ -882,9 +860,7 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -897,25 +873,7 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             返回全部的赞和收藏
         """
-        cursor = ''
-        likesAndcollects_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_likesAndcollects(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                likesAndcollects = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                likesAndcollects_list.extend(likesAndcollects)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, likesAndcollects_list
+        return self._collect(self.iter_messages('likes', cookies_str, proxies))
 
     def get_new_connections(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
@@ -932,9 +890,7 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
-            res_json = response.json()
+            res_json = self._request('GET', splice_api, cookies_str, proxies=proxies)
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
             success = False
@@ -947,47 +903,16 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             返回全部的新增关注
         """
-        cursor = ''
-        connections_list = []
-        try:
-            while True:
-                success, msg, res_json = self.get_new_connections(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                connections = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                connections_list.extend(connections)
-                if not res_json["data"]["has_more"]:
-                    break
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, connections_list
+        return self._collect(self.iter_messages('connections', cookies_str, proxies))
 
     @staticmethod
     def get_note_no_water_video(note_id):
         """
-            获取笔记无水印视频
+            获取笔记无水印视频（请求笔记网页，读到 og:video 就停止），批量获取用 MediaResolver.resolve_many
             :param note_id: 你想要获取的笔记的id
             返回笔记无水印视频
         """
-        success = True
-        msg = '成功'
-        video_addr = None
-        try:
-            headers = get_common_headers()
-            url = f"https://www.xiaohongshu.com/explore/{note_id}"
-            response = requests.get(url, headers=headers)
-            res = response.text
-            video_addr = re.findall(r'<meta name="og:video" content="(.*?)">', res)[0]
-        except Exception as e:
-            success = False
-            msg = str(e)
-        return success, msg, video_addr
-
+        return _media_resolver().fetch_video_addr(note_id)
 
     @staticmethod
     def get_note_no_water_img(img_url):
@@ -1000,31 +925,18 @@ class XHS_Apis():
         msg = '成功'
         new_url = None
         try:
-            # https://sns-webpic-qc.xhscdn.com/202403211626/c4fcecea4bd012a1fe8d2f1968d6aa91/110/0/01e50c1c135e8c010010000000018ab74db332_0.jpg!nd_dft_wlteh_webp_3
-            if '.jpg' in img_url:
-                img_id = '/'.join([split for split in img_url.split('/')[-3:]]).split('!')[0]
-                # return f"http://ci.xiaohongshu.com/{img_id}?imageview2/2/w/1920/format/png"
-                # return f"http://ci.xiaohongshu.com/{img_id}?imageview2/2/w/format/png"
-                # return f'https://sns-img-hw.xhscdn.com/{img_id}'
-                new_url = f'https://sns-img-qc.xhscdn.com/{img_id}'
-
-            # 'https://sns-webpic-qc.xhscdn.com/202403231640/ea961053c4e0e467df1cc93afdabd630/spectrum/1000g0k0200n7mj8fq0005n7ikbllol6q50oniuo!nd_dft_wgth_webp_3'
-            elif 'spectrum' in img_url:
-                img_id = '/'.join(img_url.split('/')[-2:]).split('!')[0]
-                # return f'http://sns-webpic.xhscdn.com/{img_id}?imageView2/2/w/1920/format/jpg'
-                new_url = f'http://sns-webpic.xhscdn.com/{img_id}?imageView2/2/w/format/jpg'
-            else:
-                # 'http://sns-webpic-qc.xhscdn.com/202403181511/64ad2ea67ce04159170c686a941354f5/1040g008310cs1hii6g6g5ngacg208q5rlf1gld8!nd_dft_wlteh_webp_3'
-                img_id = img_url.split('/')[-1].split('!')[0]
-                # return f"http://ci.xiaohongshu.com/{img_id}?imageview2/2/w/1920/format/png"
-                # return f"http://ci.xiaohongshu.com/{img_id}?imageview2/2/w/format/png"
-                # return f'https://sns-img-hw.xhscdn.com/{img_id}'
-                new_url = f'https://sns-img-qc.xhscdn.com/{img_id}'
+            new_url = no_water_img_url(img_url)
         except Exception as e:
             success = False
             msg = str(e)
         return success, msg, new_url
 
+
+@functools.lru_cache(maxsize=None)
+def _media_resolver():
+    return MediaResolver()
+
+
 if __name__ == '__main__':
     """
         此文件为小红书api的使用示例
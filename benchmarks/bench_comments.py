@@ -0,0 +1,109 @@
+"""
+评论处理吞吐基准
+用合成的评论数据（结构与接口一致，一级评论带二级评论）测量每秒处理的评论数：
+- handle_comment_info：逐条转成 dict（需要先往原始数据里写入 note_id / note_url）
+- iter_comments：流式转成 Comment
+- iter_comments + to_row：再转成表格行（包含时间格式化），即写入 xlsx / csv 的完整过程
+- build_comment_graph：两遍构建完整回复关系（spider_note_comments 使用），评论数增加时条/秒应基本不变
+
+用法：
+    python benchmarks/bench_comments.py
+    python benchmarks/bench_comments.py --roots 20000 --subs 10
+    python benchmarks/bench_comments.py --roots 50000 --subs 10 --only build_comment_graph
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from loguru import logger
+from mock_xhs_server import MockConfig, SyntheticData, _note_id
+from xhs_utils.comment_util import iter_comments, build_comment_graph
+from xhs_utils.data_util import handle_comment_info
+
+NOTE_ID = '6909a4c30000000005012d93'
+NOTE_URL = f'https://www.xiaohongshu.com/explore/{NOTE_ID}?xsec_token=mock_token'
+
+
+def synthetic_comments(roots: int, subs: int) -> list:
+    synthetic = SyntheticData(MockConfig(), 'http://127.0.0.1')
+    comments = []
+    for i in range(roots):
+        root_id = _note_id('root', i)
+        comment = synthetic.comment(NOTE_ID, root_id)
+        # 评论时间分散在约一个月内
+        comment['create_time'] = 1700000000000 + i * 137000
+        sub_comments = []
+        for j in range(subs):
+            sub_id = _note_id(root_id, j)
+            target_id = sub_comments[-1]['id'] if j % 2 and sub_comments else root_id
+            sub_comment = synthetic.comment(NOTE_ID, sub_id, target_id)
+            sub_comment['create_time'] = comment['create_time'] + j * 61000
+            sub_comments.append(sub_comment)
+        comment['sub_comments'] = sub_comments
+        comments.append(comment)
+    return comments
+
+
+def run_dicts(comments: list) -> int:
+    count = 0
+    for comment in comments:
+        comment['note_url'] = NOTE_URL
+        handle_comment_info(comment)
+        count += 1
+        for sub_comment in comment['sub_comments']:
+            sub_comment['note_url'] = NOTE_URL
+            handle_comment_info(sub_comment, comment['id'], target_id_of_raw(sub_comment))
+            count += 1
+    return count
+
+
+def target_id_of_raw(sub_comment: dict):
+    target = sub_comment.get('target_comment')
+    return target.get('id') if isinstance(target, dict) else None
+
+
+def run_models(comments: list) -> int:
+    return sum(1 for _ in iter_comments(comments, NOTE_ID, NOTE_URL))
+
+
+def run_rows(comments: list) -> int:
+    return sum(1 for record in iter_comments(comments, NOTE_ID, NOTE_URL) if record.to_row())
+
+
+def run_graph(comments: list) -> int:
+    return len(build_comment_graph(comments, NOTE_ID, NOTE_URL))
+
+
+METHODS = {'handle_comment_info': run_dicts, 'iter_comments': run_models, 'iter_comments + to_row': run_rows,
+           'build_comment_graph': run_graph}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评论处理吞吐基准')
+    parser.add_argument('--roots', type=int, default=10000, help='一级评论数量')
+    parser.add_argument('--subs', type=int, default=10, help='每条一级评论的二级评论数量')
+    parser.add_argument('--runs', type=int, default=3, help='运行次数，取最快的一次')
+    parser.add_argument('--only', choices=list(METHODS), action='append', help='只测指定方式，可重复')
+    args = parser.parse_args()
+    logger.remove()
+
+    comments = synthetic_comments(args.roots, args.subs)
+    print(f'{"方式":<26}{"评论数":>10}{"耗时s":>10}{"条/秒":>12}')
+    for name in args.only or METHODS:
+        func = METHODS[name]
+        best = None
+        for _ in range(args.runs):
+            data = copy.deepcopy(comments) if func is run_dicts else comments
+            start = time.perf_counter()
+            count = func(data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{name:<26}{count:>10}{best:>10.3f}{count / best:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+JSON编解码基准
+用录制的接口响应（与 mock_xhs_server.py 的 --fixtures 目录相同，*.json）比较标准库 json 和 json_util 各后端的解析耗时，
+以及写 info.json 时序列化笔记的耗时
+没有指定录制目录时用合成的评论页、搜索页和笔记详情响应
+
+用法：
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --fixtures datas/recorded --repeat 500
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mock_xhs_server import MockConfig, SyntheticData
+from xhs_utils import json_util
+from xhs_utils.data_util import handle_note_info
+
+
+def synthetic_payloads() -> dict:
+    synthetic = SyntheticData(MockConfig(), 'http://127.0.0.1')
+    feed = synthetic.feed({})
+    return {
+        'page.json': json.dumps(synthetic.comment_page({'note_id': '6909a4c30000000005012d93'}), ensure_ascii=False).encode('utf-8'),
+        'notes.json': json.dumps(synthetic.search_notes({'keyword': '粉底液', 'page': 1}), ensure_ascii=False).encode('utf-8'),
+        'feed.json': json.dumps(feed, ensure_ascii=False).encode('utf-8'),
+    }
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    :return: 单次耗时（微秒），取5轮中最快的一轮
+    """
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = (time.perf_counter() - start) / repeat
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON编解码基准')
+    parser.add_argument('--fixtures', help='录制响应所在目录')
+    parser.add_argument('--repeat', type=int, default=200, help='每轮重复次数')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        payloads = {os.path.basename(p): open(p, 'rb').read() for p in sorted(glob.glob(os.path.join(args.fixtures, '*.json')))}
+    else:
+        payloads = synthetic_payloads()
+    backends = [b for b in json_util.BACKENDS if b != 'orjson' or json_util.orjson is not None]
+
+    print(f'{"内容":<24}{"大小KB":>8}' + ''.join(f'{b + " us":>14}' for b in backends) + f'{"加速":>8}')
+    for name, payload in payloads.items():
+        results = []
+        for backend in backends:
+            json_util.set_backend(backend)
+            results.append(timeit(lambda: json_util.loads(payload), args.repeat))
+        print(f'{"loads " + name:<24}{len(payload) / 1024:>8.1f}' + ''.join(f'{us:>14.1f}' for us in results) + f'{results[-1] / results[0]:>7.1f}x')
+
+    feed = json.loads(payloads.get('feed.json') or synthetic_payloads()['feed.json'])
+    note = feed['data']['items'][0]
+    note['url'] = 'https://www.xiaohongshu.com/explore/' + note['id']
+    note_info = handle_note_info(note)
+    results = []
+    for backend in backends:
+        json_util.set_backend(backend)
+        results.append(timeit(lambda: json_util.dumpb(note_info), args.repeat * 10))
+    size = len(json_util.dumpb(note_info)) / 1024
+    print(f'{"dumps info.json":<24}{size:>8.1f}' + ''.join(f'{us:>14.1f}' for us in results) + f'{results[-1] / results[0]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
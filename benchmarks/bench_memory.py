@@ -0,0 +1,87 @@
+"""
+数据模型内存基准
+用与真实接口结构一致的合成数据，比较 handle_*_info 返回的 dict 与 Note / User / Comment 模型每条记录常驻内存的大小
+只统计处理后的记录本身（原始响应在计时前已生成，不计入）
+
+用法：
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --count 200000 --type comment
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mock_xhs_server import MockConfig, SyntheticData, _note_id
+from xhs_utils.data_util import handle_note_info, handle_user_info, handle_comment_info
+from xhs_utils.model_util import Note, User, Comment
+
+TYPES = ('note', 'user', 'comment')
+NOTE_URL = 'https://www.xiaohongshu.com/explore/{}?xsec_token=mock_token&xsec_source=pc_search'
+
+
+def raw_records(type: str, count: int) -> list:
+    """
+    :return: [(raw, 额外参数)]，每条的id和内容都不同，避免字符串被共享
+    """
+    synthetic = SyntheticData(MockConfig(), 'http://127.0.0.1')
+    records = []
+    for i in range(count):
+        item_id = _note_id(type, i)
+        if type == 'note':
+            raw = synthetic.note_card(item_id)
+            raw['url'] = NOTE_URL.format(item_id)
+            records.append((raw, ()))
+        elif type == 'user':
+            raw = {'basic_info': {'nickname': f'用户{i}', 'imageb': f'http://127.0.0.1/cdn/img/avatar_{item_id}.jpg', 'red_id': str(i),
+                                  'gender': i % 3, 'ip_location': '上海', 'desc': f'简介 {i}'},
+                   'interactions': [{'count': str(i % 1000)}, {'count': '1.2万'}, {'count': '10万+'}],
+                   'tags': [{'name': '上海'}, {'name': '双子座'}]}
+            records.append((raw, (item_id,)))
+        else:
+            raw = synthetic.comment('6909a4c30000000005012d93', item_id)
+            raw['content'] = f'{raw["content"]} {i}'
+            raw['note_url'] = NOTE_URL.format(raw['note_id'])
+            records.append((raw, ()))
+    return records
+
+
+def measure(build, records) -> int:
+    """
+    :return: 构建出的记录列表常驻的字节数
+    """
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    result = [build(raw, *extra) for raw, extra in records]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return end - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据模型内存基准')
+    parser.add_argument('--count', type=int, default=50000, help='每种类型的记录数')
+    parser.add_argument('--type', choices=TYPES, action='append', help='只测指定类型，可重复')
+    args = parser.parse_args()
+
+    builders = {
+        'note': (handle_note_info, Note.from_raw),
+        'user': (handle_user_info, User.from_raw),
+        'comment': (handle_comment_info, lambda raw: Comment.from_raw(raw, raw['note_id'], raw['note_url'])),
+    }
+    print(f'{"类型":<10}{"dict B/条":>12}{"模型 B/条":>12}{"节省":>8}')
+    for type in args.type or TYPES:
+        records = raw_records(type, args.count)
+        as_dict, as_model = builders[type]
+        dict_bytes = measure(as_dict, records) / args.count
+        model_bytes = measure(as_model, records) / args.count
+        print(f'{type:<10}{dict_bytes:>12.0f}{model_bytes:>12.0f}{1 - model_bytes / dict_bytes:>8.0%}')
+
+
+if __name__ == '__main__':
+    main()
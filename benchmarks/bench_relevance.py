@@ -0,0 +1,111 @@
+"""
+相关性预分类基准
+用一次完整LLM分析的结果作为标签（有产品结果的对话=相关），评估预过滤的精确率、召回率和节省的API调用比例
+标签可以是分析结果Excel，也可以是结果日志（*_journal.jsonl）
+建议标签来自 --no-prefilter 的分析结果，否则被旧规则跳过的对话只能当作"无关"
+
+用法：
+    python benchmarks/bench_relevance.py -i datas/excel_datas/note_comments.xlsx -r datas/excel_datas/note_comments_analysis_result.xlsx
+    python benchmarks/bench_relevance.py -i ... -r ... --save-model datas/relevance_model.json
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+from analyze_sentiment import CommentAnalyzer
+from xhs_utils.relevance_util import RelevanceFilter, CharNgramModel, clean_comment
+from xhs_utils.journal_util import ResultJournal
+
+
+def load_labels(analyzer, conversations, result_path):
+    """
+    从分析结果中读取相关的对话
+    新版结果有 root_id 列；旧版结果只能用 full_conversation 文本反查
+    """
+    if result_path.endswith('.jsonl'):
+        return {root_id for root_id, entry in ResultJournal(result_path).load().items()
+                if entry.get('status') == 'done' and entry.get('results')}
+    details = pd.read_excel(result_path, sheet_name='详细分析')
+    if 'root_id' in details.columns:
+        return set(details['root_id'].astype(str))
+    texts = set(details['full_conversation'].astype(str)) if 'full_conversation' in details.columns else set()
+    return {root_id for root_id, conversation in conversations.items()
+            if analyzer.build_conversation_text(conversation)[0] in texts}
+
+
+def evaluate(relevance_filter, conversations, labels):
+    tp = fp = fn = tn = 0
+    start = time.perf_counter()
+    for root_id, conversation in conversations.items():
+        keep, _, _ = relevance_filter.check(conversation)
+        relevant = root_id in labels
+        if keep and relevant:
+            tp += 1
+        elif keep:
+            fp += 1
+        elif relevant:
+            fn += 1
+        else:
+            tn += 1
+    elapsed = time.perf_counter() - start
+    total = tp + fp + fn + tn
+    return {
+        'total': total,
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'calls_avoided': (fn + tn) / total if total else 0.0,
+        'relevant_lost': fn,
+        'us_per_conversation': elapsed / total * 1e6 if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='相关性预分类基准')
+    parser.add_argument('--input', '-i', required=True, help='评论Excel文件')
+    parser.add_argument('--result', '-r', required=True, help='同一文件的LLM分析结果（_analysis_result.xlsx 或 _journal.jsonl）')
+    parser.add_argument('--threshold', type=float, default=0.5, help='模型阈值')
+    parser.add_argument('--save-model', help='用全部标签训练模型并保存到该路径')
+    args = parser.parse_args()
+
+    # 只用到分组逻辑，不会发起API调用
+    analyzer = CommentAnalyzer(api_key=os.getenv('DEEPSEEK_API_KEY') or 'offline-benchmark')
+    df = pd.read_excel(args.input)
+    for col in ['评论内容', 'content', '内容']:
+        if col in df.columns:
+            df[col] = df[col].fillna('')
+    conversations = analyzer.group_comments_by_conversation(df)
+    labels = load_labels(analyzer, conversations, args.result)
+    print(f'对话数: {len(conversations)}  LLM判定相关: {len(labels)}')
+
+    # 按 root_id 哈希切分 80% 训练 / 20% 测试
+    train, test = {}, {}
+    for root_id, conversation in conversations.items():
+        (test if zlib.crc32(root_id.encode('utf-8')) % 5 == 0 else train)[root_id] = conversation
+
+    def to_text(conversation):
+        return ' '.join(clean_comment(c.get('content', '')) for c in conversation)
+
+    model = CharNgramModel().fit([to_text(c) for c in train.values()], [root_id in labels for root_id in train])
+
+    rows = [
+        ('规则+关键词', RelevanceFilter(normalizer=analyzer.normalizer), test),
+        ('规则+关键词+模型', RelevanceFilter(normalizer=analyzer.normalizer, model=model, threshold=args.threshold), test),
+    ]
+    print(f'{"方案":<16}{"样本":>6}{"精确率":>8}{"召回率":>8}{"节省调用":>10}{"漏掉相关":>8}{"us/对话":>10}')
+    for name, relevance_filter, subset in rows:
+        m = evaluate(relevance_filter, subset, labels)
+        print(f'{name:<16}{m["total"]:>6}{m["precision"]:>8.3f}{m["recall"]:>8.3f}{m["calls_avoided"]:>10.1%}{m["relevant_lost"]:>8}{m["us_per_conversation"]:>10.1f}')
+
+    if args.save_model:
+        full_model = CharNgramModel().fit([to_text(c) for c in conversations.values()], [root_id in labels for root_id in conversations])
+        full_model.save(args.save_model)
+        print(f'模型已保存至 {args.save_model}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+爬虫离线基准
+在本地模拟服务（mock_xhs_server.py）上运行 Data_Spider 的典型场景，不会访问线上小红书
+每个场景在独立子进程中运行，报告请求数、每秒请求数、请求延迟 p50/p99 和峰值内存（RSS）
+
+用法：
+    python benchmarks/bench_spider.py                          # 运行全部场景
+    python benchmarks/bench_spider.py --scenario spider_note_comments --latency 0.02 --error-rate 0.01
+    python benchmarks/bench_spider.py --skip-sign              # 不调用JS签名，只测传输和数据处理
+    python benchmarks/bench_spider.py --json bench_output.json # 结果同时写入JSON，便于对比
+    python benchmarks/bench_spider.py --trace trace.json       # 每个场景导出一份 Chrome trace（trace_<场景>.json）
+    python benchmarks/bench_spider.py --scenario download_note --media-profile webp   # 按下载规格对比字节数和耗时
+签名依赖 Node.js 及 npm install 安装的 crypto-js / jsdom
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from xhs_utils.media_util import MEDIA_PROFILES
+
+SCENARIOS = ['spider_some_note', 'spider_user_all_note', 'spider_note_comments', 'download_note']
+COOKIES = 'a1=bench_a1; webId=bench; web_session=bench_session'
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def install_request_timer(latencies: list):
+    """
+    记录每个HTTP请求的耗时（requests 的所有请求都会经过 Session.request）
+    """
+    import requests
+
+    original = requests.Session.request
+
+    def timed_request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    requests.Session.request = timed_request
+
+
+def skip_signing():
+    """
+    用不调用JS的请求参数替换签名，只测量传输和数据处理
+    """
+    import apis.xhs_pc_apis as xhs_pc_apis
+    from xhs_utils.cookie_util import trans_cookies
+
+    def generate_request_params(cookies_str, api, data='', method='POST'):
+        headers = {'content-type': 'application/json;charset=UTF-8', 'x-s': 'bench', 'x-t': '0', 'x-s-common': 'bench'}
+        if data:
+            data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        return headers, trans_cookies(cookies_str), data
+
+    xhs_pc_apis.generate_request_params = generate_request_params
+
+
+def run_scenario(name: str, args):
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    from mock_xhs_server import MockXHSServer, MockConfig
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, fixtures=args.fixtures,
+                        notes_per_user=args.notes, comments_per_note=args.comments, media_bytes=args.media_bytes)
+    server = MockXHSServer(config).start()
+    if args.skip_sign:
+        skip_signing()
+    latencies = []
+    install_request_timer(latencies)
+    if args.trace:
+        from xhs_utils.trace_util import enable_tracing
+        export_format = 'otel' if args.trace.endswith('.otel.json') else 'chrome'
+        suffix = '.otel.json' if export_format == 'otel' else '.json'
+        root = args.trace[:-len(suffix)] if args.trace.endswith(suffix) else args.trace
+        enable_tracing(f'{root}_{name}{suffix}', export_format)
+
+    from apis.xhs_pc_apis import XHS_Apis
+    from main import Data_Spider
+    from xhs_utils.data_util import download_note
+    from xhs_utils.media_util import MediaResolver, media_totals
+    xhs_apis = XHS_Apis(base_url=server.base_url)
+    spider = Data_Spider(xhs_apis, MediaResolver(session=xhs_apis.session, web_url=server.base_url))
+    workdir = tempfile.mkdtemp(prefix='xhs_bench_')
+    base_path = {'media': os.path.join(workdir, 'media'), 'excel': os.path.join(workdir, 'excel')}
+    for path in base_path.values():
+        os.makedirs(path)
+    note_urls = [f'https://www.xiaohongshu.com/explore/{i:024x}?xsec_token=mock_token&xsec_source=pc_search' for i in range(args.notes)]
+
+    start = time.perf_counter()
+    items = 0
+    if name == 'spider_some_note':
+        spider.spider_some_note(note_urls, COOKIES, base_path, 'excel', 'bench_notes')
+        items = len(note_urls)
+    elif name == 'spider_user_all_note':
+        note_list, _, _ = spider.spider_user_all_note('https://www.xiaohongshu.com/user/profile/bench_user?xsec_token=mock_token&xsec_source=pc_feed',
+                                                      COOKIES, base_path, 'excel')
+        items = len(note_list)
+    elif name == 'spider_note_comments':
+        _, _, comments = spider.spider_note_comment_models(note_urls[0], COOKIES, base_path, 'bench_comments')
+        items = len(comments)
+    elif name == 'download_note':
+        for note_url in note_urls:
+            success, _, note_info = spider.spider_note(note_url, COOKIES)
+            if success:
+                download_note(note_info, base_path['media'], 'media', args.media_profile)
+                items += 1
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    return {
+        'scenario': name,
+        'items': items,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'server_requests': server.request_counts,
+        'media': media_totals(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫离线基准')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append', help='要运行的场景，可重复，默认全部')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟服务基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='模拟服务延迟抖动（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='错误注入概率')
+    parser.add_argument('--fixtures', help='录制响应所在目录')
+    parser.add_argument('--notes', type=int, default=50, help='笔记数量')
+    parser.add_argument('--comments', type=int, default=200, help='每篇笔记的一级评论数量')
+    parser.add_argument('--media-bytes', type=int, default=64 * 1024, help='每个媒体文件的字节数')
+    parser.add_argument('--media-profile', default='original', choices=list(MEDIA_PROFILES), help='download_note 场景的下载规格')
+    parser.add_argument('--skip-sign', action='store_true', help='不调用JS签名')
+    parser.add_argument('--json', help='结果写入JSON文件')
+    parser.add_argument('--trace', help='导出分段耗时追踪，以 .otel.json 结尾时导出 OpenTelemetry 格式')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return
+
+    # 每个场景在独立子进程中运行，峰值内存互不影响
+    results = []
+    child_args = [a for a in sys.argv[1:] if not a.startswith('--scenario') and a not in SCENARIOS]
+    for name in args.scenario or SCENARIOS:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name] + child_args,
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if proc.returncode != 0:
+            print(f'{name} 运行失败:\n{proc.stderr[-2000:]}')
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f'{"场景":<24}{"条目":>7}{"请求":>7}{"耗时s":>9}{"req/s":>9}{"p50ms":>9}{"p99ms":>9}{"RSS MB":>9}')
+    for r in results:
+        print(f'{r["scenario"]:<24}{r["items"]:>7}{r["requests"]:>7}{r["seconds"]:>9}{r["rps"]:>9}{r["p50_ms"]:>9}{r["p99_ms"]:>9}{r["peak_rss_mb"]:>9}')
+    for r in results:
+        for profile, types in r.get('media', {}).items():
+            for type, totals in types.items():
+                print(f'{r["scenario"]} 下载规格 {profile} {type}: {totals["files"]} 个文件，{totals["bytes"] / 1024 / 1024:.2f} MB，{totals["seconds"]}s')
+    if args.json:
+        with open(args.json, mode='w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+启动耗时基准
+用 python -X importtime 统计各入口模块的导入耗时（取多次运行的最小值），并按顶层包汇总最耗时的依赖
+任何入口超过预算时退出码为1，可以放进CI防止启动变慢
+
+用法：
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --module cli --top 15
+    python benchmarks/bench_startup.py --budget-scale 1.5      # 机器较慢时放宽预算
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 入口模块 -> 导入耗时预算（毫秒）
+BUDGETS = {
+    'apis.xhs_pc_apis': 200,
+    'main': 200,
+    'cli': 220,
+    'worker': 120,
+    'analyze_sentiment': 150,
+}
+
+
+def import_profile(module: str):
+    """
+    :return: (该模块的累计导入耗时us, {顶层包: 自身耗时us})
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f'导入 {module} 失败:\n{proc.stderr[-2000:]}')
+    total = 0
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        name = name.strip()
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准')
+    parser.add_argument('--module', action='append', help='只测指定模块，可重复')
+    parser.add_argument('--runs', type=int, default=5, help='每个模块运行次数，取最小值')
+    parser.add_argument('--top', type=int, default=8, help='显示最耗时的顶层包数量')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='预算倍数')
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.module or BUDGETS:
+        best_total, best_packages = None, None
+        for _ in range(args.runs):
+            total, packages = import_profile(module)
+            if best_total is None or total < best_total:
+                best_total, best_packages = total, packages
+        budget = BUDGETS.get(module, 250) * args.budget_scale
+        ms = best_total / 1000
+        status = 'OK' if ms <= budget else '超出预算'
+        print(f'{module:<22}{ms:>9.1f} ms  预算 {budget:>6.0f} ms  {status}')
+        top = sorted(best_packages.items(), key=lambda kv: -kv[1])[:args.top]
+        print('    ' + '  '.join(f'{name} {us / 1000:.1f}' for name, us in top))
+        if ms > budget:
+            over_budget.append(module)
+    if over_budget:
+        print(f'超出预算: {", ".join(over_budget)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
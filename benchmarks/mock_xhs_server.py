@@ -0,0 +1,469 @@
+"""
+本地模拟的小红书接口服务和媒体CDN，用于离线压测爬虫
+- 模拟 edith.xiaohongshu.com 的 feed / user_posted / search/notes / comment/page / comment/sub/page 接口
+- 模拟图片/视频CDN，按配置大小返回随机字节
+- 支持可配置的延迟、抖动和错误注入
+- 指定 fixtures 目录时，优先回放录制的JSON，文件名为完整的接口路径（/ 换成 _），
+  如 api_sns_web_v1_feed.json、api_sns_web_v2_comment_sub_page.json；
+  多页的接口按 <文件名>.1.json、<文件名>.2.json ... 依次回放，回放完最后一页后总是返回 has_more=false 的最后一页
+
+单独启动：
+    python benchmarks/mock_xhs_server.py --port 8765 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockConfig():
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, fixtures: str = None,
+                 notes_per_user: int = 90, search_total: int = 200, comments_per_note: int = 100,
+                 sub_comments_per_comment: int = 15, images_per_note: int = 3, media_bytes: int = 64 * 1024, seed: int = 42,
+                 homefeed_channels: int = 8, homefeed_pool: int = 400, messages_per_stream: int = 60,
+                 creator_notes: int = 45, video_every: int = 0):
+        """
+        :param latency: 每个请求的基础延迟（秒）
+        :param jitter: 延迟抖动上限（秒），实际延迟为 latency + U(0, jitter)
+        :param error_rate: 返回错误的概率，一半返回 success=false，一半返回 HTTP 500
+        :param fixtures: 录制响应所在目录
+        :param notes_per_user: 每个用户的笔记数量
+        :param search_total: 每个搜索词的结果总数
+        :param comments_per_note: 每篇笔记的一级评论数量
+        :param sub_comments_per_comment: 每条一级评论的二级评论数量
+        :param images_per_note: 每篇笔记的图片数量
+        :param media_bytes: 每个媒体文件的字节数
+        :param homefeed_channels: 主页频道数量
+        :param homefeed_pool: 主页推荐的笔记总数，各频道、相邻的页之间有重复的笔记
+        :param messages_per_stream: 每类消息通知（评论和@、赞和收藏、新增关注）的初始数量，之后用 add_messages 模拟新消息
+        :param creator_notes: 创作者中心发布的笔记数量
+        :param video_every: 每多少篇笔记有一篇视频笔记（按笔记id），0 为没有；视频笔记数据里不带原视频，需要请求笔记网页（/explore/<id>）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures = fixtures
+        self.notes_per_user = notes_per_user
+        self.search_total = search_total
+        self.comments_per_note = comments_per_note
+        self.sub_comments_per_comment = sub_comments_per_comment
+        self.images_per_note = images_per_note
+        self.media_bytes = media_bytes
+        self.homefeed_channels = homefeed_channels
+        self.homefeed_pool = homefeed_pool
+        self.messages_per_stream = messages_per_stream
+        self.creator_notes = creator_notes
+        self.video_every = video_every
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+
+def _ok(data):
+    return {'code': 0, 'success': True, 'msg': '成功', 'data': data}
+
+
+# 模拟图床转码后相对原图（jpg）的体积
+IMAGE_WIDTH = 1920
+FORMAT_RATIOS = {'jpg': 1.0, 'png': 1.6, 'webp': 0.6, 'avif': 0.45}
+
+
+def _note_id(seed: str, index: int) -> str:
+    return hashlib.md5(f'{seed}:{index}'.encode('utf-8')).hexdigest()[:24]
+
+
+class SyntheticData():
+    """
+    生成与真实接口结构一致的合成数据
+    """
+
+    def __init__(self, config: MockConfig, base_url: str):
+        self.config = config
+        self.base_url = base_url
+        self.message_counts = {stream: config.messages_per_stream for stream in ('mentions', 'likes', 'connections')}
+        self.unread = dict.fromkeys(self.message_counts, 0)
+
+    def add_messages(self, stream: str, num: int):
+        """
+        模拟收到新的消息通知，未读数同时增加
+        """
+        self.message_counts[stream] += num
+        self.unread[stream] += num
+
+    def unread_count(self):
+        return _ok({**self.unread, 'unread_count': sum(self.unread.values())})
+
+    def messages(self, stream: str, query: dict):
+        # 最新的在前，游标为下一页第一条的序号
+        total = self.message_counts[stream]
+        cursor = query.get('cursor')
+        start = int(cursor) if cursor else total - 1
+        num = int(query.get('num') or 20)
+        message_list = []
+        for seq in range(start, max(start - num, -1), -1):
+            message = {'id': _note_id(stream, seq), 'time': 1700000000 + seq * 60, 'user_info': {'userid': f'u{seq}', 'nickname': f'用户{seq}'}}
+            if stream == 'connections':
+                message.update(type='follow/you', title='开始关注你了')
+            else:
+                message.update(type='comment/comment' if stream == 'mentions' else 'liked/note', title=f'消息{seq}',
+                               comment_info={'content': f'评论{seq}'} if stream == 'mentions' else {},
+                               item_info={'id': _note_id('note', seq % 10)})
+            message_list.append(message)
+        end = start - len(message_list)
+        return _ok({'message_list': message_list, 'cursor': str(end), 'has_more': end >= 0})
+
+    def user(self, user_id: str):
+        return {'user_id': user_id, 'nickname': f'用户{user_id[-4:]}', 'avatar': f'{self.base_url}/cdn/img/avatar_{user_id}.jpg',
+                'image': f'{self.base_url}/cdn/img/avatar_{user_id}.jpg', 'xsec_token': 'mock_token'}
+
+    def user_info(self, query: dict):
+        user_id = query.get('target_user_id', '')
+        seed = sum(map(ord, user_id))
+        return _ok({
+            'basic_info': {'nickname': f'用户{user_id[-4:]}', 'imageb': f'{self.base_url}/cdn/img/avatar_{user_id}.jpg',
+                           'red_id': str(seed * 7919 % 1000000000), 'gender': seed % 2, 'ip_location': '上海',
+                           'desc': f'用户{user_id[-4:]}的简介'},
+            'interactions': [{'type': 'follows', 'count': str(seed % 500)}, {'type': 'fans', 'count': f'{seed % 90 + 1}.{seed % 10}万'},
+                             {'type': 'interaction', 'count': str(seed * 31 % 100000)}],
+            'tags': [{'name': '美妆'}, {'name': '护肤'}],
+        })
+
+    def note_card(self, note_id: str):
+        image_list = []
+        for i in range(self.config.images_per_note):
+            url = f'{self.base_url}/cdn/img/{note_id}_{i}.jpg'
+            image_list.append({'info_list': [{'image_scene': 'WB_PRV', 'url': url + '?prv'}, {'image_scene': 'WB_DFT', 'url': url}],
+                               'width': 1080, 'height': 1440})
+        return {
+            'id': note_id,
+            'model_type': 'note',
+            'xsec_token': 'mock_token',
+            'note_card': {
+                'note_id': note_id,
+                'user': self.user(f'u{note_id[:23]}'),
+                'title': f'模拟笔记 {note_id[:6]}',
+                'desc': '干皮粉底液测评 ' * 20,
+                'interact_info': {'liked_count': '1024', 'collected_count': '512', 'comment_count': str(self.config.comments_per_note), 'share_count': '32'},
+                'image_list': image_list,
+                **self.video(note_id),
+                'tag_list': [{'id': str(i), 'name': f'标签{i}', 'type': 'topic'} for i in range(5)],
+                'time': 1700000000000,
+                'ip_location': '上海',
+            },
+        }
+
+    def is_video(self, note_id: str) -> bool:
+        return bool(self.config.video_every) and int(note_id, 16) % self.config.video_every == 0
+
+    def video(self, note_id: str) -> dict:
+        if not self.is_video(note_id):
+            return {'type': 'normal'}
+        return {'type': 'video', 'video': {'consumer': {}, 'media': {'stream': {'h264': [{'master_url': f'{self.base_url}/cdn/video/{note_id}_wm.mp4'}]}}}}
+
+    def explore_page(self, note_id: str) -> bytes:
+        # 与真实网页一样 og:video 在 <head> 里，后面是很大的页面主体
+        meta = f'<meta name="og:video" content="{self.base_url}/cdn/video/{note_id}.mp4">' if self.is_video(note_id) else ''
+        head = '<html><head><meta charset="utf-8"><script>' + 'window.x=1;' * 400 + '</script>' + meta + '</head>'
+        return (head + '<body>' + '<div>模拟笔记</div>' * 20000 + '</body></html>').encode('utf-8')
+
+    def comment(self, note_id: str, comment_id: str, target_id: str = None):
+        data = {
+            'id': comment_id,
+            'note_id': note_id,
+            'content': '这个粉底液干皮用真的很服帖[赞R] @小红薯',
+            'user_info': self.user(f'u{comment_id[-20:]}'),
+            'show_tags': [],
+            'like_count': '7',
+            'create_time': 1700000000000,
+            'ip_location': '北京',
+            'pictures': [],
+            'status': 0,
+        }
+        if target_id:
+            data['target_comment'] = {'id': target_id, 'user_info': self.user('target')}
+        return data
+
+    def feed(self, body: dict):
+        note_id = body.get('source_note_id', _note_id('feed', 0))
+        return _ok({'items': [self.note_card(note_id)], 'cursor_score': ''})
+
+    def homefeed_category(self):
+        categories = [{'id': 'homefeed_recommend', 'name': '推荐'}]
+        categories += [{'id': f'homefeed.channel_v3_{i}', 'name': f'频道{i}'} for i in range(1, self.config.homefeed_channels)]
+        return _ok({'categories': categories})
+
+    def homefeed(self, body: dict):
+        # 每页20条，与上一页重叠一半，不同频道的起点不同但范围有交叉
+        channel = sum(map(ord, body.get('category', '')))
+        start = channel * 7 + int(body.get('note_index', 0)) // 2
+        pool = self.config.homefeed_pool
+        items = []
+        for i in range(start, start + int(body.get('num', 20))):
+            note_id = _note_id('homefeed', i % pool)
+            items.append({'id': note_id, 'model_type': 'note', 'xsec_token': 'mock_token', 'track_id': f'track_{i}', 'note_card': {
+                'type': 'video' if i % 5 == 0 else 'normal', 'display_title': f'推荐笔记 {note_id[:6]}',
+                'user': self.user(f'u{note_id[:23]}'), 'interact_info': {'liked': False, 'liked_count': str(i % pool * 13)},
+                'cover': {'url_default': f'{self.base_url}/cdn/img/{note_id}_cover.jpg', 'width': 1080, 'height': 1440}}})
+        return _ok({'items': items, 'cursor_score': f'1.{start + 20}'})
+
+    def creator_posted(self, query: dict):
+        # 每页10条，最新的在前，最后一页返回 page -1
+        page = int(query.get('page') or 0)
+        total = self.config.creator_notes
+        notes = [{'id': _note_id('creator', total - 1 - i), 'display_title': f'发布笔记{total - 1 - i}', 'type': 'normal',
+                  'time': '2025-01-01 12:00', 'likes': i, 'collected_count': i // 2, 'comments_count': i // 3,
+                  'shared_count': i // 5, 'view_count': i * 10} for i in range(page * 10, min(page * 10 + 10, total))]
+        next_page = page + 1 if (page + 1) * 10 < total else -1
+        return _ok({'notes': notes, 'page': next_page, 'tags': [{'id': 'special.note_time_desc', 'name': '所有笔记', 'notes_count': total}]})
+
+    def user_posted(self, query: dict):
+        user_id = query.get('user_id', 'user')
+        start = int(query.get('cursor') or 0)
+        num = int(query.get('num') or 30)
+        end = min(start + num, self.config.notes_per_user)
+        notes = [{'note_id': _note_id(user_id, i), 'xsec_token': 'mock_token', 'type': 'normal',
+                  'display_title': f'模拟笔记{i}', 'user': self.user(user_id)} for i in range(start, end)]
+        return _ok({'notes': notes, 'cursor': str(end), 'has_more': end < self.config.notes_per_user})
+
+    def search_notes(self, body: dict):
+        keyword = body.get('keyword', '')
+        page = int(body.get('page', 1))
+        page_size = int(body.get('page_size', 20))
+        start = (page - 1) * page_size
+        end = min(start + page_size, self.config.search_total)
+        items = [self.note_card(_note_id(keyword, i)) for i in range(start, end)]
+        return _ok({'items': items, 'has_more': end < self.config.search_total})
+
+    def comment_page(self, query: dict):
+        note_id = query.get('note_id', '')
+        start = int(query.get('cursor') or 0)
+        end = min(start + 10, self.config.comments_per_note)
+        comments = []
+        for i in range(start, end):
+            comment_id = _note_id(f'c{note_id}', i)
+            preview = min(3, self.config.sub_comments_per_comment)
+            comment = self.comment(note_id, comment_id)
+            comment['sub_comments'] = [self.comment(note_id, _note_id(comment_id, j), comment_id) for j in range(preview)]
+            comment['sub_comment_count'] = str(self.config.sub_comments_per_comment)
+            comment['sub_comment_has_more'] = self.config.sub_comments_per_comment > preview
+            comment['sub_comment_cursor'] = str(preview)
+            comments.append(comment)
+        return _ok({'comments': comments, 'cursor': str(end), 'has_more': end < self.config.comments_per_note})
+
+    def comment_sub_page(self, query: dict):
+        note_id = query.get('note_id', '')
+        root_id = query.get('root_comment_id', '')
+        start = int(query.get('cursor') or 0)
+        num = int(query.get('num') or 10)
+        end = min(start + num, self.config.sub_comments_per_comment)
+        comments = [self.comment(note_id, _note_id(root_id, j), _note_id(root_id, j - 1) if j % 2 else root_id) for j in range(start, end)]
+        return _ok({'comments': comments, 'cursor': str(end), 'has_more': end < self.config.sub_comments_per_comment})
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockXHS/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # 响应头和响应体分两次写出，不关闭 Nagle 时与客户端的延迟确认叠加，每个响应多出约40ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _handle(self, method: str):
+        server = self.server
+        config = server.config
+        parsed = urllib.parse.urlparse(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items()}
+        body = {}
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw.decode('utf-8')) if raw else {}
+            except ValueError:
+                body = {}
+        server.count(parsed.path)
+
+        delay = config.latency + (config.random() * config.jitter if config.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if parsed.path.startswith('/cdn/'):
+            self._send(200, *server.media(parsed))
+            return
+
+        if parsed.path.startswith('/explore/'):
+            self._send(200, server.data.explore_page(parsed.path.split('/')[-1]), 'text/html; charset=utf-8')
+            return
+
+        if config.error_rate and config.random() < config.error_rate:
+            if config.random() < 0.5:
+                self._send(500, b'{"success": false, "msg": "mock internal error"}')
+            else:
+                self._send_json({'code': -1, 'success': False, 'msg': 'mock injected error', 'data': {}})
+            return
+
+        fixture = server.fixture(parsed.path)
+        if fixture is not None:
+            self._send(200, fixture)
+            return
+
+        data = server.data
+        routes = {
+            '/api/sns/web/v1/feed': lambda: data.feed(body),
+            '/api/sns/web/v1/homefeed/category': data.homefeed_category,
+            '/api/sns/web/v1/homefeed': lambda: data.homefeed(body),
+            '/api/sns/web/unread_count': data.unread_count,
+            '/web_api/sns/v5/creator/note/user/posted': lambda: data.creator_posted(query),
+            '/api/sns/web/v1/you/mentions': lambda: data.messages('mentions', query),
+            '/api/sns/web/v1/you/likes': lambda: data.messages('likes', query),
+            '/api/sns/web/v1/you/connections': lambda: data.messages('connections', query),
+            '/api/sns/web/v1/user_posted': lambda: data.user_posted(query),
+            '/api/sns/web/v1/user/otherinfo': lambda: data.user_info(query),
+            '/api/sns/web/v1/search/notes': lambda: data.search_notes(body),
+            '/api/sns/web/v2/comment/page': lambda: data.comment_page(query),
+            '/api/sns/web/v2/comment/sub/page': lambda: data.comment_sub_page(query),
+        }
+        if parsed.path in routes:
+            self._send_json(routes[parsed.path]())
+        else:
+            self._send(404, b'{"success": false, "msg": "not found"}')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class MockXHSServer(ThreadingHTTPServer):
+    """
+    模拟服务，在后台线程运行
+        server = MockXHSServer(MockConfig(latency=0.02)).start()
+        XHS_Apis(base_url=server.base_url)
+        server.stop()
+    """
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig = None, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), MockHandler)
+        self.config = config or MockConfig()
+        self.base_url = f'http://{host}:{self.server_address[1]}'
+        self.data = SyntheticData(self.config, self.base_url)
+        self.media_payload = os.urandom(self.config.media_bytes)
+        self.request_counts = {}
+        self._count_lock = threading.Lock()
+        self._fixtures = {}
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # 客户端读到需要的内容就断开（如流式读取笔记网页）是正常情况
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def media(self, parsed) -> tuple:
+        """
+        模拟图床：带 imageView2/2/w/<宽度>/format/<格式> 时按格式和宽度缩小返回的字节数
+        :return: (内容, Content-Type)
+        """
+        if '/video/' in parsed.path:
+            return self.media_payload, 'video/mp4'
+        view = re.search(r'imageView2/\d+/w/(\d*)/format/(\w+)', urllib.parse.unquote(parsed.query))
+        if not view:
+            return self.media_payload, 'image/jpeg'
+        width, fmt = int(view.group(1) or IMAGE_WIDTH), view.group(2).lower()
+        scale = FORMAT_RATIOS.get(fmt, 1.0) * min(1.0, width / IMAGE_WIDTH) ** 2
+        return self.media_payload[:max(1, int(len(self.media_payload) * scale))], 'image/' + ('jpeg' if fmt == 'jpg' else fmt)
+
+    def count(self, path: str):
+        with self._count_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def _load_fixtures(self, path: str) -> list:
+        """
+        :return: 该接口录制的各页响应，最后多一项为 has_more=false 的最后一页；没有录制时为空列表
+        """
+        name = path.strip('/').replace('/', '_')
+        files = []
+        single = os.path.join(self.config.fixtures, name + '.json')
+        if os.path.exists(single):
+            files.append(single)
+        else:
+            while os.path.exists(os.path.join(self.config.fixtures, f'{name}.{len(files) + 1}.json')):
+                files.append(os.path.join(self.config.fixtures, f'{name}.{len(files) + 1}.json'))
+        pages = [open(file_path, 'rb').read() for file_path in files]
+        if pages:
+            last = json.loads(pages[-1].decode('utf-8'))
+            if isinstance(last.get('data'), dict) and 'has_more' in last['data']:
+                last['data']['has_more'] = False
+            pages.append(json.dumps(last, ensure_ascii=False).encode('utf-8'))
+        return pages
+
+    def fixture(self, path: str):
+        """
+        读取录制的响应，同一接口的各页按请求顺序回放，回放完后总是返回没有下一页的最后一页
+        """
+        if not self.config.fixtures:
+            return None
+        with self._count_lock:
+            if path not in self._fixtures:
+                self._fixtures[path] = [self._load_fixtures(path), 0]
+            pages, served = self._fixtures[path]
+            if not pages:
+                return None
+            self._fixtures[path][1] = served + 1
+        return pages[min(served, len(pages) - 1)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的小红书接口服务')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟抖动上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='错误注入概率')
+    parser.add_argument('--fixtures', help='录制响应所在目录')
+    args = parser.parse_args()
+    server = MockXHSServer(MockConfig(args.latency, args.jitter, args.error_rate, args.fixtures), port=args.port)
+    print(f'模拟服务已启动: {server.base_url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,35 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 from apis.xhs_pc_apis import XHS_Apis
 from xhs_utils.common_util import init
-from xhs_utils.data_util import handle_note_info, download_note, save_to_xlsx, handle_comment_info
+from xhs_utils.data_util import handle_note_info, download_note, save_to_xlsx
+from xhs_utils.comment_util import build_comment_graph
+from xhs_utils.search_util import SearchFanout, expand_tasks
+from xhs_utils.user_util import UserEnricher, collect_user_ids
+from xhs_utils.feed_util import HomefeedHarvester
+from xhs_utils.media_util import MediaResolver
+from xhs_utils.trace_util import traced
 
 
 class Data_Spider():
-    def __init__(self):
-        self.xhs_apis = XHS_Apis()
+    def __init__(self, xhs_apis: XHS_Apis = None, media_resolver: MediaResolver = None, media_profile: str = 'original'):
+        """
+        :param media_resolver: 补全无水印视频地址，默认与 xhs_apis 共用连接
+        :param media_profile: 下载图片/视频的规格（media_util.MEDIA_PROFILES）
+        """
+        self.xhs_apis = xhs_apis or XHS_Apis()
+        self.media_resolver = media_resolver or MediaResolver(session=self.xhs_apis.session)
+        self.media_profile = media_profile
 
-    def spider_note(self, note_url: str, cookies_str: str, proxies=None):
+    @traced('spider.spider_note')
+    def spider_note(self, note_url: str, cookies_str: str, proxies=None, resolve_media: bool = True):
         """
         爬取一个笔记的信息
         :param note_url:
         :param cookies_str:
+        :param resolve_media: 笔记数据里没有无水印视频时请求网页补全，批量爬取时传 False 之后统一用 media_resolver.resolve_many
         :return:
         """
         note_info = None
@@ -24,12 +39,15 @@ class Data_Spider():
                 note_info = note_info['data']['items'][0]
                 note_info['url'] = note_url
                 note_info = handle_note_info(note_info)
+                if resolve_media:
+                    self.media_resolver.resolve_many([note_info], proxies)
         except Exception as e:
             success = False
             msg = e
         logger.info(f'爬取笔记信息 {note_url}: {success}, msg: {msg}')
         return success, msg, note_info
 
+    @traced('spider.spider_some_note')
     def spider_some_note(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None):
         """
         爬取一些笔记的信息
@@ -42,17 +60,28 @@ class Data_Spider():
             raise ValueError('excel_name 不能为空')
         note_list = []
         for note_url in notes:
-            success, msg, note_info = self.spider_note(note_url, cookies_str, proxies)
+            success, msg, note_info = self.spider_note(note_url, cookies_str, proxies, resolve_media=False)
             if note_info is not None and success:
                 note_list.append(note_info)
-        for note_info in note_list:
-            if save_choice == 'all' or 'media' in save_choice:
-                download_note(note_info, base_path['media'], save_choice)
+        self.media_resolver.resolve_many(note_list, proxies)
+        if save_choice == 'all' or 'media' in save_choice:
+            self.download_notes(note_list, base_path, save_choice)
         if save_choice == 'all' or save_choice == 'excel':
             file_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx'))
             save_to_xlsx(note_list, file_path)
 
 
+    def download_notes(self, note_list: list, base_path: dict, save_choice: str):
+        """
+        逐篇下载笔记媒体，单篇失败只记录，不影响其他笔记和之后的Excel保存
+        """
+        for note_info in note_list:
+            try:
+                download_note(note_info, base_path['media'], save_choice, self.media_profile)
+            except Exception as e:
+                logger.warning(f'笔记 {note_info["note_id"]} 媒体下载失败: {e}')
+
+    @traced('spider.spider_user_all_note')
     def spider_user_all_note(self, user_url: str, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', proxies=None):
         """
         爬取一个用户的所有笔记
@@ -78,6 +107,7 @@ class Data_Spider():
         logger.info(f'爬取用户所有视频 {user_url}: {success}, msg: {msg}')
         return note_list, success, msg
 
+    @traced('spider.spider_some_search_note')
     def spider_some_search_note(self, query: str, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None,  excel_name: str = '', proxies=None):
         """
             指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
@@ -110,6 +140,50 @@ class Data_Spider():
         logger.info(f'搜索关键词 {query} 笔记: {success}, msg: {msg}')
         return note_list, success, msg
 
+    @traced('spider.spider_search_fanout')
+    def spider_search_fanout(self, queries: list, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None, excel_name: str = '', concurrency: int = 4, proxies=None):
+        """
+            多个关键词、多种筛选条件组合并发搜索，笔记按id去重，每篇笔记的详情和媒体只获取一次
+            :param queries 搜索的关键词列表
+            :param require_num 每个搜索的数量
+            :param sort_type_choice / note_type / note_time / note_range / pos_distance 同 spider_some_search_note，可以是单个值或列表（取所有组合）
+            :param concurrency 同时进行的请求数
+            返回笔记信息列表（多一个 queries 字段：命中该笔记的搜索），保存到excel时多一列 命中搜索
+        """
+        if (save_choice == 'all' or save_choice == 'excel') and excel_name == '':
+            raise ValueError('excel_name 不能为空')
+        tasks = expand_tasks(queries, sort_type_choice, note_type, note_time, note_range, pos_distance, geo)
+        hits, failures = SearchFanout(self.xhs_apis, cookies_str, proxies, concurrency).run(tasks, require_num)
+        note_list = []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(self.spider_note, hit.url, cookies_str, proxies, resolve_media=False): hit for hit in hits.values()}
+            for future in as_completed(futures):
+                success, msg, note_info = future.result()
+                if note_info is not None and success:
+                    note_info['queries'] = futures[future].queries
+                    note_list.append(note_info)
+        self.media_resolver.resolve_many(note_list, proxies)
+        if save_choice == 'all' or 'media' in save_choice:
+            self.download_notes(note_list, base_path, save_choice)
+        if save_choice == 'all' or save_choice == 'excel':
+            file_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx'))
+            save_to_xlsx(note_list, file_path, type='search_note')
+        success = len(failures) < len(tasks)
+        msg = f'{len(tasks)} 个搜索，{len(hits)} 篇笔记，失败 {len(failures)} 个搜索'
+        logger.info(f'多关键词搜索 {queries}: {success}, msg: {msg}')
+        return note_list, success, msg
+
+    def handle_note_comments(self, all_comments: list, note_id: str, note_url: str):
+        """
+        把接口返回的一级评论（含二级评论）展开处理成 Comment，并确定主评论、父评论、回复层级和楼内序号
+        原始评论数据不会被修改，处理完后调用方可以直接丢弃；需要边处理边写出时用 comment_util.iter_comments
+        :param all_comments: get_note_all_comment 返回的评论列表
+        :param note_id: 笔记id
+        :param note_url: 笔记的URL
+        :return: comment_list，Comment 列表（to_dict / to_row 转成原来的格式）
+        """
+        return build_comment_graph(all_comments, note_id, note_url)
+
     def spider_note_comments(self, note_url: str, cookies_str: str, base_path: dict, excel_name: str = '', proxies=None):
         """
         爬取一个笔记的所有评论（包括一级和二级评论）
@@ -118,7 +192,16 @@ class Data_Spider():
         :param base_path: 保存路径字典
         :param excel_name: Excel文件名（不含扩展名）
         :param proxies: 代理设置（可选）
-        :return: success, msg, comment_list
+        :return: success, msg, comment_list（评论 dict 列表）
+        """
+        success, msg, comment_list = self.spider_note_comment_models(note_url, cookies_str, base_path, excel_name, proxies)
+        return success, msg, [comment.to_dict() for comment in comment_list]
+
+    @traced('spider.spider_note_comments')
+    def spider_note_comment_models(self, note_url: str, cookies_str: str, base_path: dict, excel_name: str = '', proxies=None):
+        """
+        同 spider_note_comments，评论保存为 Comment，评论很多时比 dict 占用内存少得多
+        :return: success, msg, comment_list（Comment 列表，to_dict / to_row 转成原来的格式）
         """
         import urllib.parse
         comment_list = []
@@ -150,67 +233,10 @@ class Data_Spider():
             
             logger.info(f'成功获取 {len(all_comments)} 条一级评论')
             
-            # 处理评论数据
-            # 先处理所有一级评论，建立评论ID映射
-            comment_id_map = {}  # {comment_id: processed_comment}
-            
-            for comment in all_comments:
-                # 确保评论数据包含必要的字段
-                if 'note_id' not in comment:
-                    comment['note_id'] = note_id
-                comment['note_url'] = note_url
-                
-                # 处理一级评论
-                try:
-                    root_comment_id = comment.get('id')  # 一级评论的ID作为主评论ID
-                    processed_comment = handle_comment_info(comment, root_comment_id=None, parent_comment_id=None)  # None表示这是一级评论
-                    comment_list.append(processed_comment)
-                    comment_id_map[root_comment_id] = processed_comment  # 保存映射，用于后续回复关系
-                except Exception as e:
-                    logger.warning(f'处理一级评论失败: {e}, comment_id: {comment.get("id", "unknown")}')
-                    continue
-                
-                # 处理二级评论（如果有）
-                if 'sub_comments' in comment and comment['sub_comments']:
-                    for sub_comment in comment['sub_comments']:
-                        if 'note_id' not in sub_comment:
-                            sub_comment['note_id'] = note_id
-                        sub_comment['note_url'] = note_url
-                        try:
-                            # 确定父评论ID：优先使用target_comment_id，否则使用主评论ID
-                            parent_id = None
-                            # 尝试从sub_comment中获取target_comment_id（回复的目标评论ID）
-                            target_id = (sub_comment.get('target_comment_id') or 
-                                        sub_comment.get('target_id') or 
-                                        sub_comment.get('reply_to_comment_id') or
-                                        sub_comment.get('target_comment', {}).get('id') if isinstance(sub_comment.get('target_comment'), dict) else None)
-                            
-                            if target_id:
-                                # 如果target_id存在，检查是否是回复主评论还是回复其他二级评论
-                                if target_id == root_comment_id:
-                                    # 回复主评论
-                                    parent_id = root_comment_id
-                                elif target_id in comment_id_map:
-                                    # 回复其他二级评论
-                                    parent_id = target_id
-                                else:
-                                    # target_id不在已知评论中，可能是回复主评论
-                                    parent_id = root_comment_id
-                            else:
-                                # 如果没有target_id，默认回复主评论
-                                parent_id = root_comment_id
-                            
-                            # 传入主评论ID和父评论ID
-                            processed_sub_comment = handle_comment_info(
-                                sub_comment, 
-                                root_comment_id=root_comment_id,
-                                parent_comment_id=parent_id
-                            )
-                            comment_list.append(processed_sub_comment)
-                            comment_id_map[sub_comment.get('id')] = processed_sub_comment  # 保存映射，用于后续回复关系
-                        except Exception as e:
-                            logger.warning(f'处理二级评论失败: {e}, comment_id: {sub_comment.get("id", "unknown")}')
-            
+            comment_list = self.handle_note_comments(all_comments, note_id, note_url)
+            # 原始评论数据不再需要，尽早释放
+            del all_comments
+
             # 保存到Excel
             if excel_name == '':
                 excel_name = f'note_{note_id}_comments'
@@ -227,6 +253,51 @@ class Data_Spider():
             logger.error(f'爬取评论异常: {msg}')
             return success, msg, comment_list
 
+    @traced('spider.spider_user_profiles')
+    def spider_user_profiles(self, records: list, cookies_str: str, base_path: dict, excel_name: str = 'users', concurrency: int = 8, proxies=None):
+        """
+        批量获取笔记作者或评论者的用户信息（粉丝数、获赞与收藏等），同一个用户只请求一次
+        :param records: Note / Comment 列表（如 spider_note_comments 的结果）或 user_id 列表
+        :param cookies_str: cookies字符串
+        :param base_path: 保存路径字典
+        :param excel_name: Excel文件名（不含扩展名），为空时不保存
+        :param concurrency: 同时进行的请求数
+        :return: user_list（User 列表）, success, msg
+        """
+        users, failures = UserEnricher(self.xhs_apis, cookies_str, proxies, concurrency).run(collect_user_ids(records))
+        user_list = list(users.values())
+        if excel_name:
+            file_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx'))
+            save_to_xlsx(user_list, file_path, type='user')
+        success = not failures or bool(user_list)
+        msg = f'{len(user_list)} 个用户，失败 {len(failures)} 个'
+        logger.info(f'批量获取用户信息: {success}, msg: {msg}')
+        return user_list, success, msg
+
+    @traced('spider.spider_homefeed')
+    def spider_homefeed(self, cookies_str: str, base_path: dict, channels: list = None, require_num: int = 100, excel_name: str = 'homefeed', concurrency: int = 4, proxies=None):
+        """
+        所有频道并发采集主页推荐，笔记按id去重，每个频道连续几页没有新笔记时停止
+        :param channels: 频道id列表，None 为全部频道（get_homefeed_all_channel）
+        :param require_num: 每个频道的新笔记数量
+        :param excel_name: Excel文件名（不含扩展名），为空时不保存
+        :param concurrency: 同时翻页的频道数
+        :return: card_list（FeedCard 列表，详情用 spider_some_note([card.note_url ...]) 获取）, success, msg
+        """
+        harvester = HomefeedHarvester(self.xhs_apis, cookies_str, proxies, concurrency)
+        try:
+            card_list, failures = harvester.run(channels, require_num)
+        except Exception as e:
+            logger.error(f'获取主页频道失败: {e}')
+            return [], False, str(e)
+        if excel_name:
+            file_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx'))
+            save_to_xlsx(card_list, file_path, type='homefeed')
+        success = len(failures) < len(harvester.stats) or not harvester.stats
+        msg = f'{len(harvester.stats)} 个频道，{len(card_list)} 篇笔记，失败 {len(failures)} 个频道'
+        logger.info(f'采集主页推荐: {success}, msg: {msg}')
+        return card_list, success, msg
+
 if __name__ == '__main__':
     """
         此文件为爬虫的入口文件，可以直接运行
@@ -268,6 +339,13 @@ if __name__ == '__main__':
     # }
     # data_spider.spider_some_search_note(query, query_num, cookies_str, base_path, 'all', sort_type_choice, note_type, note_time, note_range, pos_distance, geo=None)
 
+    # 多个关键词、多种筛选条件一起搜索，笔记去重，每篇只获取一次详情，excel中记录命中的搜索
+    # queries = ["粉底液", "干皮粉底液", "持妆粉底液"]
+    # data_spider.spider_search_fanout(queries, 50, cookies_str, base_path, 'excel', sort_type_choice=[0, 2], note_type=[0, 2], excel_name='粉底液')
+
+    # 所有频道的主页推荐，笔记去重，保存到 homefeed.xlsx
+    # data_spider.spider_homefeed(cookies_str, base_path, require_num=100, concurrency=4)
+
     # 4 爬取指定笔记的所有评论
     note_url = 'https://www.xiaohongshu.com/explore/6909a4c30000000005012d93?xsec_token=ABbSltgEnndyV1aDOGXSIeIOHVmH4l4476vtl4GZ3bFwY=&xsec_source=pc_search&source=unknown'
     success, msg, comments = data_spider.spider_note_comments(note_url, cookies_str, base_path, 'note_comments_2')
@@ -275,3 +353,7 @@ if __name__ == '__main__':
         logger.info(f'成功爬取 {len(comments)} 条评论')
     else:
         logger.error(f'爬取评论失败: {msg}')
+
+    # 5 补全评论者的用户信息（粉丝数等），保存到 users.xlsx
+    # if success:
+    #     data_spider.spider_user_profiles(comments, cookies_str, base_path, 'note_comments_2_users')
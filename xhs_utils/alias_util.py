@@ -0,0 +1,194 @@
+"""
+产品别称归一化
+使用 Aho-Corasick 自动机对品牌/产品别称做多模式匹配，一次扫描即可找出文本中出现的所有别称
+1. LLM 返回后：把 product 字段统一成标准产品名，避免同一产品在排名表里被拆成多行
+2. LLM 调用前：对话里既没有提到已知产品也没有提到肤质关键词时直接跳过，节省API费用
+"""
+from collections import deque
+
+
+def _is_ascii_alnum(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+# 标准产品名 -> 别称列表（system_prompt 中的别称映射也由这张表生成）
+PRODUCT_ALIASES = {
+    '兰蔻菁纯': ['菁纯', '兰蔻菁纯'],
+    '雅诗兰黛沁水': ['沁水', '雅诗兰黛沁水', 'DW沁水'],
+    '雅诗兰黛DW': ['DW', 'double wear', '雅诗兰黛DW'],
+    '芭比波朗虫草': ['虫草', 'bobbi brown虫草', 'BB虫草'],
+    'Nars超方瓶': ['超方瓶', 'Nars超方瓶'],
+    '阿玛尼蓝标': ['蓝标', '阿玛尼蓝标', '大师', '阿玛尼大师'],
+    '香奈儿果冻': ['果冻', '香奈儿果冻'],
+    '兰蔻持妆': ['持妆', '兰蔻持妆'],
+    '红地球': ['红地球', 'red earth'],
+    'Zelens': ['zelens'],
+    '植村秀小方瓶': ['植村秀', '植村秀小方瓶'],
+}
+
+# 品牌及品类词：出现即认为对话在讨论产品，但不参与 product 字段的归一化
+BRAND_KEYWORDS = [
+    '兰蔻', '雅诗兰黛', '芭比波朗', 'bobbi brown', 'nars', '阿玛尼', '香奈儿', '植村秀', 'ysl', '圣罗兰',
+    '娇兰', '迪奥', 'dior', '纪梵希', '肌肤之钥', 'cpb', '资生堂', '毛戈平', '花西子', '彩棠', '卡姿兰',
+    'mac', '魅可', 'tf', '汤姆福特', '粉底', '粉底液', '气垫', '粉霜', '粉膏',
+]
+
+# 肤质及妆效关键词
+SKIN_KEYWORDS = [
+    '干皮', '混干', '干性', '油皮', '混油', '肤质', '拔干', '卡粉', '起皮', '斑驳', '裂开', '浮粉', '假面',
+    '脱妆', '氧化', '暗沉', '滋润', '服帖', '保湿', '水润', '奶油肌', '妈生皮',
+]
+
+
+class AhoCorasick():
+    """
+    Aho-Corasick 多模式匹配自动机
+    模式统一转小写后插入，匹配时同样对文本转小写，实现大小写不敏感
+    模式首/尾是英文字母或数字时，要求文本中相邻的字符不是英文字母或数字（'tf' 不匹配 'tfboys'，'dw' 不匹配 'dwg'）
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.built = False
+
+    def add(self, pattern: str, value=None):
+        """
+        添加一个模式
+        :param pattern: 模式串
+        :param value: 命中时返回的值，默认返回模式本身
+        """
+        pattern = pattern.lower()
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append((pattern, pattern if value is None else value))
+        self.built = False
+
+    def build(self):
+        """
+        用BFS构建失配指针，并把失配链上的输出合并到当前状态
+        """
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and ch not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(ch, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        self.built = True
+
+    def iter_matches(self, text: str):
+        """
+        扫描文本，逐个返回命中结果
+        :param text: 待匹配文本
+        :return: 生成 (结束位置, 模式, 值)
+        """
+        if not self.built:
+            self.build()
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        text = text.lower()
+        last = len(text) - 1
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern, value in output[state]:
+                start = index - len(pattern) + 1
+                if _is_ascii_alnum(pattern[0]) and start > 0 and _is_ascii_alnum(text[start - 1]):
+                    continue
+                if _is_ascii_alnum(pattern[-1]) and index < last and _is_ascii_alnum(text[index + 1]):
+                    continue
+                yield index, pattern, value
+
+
+class ProductNormalizer():
+    """
+    产品别称归一化器
+    """
+
+    def __init__(self, aliases: dict = None, keywords: list = None):
+        """
+        :param aliases: {标准产品名: [别称, ...]}，默认使用 PRODUCT_ALIASES
+        :param keywords: 额外的预过滤关键词，默认使用 BRAND_KEYWORDS + SKIN_KEYWORDS
+        """
+        self.aliases = aliases if aliases is not None else PRODUCT_ALIASES
+        self.alias_matcher = AhoCorasick()
+        for canonical, alias_list in self.aliases.items():
+            self.alias_matcher.add(canonical, canonical)
+            for alias in alias_list:
+                self.alias_matcher.add(alias, canonical)
+        self.alias_matcher.build()
+
+        self.keyword_matcher = AhoCorasick()
+        for canonical in self.aliases:
+            self.keyword_matcher.add(canonical, 'product')
+            for alias in self.aliases[canonical]:
+                self.keyword_matcher.add(alias, 'product')
+        for keyword in (keywords if keywords is not None else BRAND_KEYWORDS + SKIN_KEYWORDS):
+            self.keyword_matcher.add(keyword, 'keyword')
+        self.keyword_matcher.build()
+
+    def canonicalize(self, product: str) -> str:
+        """
+        把LLM输出的产品名统一为标准产品名
+        命中多个别称时取最长的那个（如 "DW沁水" 优先于 "DW"），没有命中则原样返回
+        :param product: 产品名
+        :return: 标准产品名
+        """
+        if not isinstance(product, str):
+            return product
+        product = product.strip()
+        best_len, best_value = 0, None
+        for _, pattern, value in self.alias_matcher.iter_matches(product):
+            if len(pattern) > best_len:
+                best_len, best_value = len(pattern), value
+        return best_value if best_value is not None else product
+
+    def find_products(self, text: str) -> list:
+        """
+        找出文本中提到的所有标准产品名（按首次出现顺序去重）
+        :param text: 文本
+        :return: 标准产品名列表
+        """
+        products = []
+        for _, _, value in self.alias_matcher.iter_matches(text):
+            if value not in products:
+                products.append(value)
+        return products
+
+    def has_keyword(self, text: str) -> bool:
+        """
+        文本中是否提到了已知产品、品牌或肤质关键词
+        :param text: 文本
+        :return: bool
+        """
+        for _ in self.keyword_matcher.iter_matches(text):
+            return True
+        return False
+
+    def format_prompt_aliases(self) -> str:
+        """
+        生成 system_prompt 中的别称映射说明
+        """
+        lines = []
+        for canonical, alias_list in self.aliases.items():
+            names = '、'.join(f'"{alias}"' for alias in alias_list)
+            lines.append(f'     * {names} → "{canonical}"')
+        return '\n'.join(lines)
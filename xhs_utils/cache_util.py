@@ -0,0 +1,175 @@
+"""
+接口响应缓存
+同一次采集中反复用相同参数请求的 GET 接口（同一个作者的用户信息、搜索联想词、频道列表、自己的信息等）在有效期内直接返回缓存，
+命中时不签名、不发请求：
+- 内存 LRU，按 接口路径 + 排序后的参数 作为键，按接口分别设置有效期，没有设置有效期的接口不缓存
+- 可选的磁盘缓存（SQLite），进程重启或多个进程之间共用，内存未命中时再查磁盘
+- 只缓存成功的响应；保存原始响应字节，每次命中重新解析，调用方修改返回的 dict 不会影响缓存
+- 与账号相关的接口（自己的信息）键中带上 cookie 标识，不同账号互不命中
+
+    cache = ResponseCache(ttls={'/api/sns/web/v1/user/otherinfo': 600}, disk_path='datas/cache.db')
+    xhs_apis = XHS_Apis(cache=cache)
+    cache.stats()
+"""
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, defaultdict
+from xhs_utils.metrics_util import REGISTRY
+from xhs_utils.trace_util import cookie_id
+
+# 默认有效期（秒）
+DEFAULT_TTLS = {
+    '/api/sns/web/v1/user/otherinfo': 600,
+    '/api/sns/web/v1/search/recommend': 3600,
+    '/api/sns/web/v1/homefeed/category': 86400,
+    '/api/sns/web/v1/user/selfinfo': 300,
+    '/api/sns/web/v2/user/me': 300,
+}
+
+# 响应与账号相关的接口
+ACCOUNT_SCOPED = {'/api/sns/web/v1/user/selfinfo', '/api/sns/web/v2/user/me'}
+
+CACHE_LOOKUPS = REGISTRY.counter('xhs_response_cache_total', '接口响应缓存查询数（result: hit / disk_hit / miss）', ('endpoint', 'result'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    body BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses (expires_at);
+"""
+
+
+def cache_key(api: str, cookies_str: str = '') -> tuple:
+    """
+    :param api: 接口路径，带拼接好的参数
+    :return: (接口路径, 缓存键)，参数顺序不同的同一请求键相同
+    """
+    endpoint, _, query = api.partition('?')
+    params = sorted(urllib.parse.parse_qsl(query, keep_blank_values=True))
+    key = endpoint + '?' + urllib.parse.urlencode(params) if params else endpoint
+    if endpoint in ACCOUNT_SCOPED:
+        key = f'{cookie_id(cookies_str)}:{key}'
+    return endpoint, key
+
+
+class ResponseCache():
+    def __init__(self, ttls: dict = None, max_entries: int = 4096, disk_path: str = None):
+        """
+        :param ttls: {接口路径: 有效期秒数}，与 DEFAULT_TTLS 合并，设为0可关闭某个接口的缓存
+        :param max_entries: 内存中最多保存的响应数，超出时淘汰最久未使用的
+        :param disk_path: 磁盘缓存的SQLite文件，None 为只用内存
+        """
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self.conn = None
+        if disk_path:
+            if os.path.dirname(disk_path):
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self.conn = sqlite3.connect(disk_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(_SCHEMA)
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, 0)
+
+    def _count(self, endpoint: str, result: str):
+        self._stats[endpoint][result] += 1
+        if result in ('hit', 'disk_hit', 'miss'):
+            CACHE_LOOKUPS.inc(endpoint=endpoint, result=result)
+
+    def get(self, endpoint: str, key: str):
+        """
+        :return: 缓存的响应字节，没有或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                body, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, 'hit')
+                    return body
+                del self._entries[key]
+                self._count(endpoint, 'expired')
+            if self.conn is not None:
+                row = self.conn.execute('SELECT body, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self._count(endpoint, 'disk_hit')
+                    return row[0]
+            self._count(endpoint, 'miss')
+        return None
+
+    def put(self, endpoint: str, key: str, body: bytes):
+        """
+        保存一个成功的响应，接口没有设置有效期时忽略
+        """
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, body, expires_at)
+            self._count(endpoint, 'store')
+            if self.conn is not None:
+                self.conn.execute('INSERT OR REPLACE INTO responses (key, endpoint, body, expires_at) VALUES (?, ?, ?, ?)',
+                                  (key, endpoint, body, expires_at))
+
+    def _remember(self, key: str, body: bytes, expires_at: float):
+        self._entries[key] = (body, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['*']['evicted'] += 1
+
+    def clear(self, expired_only: bool = False):
+        """
+        :param expired_only: 只删除过期的（包括磁盘缓存）
+        """
+        now = time.time()
+        with self._lock:
+            if expired_only:
+                for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                    del self._entries[key]
+            else:
+                self._entries.clear()
+            if self.conn is not None:
+                if expired_only:
+                    self.conn.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+                else:
+                    self.conn.execute('DELETE FROM responses')
+
+    def stats(self) -> dict:
+        """
+        :return: {接口路径: {'hit', 'disk_hit', 'miss', 'expired', 'store', 'hit_rate'}}，'*' 为全部接口的合计（含淘汰数 evicted）
+        """
+        with self._lock:
+            result = {}
+            total = defaultdict(int)
+            for endpoint, counts in self._stats.items():
+                for name, value in counts.items():
+                    total[name] += value
+                if endpoint != '*':
+                    result[endpoint] = dict(counts)
+            result['*'] = dict(total)
+            result['*']['entries'] = len(self._entries)
+        for counts in result.values():
+            hits = counts.get('hit', 0) + counts.get('disk_hit', 0)
+            lookups = hits + counts.get('miss', 0)
+            counts['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
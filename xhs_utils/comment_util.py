@@ -0,0 +1,110 @@
+"""
+评论处理
+把 get_note_all_comment 返回的评论（一级评论带 sub_comments）逐条转成 Comment：
+- 不修改原始数据，note_id / note_url 作为参数传入
+- 单条评论格式异常时记录日志并跳过，一级评论异常时连同它的二级评论一起跳过
+- iter_comments：生成器，一边遍历一边产出，可以直接写入 sink；只能识别回复已出现过的评论
+- build_comment_graph：先索引整篇笔记的全部评论再确定回复关系，回复后面才出现的评论也能正确识别
+两者都会填写回复层级 depth 和楼内序号 thread_position
+"""
+from typing import Iterator
+from loguru import logger
+from xhs_utils.model_util import Comment, target_id_of
+
+
+def _iter_records(all_comments: list, note_id: str, note_url: str):
+    """
+    :return: (Comment, 回复目标id) 生成器，二级评论的父评论先填主评论
+    """
+    from_raw = Comment.from_raw
+    for comment in all_comments:
+        try:
+            record = from_raw(comment, note_id, note_url)
+        except Exception as e:
+            logger.warning(f'处理一级评论失败: {e}, comment_id: {comment.get("id", "unknown")}')
+            continue
+        root_comment_id = record.comment_id
+        yield record, None
+
+        for sub_comment in comment.get('sub_comments') or ():
+            try:
+                record = from_raw(sub_comment, note_id, note_url, root_comment_id, root_comment_id)
+                target_id = target_id_of(sub_comment)
+            except Exception as e:
+                logger.warning(f'处理二级评论失败: {e}, comment_id: {sub_comment.get("id", "unknown")}')
+                continue
+            yield record, target_id
+
+
+def iter_comments(all_comments: list, note_id: str, note_url: str) -> Iterator[Comment]:
+    """
+    :param all_comments: get_note_all_comment 返回的评论列表
+    :param note_id: 笔记id
+    :param note_url: 笔记的URL
+    :return: Comment 生成器，顺序为 一级评论、它的二级评论、下一条一级评论……
+    二级评论回复的是同一楼里已出现过的评论时父评论为该评论，否则为主评论
+    """
+    # 当前楼已出现的评论ID -> 层级，换楼时清空
+    depths = {}
+    position = 0
+    for record, target_id in _iter_records(all_comments, note_id, note_url):
+        if record.depth == 0:
+            depths = {record.comment_id: 0}
+            position = 0
+        else:
+            position += 1
+            if target_id in depths and target_id != record.comment_id:
+                record.parent_comment_id = target_id
+                record.depth = depths[target_id] + 1
+            record.thread_position = position
+            depths[record.comment_id] = record.depth
+        yield record
+
+
+def build_comment_graph(all_comments: list, note_id: str, note_url: str) -> list:
+    """
+    两遍构建回复关系：第一遍处理全部评论并建立 评论id -> Comment 索引，第二遍按回复目标确定父评论和层级
+    回复目标不存在、不在同一楼或形成环时挂到主评论下；耗时和内存都与评论数成线性关系
+    :param all_comments: get_note_all_comment 返回的评论列表
+    :param note_id: 笔记id
+    :param note_url: 笔记的URL
+    :return: Comment 列表，顺序同 iter_comments
+    """
+    records = []
+    targets = []
+    index = {}
+    position = 0
+    for record, target_id in _iter_records(all_comments, note_id, note_url):
+        position = 0 if record.depth == 0 else position + 1
+        record.thread_position = position
+        records.append(record)
+        targets.append(target_id)
+        # 重复的评论id以第一次出现的为准
+        index.setdefault(record.comment_id, record)
+
+    for record, target_id in zip(records, targets):
+        target = index.get(target_id) if target_id else None
+        if target is not None and target is not record and target.root_comment_id == record.root_comment_id:
+            record.parent_comment_id = target_id
+
+    # 沿父评论向上找到已知层级的评论，再沿路径向下填写；每条评论只计算一次
+    depths = {record.comment_id: 0 for record in records if record.depth == 0}
+    for record in records:
+        path = []
+        on_path = set()
+        node = record
+        while node.comment_id not in depths:
+            path.append(node)
+            on_path.add(node.comment_id)
+            parent = index.get(node.parent_comment_id)
+            if parent is None or parent.comment_id in on_path:
+                # 回复关系形成环，从环上断开挂到主评论下
+                node.parent_comment_id = node.root_comment_id
+                parent = index[node.root_comment_id]
+            node = parent
+        depth = depths[node.comment_id]
+        for node in reversed(path):
+            depth += 1
+            node.depth = depth
+            depths[node.comment_id] = depth
+    return records
@@ -1,11 +1,14 @@
-import json
 import os
 import re
 import time
-import openpyxl
 import requests
 from loguru import logger
 from retry import retry
+from xhs_utils.trace_util import traced
+from xhs_utils.metrics_util import DOWNLOAD_BYTES
+from xhs_utils.media_util import media_ext, observe_media, profile_img_url
+from xhs_utils import json_util
+from xhs_utils.model_util import User, Note, Comment, as_dict, as_row
 
 
 def norm_str(str):
@@ -23,212 +26,84 @@ def timestamp_to_str(timestamp):
     dt = time.strftime("%Y-%m-%d %H:%M:%S", time_local)
     return dt
 
+@traced('transform.handle_user_info')
 def handle_user_info(data, user_id):
-    home_url = f'https://www.xiaohongshu.com/user/profile/{user_id}'
-    nickname = data['basic_info']['nickname']
-    avatar = data['basic_info']['imageb']
-    red_id = data['basic_info']['red_id']
-    gender = data['basic_info']['gender']
-    if gender == 0:
-        gender = '男'
-    elif gender == 1:
-        gender = '女'
-    else:
-        gender = '未知'
-    ip_location = data['basic_info']['ip_location']
-    desc = data['basic_info']['desc']
-    follows = data['interactions'][0]['count']
-    fans = data['interactions'][1]['count']
-    interaction = data['interactions'][2]['count']
-    tags_temp = data['tags']
-    tags = []
-    for tag in tags_temp:
-        try:
-            tags.append(tag['name'])
-        except:
-            pass
-    return {
-        'user_id': user_id,
-        'home_url': home_url,
-        'nickname': nickname,
-        'avatar': avatar,
-        'red_id': red_id,
-        'gender': gender,
-        'ip_location': ip_location,
-        'desc': desc,
-        'follows': follows,
-        'fans': fans,
-        'interaction': interaction,
-        'tags': tags,
-    }
+    """
+    处理用户信息，需要保留大量用户时直接用 User.from_raw，占用内存更少
+    :return: dict，字段见 User.to_dict
+    """
+    return User.from_raw(data, user_id).to_dict()
 
-def handle_note_info(data):
-    note_id = data['id']
-    note_url = data['url']
-    note_type = data['note_card']['type']
-    if note_type == 'normal':
-        note_type = '图集'
-    else:
-        note_type = '视频'
-    user_id = data['note_card']['user']['user_id']
-    home_url = f'https://www.xiaohongshu.com/user/profile/{user_id}'
-    nickname = data['note_card']['user']['nickname']
-    avatar = data['note_card']['user']['avatar']
-    title = data['note_card']['title']
-    if title.strip() == '':
-        title = f'无标题'
-    desc = data['note_card']['desc']
-    liked_count = data['note_card']['interact_info']['liked_count']
-    collected_count = data['note_card']['interact_info']['collected_count']
-    comment_count = data['note_card']['interact_info']['comment_count']
-    share_count = data['note_card']['interact_info']['share_count']
-    image_list_temp = data['note_card']['image_list']
-    image_list = []
-    for image in image_list_temp:
-        try:
-            image_list.append(image['info_list'][1]['url'])
-            # success, msg, img_url = XHS_Apis.get_note_no_water_img(image['info_list'][1]['url'])
-            # image_list.append(img_url)
-        except:
-            pass
-    if note_type == '视频':
-        video_cover = image_list[0]
-        video_addr = 'https://sns-video-bd.xhscdn.com/' + data['note_card']['video']['consumer']['origin_video_key']
-        # success, msg, video_addr = XHS_Apis.get_note_no_water_video(note_id)
-    else:
-        video_cover = None
-        video_addr = None
-    tags_temp = data['note_card']['tag_list']
-    tags = []
-    for tag in tags_temp:
-        try:
-            tags.append(tag['name'])
-        except:
-            pass
-    upload_time = timestamp_to_str(data['note_card']['time'])
-    if 'ip_location' in data['note_card']:
-        ip_location = data['note_card']['ip_location']
-    else:
-        ip_location = '未知'
-    return {
-        'note_id': note_id,
-        'note_url': note_url,
-        'note_type': note_type,
-        'user_id': user_id,
-        'home_url': home_url,
-        'nickname': nickname,
-        'avatar': avatar,
-        'title': title,
-        'desc': desc,
-        'liked_count': liked_count,
-        'collected_count': collected_count,
-        'comment_count': comment_count,
-        'share_count': share_count,
-        'video_cover': video_cover,
-        'video_addr': video_addr,
-        'image_list': image_list,
-        'tags': tags,
-        'upload_time': upload_time,
-        'ip_location': ip_location,
-    }
+@traced('transform.handle_note_info')
+def handle_note_info(data, no_water=True):
+    """
+    处理笔记信息，需要保留大量笔记时直接用 Note.from_raw，占用内存更少
+    :param no_water: 图片、视频使用无水印地址
+    :return: dict，字段见 Note.to_dict
+    """
+    return Note.from_raw(data, no_water).to_dict()
 
+@traced('transform.handle_comment_info')
 def handle_comment_info(data, root_comment_id=None, parent_comment_id=None):
     """
-    处理评论信息
-    :param data: 评论数据
+    处理评论信息，需要保留大量评论时直接用 Comment.from_raw，占用内存更少
+    :param data: 评论数据（需要包含 note_id 和 note_url）
     :param root_comment_id: 主评论ID（如果是二级评论，需要传入主评论ID）
     :param parent_comment_id: 父评论ID（这条评论回复的是哪条评论，用于构建回复关系）
+    :return: dict，字段见 Comment.to_dict
     """
-    note_id = data['note_id']
-    note_url = data['note_url']
-    comment_id = data['id']
-    user_id = data['user_info']['user_id']
-    home_url = f'https://www.xiaohongshu.com/user/profile/{user_id}'
-    nickname = data['user_info']['nickname']
-    avatar = data['user_info']['image']
-    content = data['content']
-    show_tags = data['show_tags']
-    like_count = data['like_count']
-    upload_time = timestamp_to_str(data['create_time'])
-    try:
-        ip_location = data['ip_location']
-    except:
-        ip_location = '未知'
-    pictures = []
-    try:
-        pictures_temp = data['pictures']
-        for picture in pictures_temp:
-            try:
-                pictures.append(picture['info_list'][1]['url'])
-                # success, msg, img_url = XHS_Apis.get_note_no_water_img(picture['info_list'][1]['url'])
-                # pictures.append(img_url)
-            except:
-                pass
-    except:
-        pass
-    
-    # 如果没有传入root_comment_id，说明这是一级评论，主评论ID就是自己的ID
-    if root_comment_id is None:
-        root_comment_id = comment_id
-    
-    # 尝试从原始数据中获取target_comment_id（回复的目标评论ID）
-    target_comment_id = None
-    if parent_comment_id:
-        target_comment_id = parent_comment_id
-    else:
-        # 尝试从数据中提取回复关系
-        try:
-            # 小红书API可能返回target_comment_id或target_id字段
-            target_comment_id = data.get('target_comment_id') or data.get('target_id') or data.get('reply_to_comment_id')
-        except:
-            pass
-    
-    return {
-        'note_id': note_id,
-        'note_url': note_url,
-        'comment_id': comment_id,
-        'root_comment_id': root_comment_id,  # 主评论ID，用于分组对话
-        'parent_comment_id': target_comment_id or '',  # 父评论ID（回复关系），空字符串表示这是一级评论或没有回复关系
-        'user_id': user_id,
-        'home_url': home_url,
-        'nickname': nickname,
-        'avatar': avatar,
-        'content': content,
-        'show_tags': show_tags,
-        'like_count': like_count,
-        'upload_time': upload_time,
-        'ip_location': ip_location,
-        'pictures': pictures,
-    }
+    return Comment.from_raw(data, data['note_id'], data['note_url'], root_comment_id, parent_comment_id).to_dict()
+
+
+# 各类数据保存时的表头，顺序与 handle_*_info 返回的字段、模型的 to_row 一致
+HEADERS = {
+    'note': ['笔记id', '笔记url', '笔记类型', '用户id', '用户主页url', '昵称', '头像url', '标题', '描述', '点赞数量', '收藏数量', '评论数量', '分享数量', '视频封面url', '视频地址url', '图片地址url列表', '标签', '上传时间', 'ip归属地'],
+    'user': ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签'],
+    'comment': ['笔记id', '笔记url', '评论id', '主评论id', '父评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表', '回复层级', '楼内序号'],
+}
+# 多关键词搜索的笔记：笔记字段 + 命中的搜索（SearchHit.queries）
+HEADERS['search_note'] = HEADERS['note'] + ['命中搜索']
+# 主页推荐的笔记卡片（FeedCard）
+HEADERS['homefeed'] = ['笔记id', '笔记url', '频道', '笔记类型', '用户id', '用户主页url', '昵称', '标题', '点赞数量', '封面url']
+# 消息通知（Message）
+HEADERS['message'] = ['账号', '消息类别', '消息id', '消息类型', '时间', '用户id', '用户主页url', '昵称', '内容', '笔记id']
+
+# 媒体下载的 (连接, 读取) 超时，CDN连接卡住时不会一直占着批次或任务租约
+DOWNLOAD_TIMEOUT = (10, 60)
+
+
+@traced('save_to_xlsx')
 def save_to_xlsx(datas, file_path, type='note'):
+    # openpyxl 会连带导入 numpy，用到时再导入，不拖慢启动
+    import openpyxl
     wb = openpyxl.Workbook()
     ws = wb.active
-    if type == 'note':
-        headers = ['笔记id', '笔记url', '笔记类型', '用户id', '用户主页url', '昵称', '头像url', '标题', '描述', '点赞数量', '收藏数量', '评论数量', '分享数量', '视频封面url', '视频地址url', '图片地址url列表', '标签', '上传时间', 'ip归属地']
-    elif type == 'user':
-        headers = ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签']
-    else:
-        headers = ['笔记id', '笔记url', '评论id', '主评论id', '父评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表']
-    ws.append(headers)
+    ws.append(HEADERS.get(type, HEADERS['comment']))
     for data in datas:
-        data = {k: norm_text(str(v)) for k, v in data.items()}
-        ws.append(list(data.values()))
+        ws.append([norm_text(str(v)) for v in as_row(data)])
     wb.save(file_path)
     logger.info(f'数据保存至 {file_path}')
 
-def download_media(path, name, url, type):
-    if type == 'image':
-        content = requests.get(url).content
-        with open(path + '/' + name + '.jpg', mode="wb") as f:
-            f.write(content)
-    elif type == 'video':
-        res = requests.get(url, stream=True)
-        size = 0
-        chunk_size = 1024 * 1024
-        with open(path + '/' + name + '.mp4', mode="wb") as f:
+@traced('download_media')
+def download_media(path, name, url, type, profile='original'):
+    """
+    下载一个图片或视频，扩展名按返回的 Content-Type（不认识时图片为 .jpg、视频为 .mp4）
+    :param profile: 下载规格，只用于按规格统计字节数和耗时，地址由调用方按规格生成（profile_img_url）
+    :return: 保存的文件路径，返回错误状态码时抛出异常，不写文件也不计入统计
+    """
+    start = time.perf_counter()
+    size = 0
+    chunk_size = 1024 * 1024
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as res:
+        res.raise_for_status()
+        file_path = path + '/' + name + media_ext(res.headers.get('Content-Type'), type)
+        with open(file_path, mode="wb") as f:
             for data in res.iter_content(chunk_size=chunk_size):
                 f.write(data)
                 size += len(data)
+                DOWNLOAD_BYTES.inc(len(data), type=type)
+    observe_media(profile, type, size, time.perf_counter() - start)
+    return file_path
 
 def save_user_detail(user, path):
     with open(f'{path}/detail.txt', mode="w", encoding="utf-8") as f:
@@ -271,8 +146,13 @@ def save_note_detail(note, path):
 
 
 
+@traced('download_note')
 @retry(tries=3, delay=1)
-def download_note(note_info, path, save_choice):
+def download_note(note_info, path, save_choice, profile='original'):
+    """
+    :param profile: 下载规格（media_util.MEDIA_PROFILES）：original 无水印原图，webp / avif 转码后体积更小，
+                    thumbnail 只下载缩略图和视频封面
+    """
     note_id = note_info['note_id']
     user_id = note_info['user_id']
     title = note_info['title']
@@ -283,16 +163,20 @@ def download_note(note_info, path, save_choice):
         title = f'无标题'
     save_path = f'{path}/{nickname}_{user_id}/{title}_{note_id}'
     check_and_create_path(save_path)
-    with open(f'{save_path}/info.json', mode='w', encoding='utf-8') as f:
-        f.write(json.dumps(note_info) + '\n')
+    with open(f'{save_path}/info.json', mode='wb') as f:
+        f.write(json_util.dumpb(as_dict(note_info)) + b'\n')
     note_type = note_info['note_type']
     save_note_detail(note_info, save_path)
     if note_type == '图集' and save_choice in ['media', 'media-image', 'all']:
         for img_index, img_url in enumerate(note_info['image_list']):
-            download_media(save_path, f'image_{img_index}', img_url, 'image')
+            download_media(save_path, f'image_{img_index}', profile_img_url(img_url, profile), 'image', profile)
     elif note_type == '视频' and save_choice in ['media', 'media-video', 'all']:
-        download_media(save_path, 'cover', note_info['video_cover'], 'image')
-        download_media(save_path, 'video', note_info['video_addr'], 'video')
+        download_media(save_path, 'cover', profile_img_url(note_info['video_cover'], profile), 'image', profile)
+        if profile != 'thumbnail':
+            if note_info['video_addr']:
+                download_media(save_path, 'video', note_info['video_addr'], 'video', profile)
+            else:
+                logger.warning(f'笔记 {note_id} 没有无水印视频地址，跳过视频下载')
     return save_path
 
 
@@ -0,0 +1,122 @@
+"""
+主页推荐采集
+所有频道并发翻页，每个频道各自维护游标，全局按笔记id去重，新笔记一出现就产出（FeedCard），可以直接写入 sink：
+- 主页推荐相邻的页、不同频道之间都有大量重复的笔记，重复的只记一次
+- 每个频道凑够 per_channel 篇新笔记，或者连续 max_stale_pages 页没有新笔记时停止，不在重复内容上浪费请求
+- 逐页请求（不预取），停止时不会多发请求
+- 单个频道失败只记录，不影响其他频道
+
+    harvester = HomefeedHarvester(xhs_apis, cookies_str, concurrency=4)
+    for card in harvester.iter_cards(per_channel=100):
+        sink.write(card)
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from xhs_utils.model_util import FeedCard
+
+_DONE = object()
+
+
+class HomefeedHarvester():
+    def __init__(self, xhs_apis, cookies_str: str, proxies: dict = None, concurrency: int = 4, seen=None):
+        """
+        :param xhs_apis: XHS_Apis
+        :param concurrency: 同时翻页的频道数
+        :param seen: 已采集过的笔记id，这些笔记不再产出（增量采集）
+        """
+        self.xhs_apis = xhs_apis
+        self.cookies_str = cookies_str
+        self.proxies = proxies
+        self.concurrency = max(1, concurrency)
+        self.seen = set(seen or ())
+        # 频道名 -> {'pages': 请求页数, 'cards': 笔记卡片数, 'new': 新笔记数}
+        self.stats = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def channels(self) -> list:
+        """
+        :return: [(频道id, 频道名), ...]
+        """
+        success, msg, res_json = self.xhs_apis.get_homefeed_all_channel(self.cookies_str, self.proxies)
+        if not success:
+            raise Exception(msg)
+        return [(category['id'], category.get('name', category['id'])) for category in res_json['data']['categories']]
+
+    def _harvest(self, channel_id: str, name: str, per_channel: int, max_stale_pages: int, out: queue.Queue, stop: threading.Event):
+        stats = self.stats[name] = {'pages': 0, 'cards': 0, 'new': 0}
+        if stop.is_set():
+            out.put(_DONE)
+            return
+        pages = self.xhs_apis.iter_homefeed(channel_id, self.cookies_str, self.proxies, prefetch=0)
+        stale = 0
+        try:
+            for page in pages.iter_pages():
+                new_in_page = 0
+                for item in page:
+                    if item.get('model_type') != 'note':
+                        continue
+                    stats['cards'] += 1
+                    with self._lock:
+                        new = item['id'] not in self.seen
+                        if new:
+                            self.seen.add(item['id'])
+                    if not new:
+                        continue
+                    new_in_page += 1
+                    stats['new'] += 1
+                    out.put(FeedCard.from_raw(item, name))
+                    if stats['new'] >= per_channel:
+                        break
+                # 在请求下一页之前决定是否继续
+                stale = 0 if new_in_page else stale + 1
+                if stats['new'] >= per_channel or stop.is_set():
+                    break
+                if stale >= max_stale_pages:
+                    logger.info(f'频道 {name} 连续 {stale} 页没有新笔记，停止')
+                    break
+        except Exception as e:
+            self.failures[name] = str(e)
+            logger.error(f'频道 {name} 采集失败: {e}')
+        finally:
+            stats['pages'] = pages.pages
+            logger.info(f'频道 {name}: 请求 {stats["pages"]} 页，{stats["cards"]} 篇笔记，新笔记 {stats["new"]} 篇')
+            out.put(_DONE)
+
+    def iter_cards(self, channels: list = None, per_channel: int = 100, max_stale_pages: int = 3):
+        """
+        :param channels: [(频道id, 频道名), ...] 或频道id列表，None 为全部频道
+        :param per_channel: 每个频道最多采集的新笔记数
+        :param max_stale_pages: 连续多少页没有新笔记时停止该频道
+        :return: FeedCard 生成器，按发现的先后顺序；提前结束遍历时各频道在当前页结束后停止
+        """
+        if channels is None:
+            channels = self.channels()
+        channels = [channel if isinstance(channel, (tuple, list)) else (channel, channel) for channel in channels]
+        out = queue.Queue()
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='xhs-homefeed')
+        try:
+            for channel_id, name in channels:
+                pool.submit(self._harvest, channel_id, name, per_channel, max_stale_pages, out, stop)
+            remaining = len(channels)
+            while remaining:
+                card = out.get()
+                if card is _DONE:
+                    remaining -= 1
+                    continue
+                yield card
+        finally:
+            stop.set()
+            pool.shutdown(wait=True)
+        total = sum(stats['pages'] for stats in self.stats.values())
+        logger.info(f'{len(channels)} 个频道共请求 {total} 页，{len(self.seen)} 篇不重复的笔记，失败 {len(self.failures)} 个频道')
+
+    def run(self, channels: list = None, per_channel: int = 100, max_stale_pages: int = 3):
+        """
+        :return: (FeedCard 列表, {频道名: 失败原因})
+        """
+        cards = list(self.iter_cards(channels, per_channel, max_stale_pages))
+        return cards, self.failures
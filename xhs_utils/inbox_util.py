@@ -0,0 +1,166 @@
+"""
+消息通知增量同步
+多个账号频繁（如每分钟）检查新的评论和@、赞和收藏、新增关注，只取上次同步之后的新消息：
+- 先查未读数（get_unread_message，一个请求），某类消息的未读数没有比上次同步时增加就不翻页
+- 翻页时读到上次同步过的消息（水位线）立即停止，不再往前翻历史；逐页请求，不预取
+- 水位线（最新消息时间 + 最近的消息id）按 账号 + 消息类别 保存在SQLite中，进程重启后继续
+- 新消息按时间从早到晚交给回调（如 sink.write），回调全部成功后才更新水位线，出错时下次重新投递
+- 未读数可能被用户在App里读掉而清零，超过 max_age 没同步过的消息类别不看未读数直接检查
+
+    inbox = InboxSync(xhs_apis, 'datas/inbox.db')
+    messages = inbox.sync(cookies_str, on_message=sink.write)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+from xhs_utils.model_util import Message
+from xhs_utils.trace_util import cookie_id
+
+# 消息类别，与 get_unread_message 返回的字段、XHS_Apis.iter_messages 的 stream 一致
+STREAMS = ('mentions', 'likes', 'connections')
+
+# 水位线中保存的最近消息id数量，同一秒内的多条消息靠id区分
+RECENT_IDS = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    account TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    latest_time INTEGER NOT NULL,
+    recent_ids TEXT NOT NULL,
+    last_unread INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account, stream)
+);
+"""
+
+
+class InboxSync():
+    def __init__(self, xhs_apis, path: str, backfill: int = 20, max_age: float = 3600.0, busy_timeout: float = 30.0):
+        """
+        :param xhs_apis: XHS_Apis
+        :param path: 水位线数据库路径
+        :param backfill: 第一次同步某个账号时最多取多少条历史消息，0 为只记录水位线，None 为全部历史
+        :param max_age: 超过这么久（秒）没同步过的消息类别不看未读数直接检查
+        """
+        self.xhs_apis = xhs_apis
+        self.path = path
+        self.backfill = backfill
+        self.max_age = max_age
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.stats = {'unread_checks': 0, 'pages': 0, 'skipped': 0, 'new': 0}
+
+    def close(self):
+        self.conn.close()
+
+    def watermark(self, account: str, stream: str):
+        """
+        :return: (最新消息时间, 最近的消息id列表, 上次同步时的未读数, 上次同步时间)，没有同步过时返回None
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT latest_time, recent_ids, last_unread, synced_at FROM watermarks WHERE account = ? AND stream = ?',
+                                    (account, stream)).fetchone()
+        return (row[0], json.loads(row[1]), row[2], row[3]) if row else None
+
+    def _save(self, account: str, stream: str, latest_time: int, recent_ids: list, unread: int):
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO watermarks (account, stream, latest_time, recent_ids, last_unread, synced_at) '
+                              'VALUES (?, ?, ?, ?, ?, ?)', (account, stream, latest_time, json.dumps(recent_ids[:RECENT_IDS]), unread, time.time()))
+
+    def unread(self, cookies_str: str, proxies: dict = None):
+        """
+        :return: {消息类别: 未读数}，请求失败时返回None
+        """
+        with self._lock:
+            self.stats['unread_checks'] += 1
+        success, msg, res_json = self.xhs_apis.get_unread_message(cookies_str, proxies)
+        if not success:
+            logger.warning(f'获取未读数失败: {msg}')
+            return None
+        data = res_json.get('data') or {}
+        return {stream: int(data.get(stream) or 0) for stream in STREAMS}
+
+    def _fetch_new(self, stream: str, cookies_str: str, proxies: dict, mark):
+        """
+        从最新的消息往前翻，读到水位线为止
+        :return: (新消息列表（最新的在前）, 本次读到的消息（用于更新水位线）)
+        """
+        latest_time, recent_ids = (mark[0], set(mark[1])) if mark else (None, set())
+        pages = self.xhs_apis.iter_messages(stream, cookies_str, proxies, prefetch=0)
+        new = []
+        try:
+            for page in pages.iter_pages():
+                reached = False
+                for item in page:
+                    item_time = int(item.get('time') or 0)
+                    if mark and (str(item['id']) in recent_ids or item_time < latest_time):
+                        reached = True
+                        break
+                    new.append(item)
+                if reached or (not mark and self.backfill is not None and len(new) >= self.backfill):
+                    break
+        finally:
+            with self._lock:
+                self.stats['pages'] += pages.pages
+        seen = list(new)
+        if not mark and self.backfill is not None:
+            new = new[:self.backfill]
+        return new, seen
+
+    def sync_stream(self, stream: str, cookies_str: str, proxies: dict = None, on_message=None, unread: int = None, force: bool = False) -> list:
+        """
+        同步一个账号的一类消息
+        :param unread: 该类消息的未读数，None 为不知道（总是检查）
+        :param force: 忽略未读数，总是检查
+        :return: 新消息（Message 列表，从早到晚）
+        """
+        account = cookie_id(cookies_str)
+        mark = self.watermark(account, stream)
+        if mark and not force and unread is not None and unread <= mark[2] and time.time() - mark[3] < self.max_age:
+            with self._lock:
+                self.stats['skipped'] += 1
+            if unread < mark[2]:
+                # 未读数减少（在App里读过），记下新的未读数，之后有新消息时才会再增加
+                self._save(account, stream, mark[0], mark[1], unread)
+            return []
+        new, seen = self._fetch_new(stream, cookies_str, proxies, mark)
+        messages = [Message.from_raw(item, stream, account) for item in reversed(new)]
+        for message in messages:
+            if on_message is not None:
+                on_message(message)
+        latest_time = max([int(item.get('time') or 0) for item in seen] + ([mark[0]] if mark else [0]))
+        recent_ids = [str(item['id']) for item in seen] + (mark[1] if mark else [])
+        self._save(account, stream, latest_time, recent_ids, unread if unread is not None else (mark[2] if mark else 0))
+        with self._lock:
+            self.stats['new'] += len(messages)
+        if messages:
+            logger.info(f'账号 {account} {stream} 新消息 {len(messages)} 条')
+        return messages
+
+    def sync(self, cookies_str: str, proxies: dict = None, on_message=None, streams: tuple = STREAMS, force: bool = False) -> list:
+        """
+        同步一个账号的全部消息类别，先查未读数，没有新消息的类别不翻页
+        :param on_message: 每条新消息调用一次 on_message(Message)，如 sink.write
+        :param force: 忽略未读数，每类消息都检查
+        :return: 新消息（Message 列表，每类内从早到晚），某类失败时抛出异常（其他类别已同步的不受影响）
+        """
+        counts = None if force else self.unread(cookies_str, proxies)
+        messages = []
+        errors = {}
+        for stream in streams:
+            try:
+                messages.extend(self.sync_stream(stream, cookies_str, proxies, on_message, counts[stream] if counts else None, force))
+            except Exception as e:
+                errors[stream] = str(e)
+                logger.error(f'同步 {stream} 失败: {e}')
+        if errors:
+            raise Exception(f'同步失败: {errors}')
+        return messages
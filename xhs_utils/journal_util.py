@@ -0,0 +1,91 @@
+"""
+分析结果日志
+每分析完一组对话就追加一行JSON（按 root_id），进程中断后可以从日志恢复，已完成的对话不再调用LLM
+"""
+import os
+from loguru import logger
+from xhs_utils import json_util
+
+
+class ResultJournal():
+    """
+    追加写入的JSONL结果日志
+    每行格式：{"root_id": ..., "status": "done"|"skipped", "reason": ..., "results": [...]}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tail_checked = False
+
+    def reset(self):
+        """
+        清空日志，开始新的一次运行
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def load(self) -> dict:
+        """
+        读取日志，同一个 root_id 以最后一行为准
+        最后一行可能因为中断只写了一半，解析失败的行直接忽略
+        :return: {root_id: entry}
+        """
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, mode='r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_util.loads(line)
+                    entries[str(entry['root_id'])] = entry
+                except (json_util.JSONDecodeError, KeyError):
+                    logger.warning(f'结果日志第 {line_no} 行损坏，已忽略: {self.path}')
+        return entries
+
+    def append(self, root_id: str, results: list = None, status: str = 'done', reason: str = '', **extra):
+        """
+        追加一组对话的结果，写入后立即flush，保证进程被杀时已完成的结果不丢
+        :param root_id: 对话的主评论ID
+        :param results: 分析结果列表
+        :param status: done 已分析 / skipped 预过滤跳过
+        :param reason: 跳过原因
+        """
+        entry = {'root_id': str(root_id), 'status': status, 'reason': reason, 'results': results or [], **extra}
+        if not self._tail_checked:
+            self._repair_tail()
+        with open(self.path, mode='a', encoding='utf-8') as f:
+            f.write(json_util.dumps(entry) + '\n')
+            f.flush()
+
+    def _repair_tail(self):
+        """
+        上一次中断时最后一行可能没写完，补一个换行，避免新行接在半行后面
+        """
+        self._tail_checked = True
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, mode='rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+
+    def results(self, entries: dict = None) -> list:
+        """
+        所有已分析对话的结果（展开成行）
+        """
+        entries = self.load() if entries is None else entries
+        rows = []
+        for entry in entries.values():
+            if entry.get('status') == 'done':
+                rows.extend(entry.get('results', []))
+        return rows
+
+    def skipped(self, entries: dict = None) -> list:
+        """
+        所有被跳过的对话
+        """
+        entries = self.load() if entries is None else entries
+        return [{k: v for k, v in entry.items() if k not in ('status', 'results')}
+                for entry in entries.values() if entry.get('status') == 'skipped']
@@ -0,0 +1,78 @@
+"""
+JSON编解码
+安装了 orjson 时用 orjson（解析评论、搜索等大响应快数倍），否则用标准库 json，接口和输出一致：
+- loads：接受 str / bytes，bytes 直接解析，不需要先解码成 str
+- dumps：返回 str，不转义中文（相当于 ensure_ascii=False），紧凑格式
+环境变量 XHS_JSON=json 或 set_backend('json') 强制使用标准库
+签名参数的序列化（xhs_util.generate_request_params）格式必须和浏览器一致，仍然使用标准库，不走这里
+"""
+import json
+import os
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+BACKENDS = ('orjson', 'json')
+
+_backend = 'orjson' if orjson is not None else 'json'
+
+
+def set_backend(name: str):
+    """
+    :param name: orjson / json
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f'不支持的JSON后端: {name}，可选 {BACKENDS}')
+    if name == 'orjson' and orjson is None:
+        logger.warning('未安装 orjson，使用标准库 json')
+        name = 'json'
+    _backend = name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def loads(data):
+    """
+    :param data: str / bytes / bytearray
+    """
+    if _backend == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson 只接受UTF-8，其他编码（如带BOM、UTF-16）交给标准库判断
+            pass
+    return json.loads(data)
+
+
+def dumps(obj, indent: int = None) -> str:
+    """
+    :param indent: 缩进，orjson 只支持 2，其他值使用标准库
+    """
+    return dumpb(obj, indent).decode('utf-8')
+
+
+def dumpb(obj, indent: int = None) -> bytes:
+    """
+    同 dumps，返回UTF-8编码的bytes，直接写入二进制文件
+    """
+    if _backend == 'orjson' and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            # 超过64位的整数等 orjson 不支持的内容
+            pass
+    separators = None if indent else (',', ':')
+    return json.dumps(obj, ensure_ascii=False, indent=indent, separators=separators).encode('utf-8')
+
+
+if os.getenv('XHS_JSON'):
+    set_backend(os.getenv('XHS_JSON'))
@@ -0,0 +1,135 @@
+"""
+LLM调用统计
+记录每次调用的token、耗时、重试、缓存命中和JSON解析失败，汇总成一次运行的统计，并支持token/费用预算上限
+"""
+import time
+from dataclasses import dataclass, field, asdict
+from xhs_utils.metrics_util import LLM_TOKENS, LLM_CALLS
+
+
+class BudgetExceeded(Exception):
+    """
+    继续调用会超出token或费用预算
+    """
+    pass
+
+
+@dataclass
+class LLMCallRecord:
+    purpose: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+    error: str = ''
+
+
+@dataclass
+class AnalysisMetrics:
+    """
+    一次分析运行的统计
+    价格单位：元/百万token
+    """
+    max_tokens: int = None
+    max_cost: float = None
+    prompt_price: float = 0.0
+    completion_price: float = 0.0
+    calls: list = field(default_factory=list)
+    markdown_stripped: int = 0
+    regex_fallbacks: int = 0
+    parse_failures: int = 0
+    conversations_total: int = 0
+    conversations_skipped: int = 0
+    conversations_analyzed: int = 0
+    stopped_reason: str = ''
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(call.prompt_tokens for call in self.calls)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(call.completion_tokens for call in self.calls)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return (self.prompt_tokens * self.prompt_price + self.completion_tokens * self.completion_price) / 1e6
+
+    def record_call(self, purpose: str, prompt_tokens: int = 0, completion_tokens: int = 0, latency: float = 0.0,
+                    retries: int = 0, cache_hit: bool = False, error: str = ''):
+        record = LLMCallRecord(purpose, prompt_tokens, completion_tokens, latency, retries, cache_hit, error)
+        self.calls.append(record)
+        LLM_CALLS.inc(purpose=purpose, outcome='cache_hit' if cache_hit else ('error' if error else 'success'))
+        if not cache_hit:
+            LLM_TOKENS.inc(prompt_tokens, purpose=purpose, kind='prompt')
+            LLM_TOKENS.inc(completion_tokens, purpose=purpose, kind='completion')
+        return record
+
+    def check_budget(self, next_prompt_tokens: int = 0):
+        """
+        调用前检查预算：已用量加上本次请求的预估prompt token超过上限时抛出 BudgetExceeded
+        :param next_prompt_tokens: 本次请求预估的prompt token数
+        """
+        if self.max_tokens is not None and self.total_tokens + next_prompt_tokens > self.max_tokens:
+            raise BudgetExceeded(f'token预算已用尽: 已用 {self.total_tokens}, 本次预估 {next_prompt_tokens}, 上限 {self.max_tokens}')
+        if self.max_cost is not None:
+            next_cost = next_prompt_tokens * self.prompt_price / 1e6
+            if self.cost + next_cost > self.max_cost:
+                raise BudgetExceeded(f'费用预算已用尽: 已用 {self.cost:.4f} 元, 上限 {self.max_cost} 元')
+
+    def summary(self) -> dict:
+        """
+        汇总统计，可直接写成JSON
+        """
+        api_calls = [call for call in self.calls if not call.cache_hit]
+        latencies = sorted(call.latency for call in api_calls if not call.error)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 3)
+
+        by_purpose = {}
+        for call in self.calls:
+            stats = by_purpose.setdefault(call.purpose, {'calls': 0, 'cache_hits': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latency': 0.0})
+            stats['calls'] += 1
+            stats['cache_hits'] += int(call.cache_hit)
+            stats['prompt_tokens'] += call.prompt_tokens
+            stats['completion_tokens'] += call.completion_tokens
+            stats['latency'] = round(stats['latency'] + call.latency, 3)
+        return {
+            'conversations_total': self.conversations_total,
+            'conversations_skipped': self.conversations_skipped,
+            'conversations_analyzed': self.conversations_analyzed,
+            'api_calls': len(api_calls),
+            'cache_hits': len(self.calls) - len(api_calls),
+            'errors': sum(1 for call in api_calls if call.error),
+            'retries': sum(call.retries for call in api_calls),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+            'cost': round(self.cost, 6),
+            'latency_total': round(sum(latencies), 3),
+            'latency_p50': percentile(50),
+            'latency_p95': percentile(95),
+            'markdown_stripped': self.markdown_stripped,
+            'regex_fallbacks': self.regex_fallbacks,
+            'parse_failures': self.parse_failures,
+            'wall_time': round(time.time() - self.started_at, 3),
+            'max_tokens': self.max_tokens,
+            'max_cost': self.max_cost,
+            'stopped_reason': self.stopped_reason,
+            'by_purpose': by_purpose,
+        }
+
+    def to_records(self) -> list:
+        """
+        每次调用的明细
+        """
+        return [asdict(call) for call in self.calls]
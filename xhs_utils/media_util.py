@@ -0,0 +1,224 @@
+"""
+无水印媒体地址
+- 图片：笔记数据里的图片地址（带 !nd_dft_... 水印样式）直接改写成原图地址，只解析一次路径，不发请求
+- 视频：笔记数据里有 origin_video_key 时直接拼出原视频地址；没有时才请求笔记网页读 og:video，
+  流式读取，读到 <meta name="og:video"> 就断开，不下载整个网页
+- 需要请求网页的笔记并发请求，结果按笔记id缓存，同一笔记不重复请求
+- 下载规格（MEDIA_PROFILES）：原图，或者由图床按指定宽度和格式转码（webp / avif / 缩略图），
+  文件扩展名按实际返回的 Content-Type，按规格统计下载的字节数和耗时（media_totals）
+
+    resolver = MediaResolver(session=xhs_apis.session, concurrency=8)
+    note_list = resolver.resolve_many(note_list)    # handle_note_info 返回的 dict 列表，补全视频地址
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from loguru import logger
+from xhs_utils.metrics_util import REGISTRY
+from xhs_utils.xhs_util import get_common_headers
+
+WEB_URL = 'https://www.xiaohongshu.com'
+VIDEO_HOST = 'https://sns-video-bd.xhscdn.com/'
+IMG_HOST = 'https://sns-img-qc.xhscdn.com/'
+SPECTRUM_HOST = 'http://sns-webpic.xhscdn.com/'
+
+# https://sns-webpic-qc.xhscdn.com/202403211626/c4fcecea4bd012a1fe8d2f1968d6aa91/110/0/01e50c1c135e8c010010000000018ab74db332_0.jpg!nd_dft_wlteh_webp_3
+# https://sns-webpic-qc.xhscdn.com/202403231640/ea961053c4e0e467df1cc93afdabd630/spectrum/1000g0k0200n7mj8fq0005n7ikbllol6q50oniuo!nd_dft_wgth_webp_3
+# http://sns-webpic-qc.xhscdn.com/202403181511/64ad2ea67ce04159170c686a941354f5/1040g008310cs1hii6g6g5ngacg208q5rlf1gld8!nd_dft_wlteh_webp_3
+# 时间戳/签名 之后、! 之前是图片id
+_CDN_IMAGE = re.compile(r'^https?://[^/]+/\d{12}/[0-9a-f]{32}/([^!?#]+)')
+_IMAGE_VIEW = re.compile(r'\?imageView2/[^#]*$', re.IGNORECASE)
+
+# 下载规格：(最大宽度, 格式)，None 为无水印原图；thumbnail 只下载图片和视频封面，不下载视频
+MEDIA_PROFILES = {
+    'original': None,
+    'webp': (1920, 'webp'),
+    'avif': (1920, 'avif'),
+    'thumbnail': (360, 'webp'),
+}
+
+CONTENT_TYPE_EXTS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/heic': '.heic',
+    'image/heif': '.heif',
+    'image/gif': '.gif',
+    'video/mp4': '.mp4',
+    'video/quicktime': '.mov',
+    'video/webm': '.webm',
+}
+DEFAULT_EXTS = {'image': '.jpg', 'video': '.mp4'}
+
+MEDIA_FILES = REGISTRY.counter('xhs_media_files_total', '按下载规格统计的媒体文件数', ('profile', 'type'))
+MEDIA_BYTES = REGISTRY.counter('xhs_media_bytes_total', '按下载规格统计的媒体下载字节数', ('profile', 'type'))
+MEDIA_SECONDS = REGISTRY.counter('xhs_media_seconds_total', '按下载规格统计的媒体下载耗时（秒）', ('profile', 'type'))
+
+_OG_VIDEO = re.compile(rb'<meta name="og:video" content="(.*?)"')
+_HEAD_END = b'</head>'
+
+
+def no_water_img_url(img_url: str) -> str:
+    """
+    :param img_url: 笔记数据里的图片地址
+    :return: 无水印原图地址，不认识的地址原样返回
+    """
+    match = _CDN_IMAGE.match(img_url or '')
+    if not match:
+        return img_url
+    img_id = match.group(1)
+    if img_id.startswith('spectrum/'):
+        return f'{SPECTRUM_HOST}{img_id}?imageView2/2/w/format/jpg'
+    return IMG_HOST + img_id
+
+
+def no_water_video_url(note_card: dict):
+    """
+    :param note_card: 笔记数据的 note_card
+    :return: 无水印视频地址，笔记数据里没有 origin_video_key 时返回None
+    """
+    key = ((note_card.get('video') or {}).get('consumer') or {}).get('origin_video_key')
+    return VIDEO_HOST + key if key else None
+
+
+def profile_img_url(img_url: str, profile: str = 'original') -> str:
+    """
+    :param img_url: 无水印图片地址（no_water_img_url 的结果）
+    :param profile: MEDIA_PROFILES 中的规格
+    :return: 按规格转码的图片地址
+    """
+    spec = MEDIA_PROFILES[profile]
+    if spec is None or not img_url:
+        return img_url
+    width, fmt = spec
+    return f'{_IMAGE_VIEW.sub("", img_url)}?imageView2/2/w/{width}/format/{fmt}'
+
+
+def media_ext(content_type: str, type: str) -> str:
+    """
+    :param content_type: 响应的 Content-Type
+    :param type: image / video，Content-Type 不认识时使用的默认扩展名
+    """
+    mime = (content_type or '').split(';')[0].strip().lower()
+    return CONTENT_TYPE_EXTS.get(mime, DEFAULT_EXTS[type])
+
+
+def observe_media(profile: str, type: str, size: int, seconds: float):
+    MEDIA_FILES.inc(profile=profile, type=type)
+    MEDIA_BYTES.inc(size, profile=profile, type=type)
+    MEDIA_SECONDS.inc(seconds, profile=profile, type=type)
+
+
+def media_totals() -> dict:
+    """
+    :return: {规格: {类型: {'files': 文件数, 'bytes': 字节数, 'seconds': 耗时}}}，本进程内的累计值
+    """
+    totals = {}
+    for field, metric in (('files', MEDIA_FILES), ('bytes', MEDIA_BYTES), ('seconds', MEDIA_SECONDS)):
+        for (profile, type), value in metric.snapshot()['values']:
+            entry = totals.setdefault(profile, {}).setdefault(type, {'files': 0, 'bytes': 0, 'seconds': 0.0})
+            entry[field] = round(value, 3) if field == 'seconds' else int(value)
+    return totals
+
+
+def read_og_video(response, max_bytes: int = 512 * 1024):
+    """
+    流式读取网页，读到 og:video 或 </head> 就停止
+    :return: 视频地址，没有时返回None
+    """
+    buf = b''
+    for chunk in response.iter_content(chunk_size=8192):
+        buf += chunk
+        match = _OG_VIDEO.search(buf)
+        if match:
+            return match.group(1).decode('utf-8').replace('&amp;', '&')
+        if _HEAD_END in buf or len(buf) >= max_bytes:
+            return None
+    return None
+
+
+class MediaResolver():
+    def __init__(self, session: requests.Session = None, concurrency: int = 8, timeout: float = 10.0, max_entries: int = 10000,
+                 web_url: str = WEB_URL, max_bytes: int = 512 * 1024):
+        """
+        :param session: 复用连接的会话，可以传入 XHS_Apis.session
+        :param concurrency: 同时请求的网页数
+        :param max_entries: 按笔记id缓存的视频地址数量
+        :param web_url: 笔记网页域名，压测时可以指向本地模拟服务
+        :param max_bytes: 每个网页最多读取的字节数
+        """
+        self.session = session or requests.Session()
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.web_url = web_url.rstrip('/')
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'fetches': 0, 'failures': 0, 'bytes': 0}
+
+    def _cached(self, note_id: str):
+        with self._lock:
+            if note_id in self._cache:
+                self._cache.move_to_end(note_id)
+                self.stats['hits'] += 1
+                return True, self._cache[note_id]
+        return False, None
+
+    def _store(self, note_id: str, video_addr: str):
+        with self._lock:
+            self._cache[note_id] = video_addr
+            self._cache.move_to_end(note_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def fetch_video_addr(self, note_id: str, proxies: dict = None):
+        """
+        请求笔记网页读取 og:video，结果按笔记id缓存（失败不缓存）
+        :return: (success, msg, 视频地址)
+        """
+        hit, video_addr = self._cached(note_id)
+        if hit:
+            return True, '成功', video_addr
+        start = time.perf_counter()
+        try:
+            with self.session.get(f'{self.web_url}/explore/{note_id}', headers=get_common_headers(), proxies=proxies,
+                                  timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                video_addr = read_og_video(response, self.max_bytes)
+                read = response.raw.tell() if hasattr(response.raw, 'tell') else 0
+        except Exception as e:
+            with self._lock:
+                self.stats['failures'] += 1
+            return False, str(e), None
+        with self._lock:
+            self.stats['fetches'] += 1
+            self.stats['bytes'] += read
+        if video_addr is None:
+            return False, '网页中没有 og:video', None
+        self._store(note_id, video_addr)
+        logger.debug(f'笔记 {note_id} 视频地址 {time.perf_counter() - start:.3f}s')
+        return True, '成功', video_addr
+
+    def resolve_many(self, note_infos: list, proxies: dict = None) -> list:
+        """
+        补全视频笔记的无水印视频地址，只有笔记数据里没有的才并发请求网页
+        :param note_infos: handle_note_info 返回的 dict 列表，原地修改
+        :return: note_infos
+        """
+        pending = [note for note in note_infos if note['note_type'] == '视频' and not note.get('video_addr')]
+        if not pending:
+            return note_infos
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(pending)), thread_name_prefix='xhs-media') as pool:
+            results = pool.map(lambda note: self.fetch_video_addr(note['note_id'], proxies), pending)
+            for note, (success, msg, video_addr) in zip(pending, results):
+                if success:
+                    note['video_addr'] = video_addr
+                else:
+                    logger.warning(f'笔记 {note["note_id"]} 获取无水印视频失败: {msg}')
+        return note_infos
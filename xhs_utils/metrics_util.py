@@ -0,0 +1,334 @@
+"""
+Prometheus 格式的运行指标
+不依赖 prometheus_client，内置 Counter / Gauge / Histogram 和一个 HTTP 服务：
+- /metrics  Prometheus 文本格式
+- /healthz  健康检查，所有检查项通过返回200，否则503
+
+    from xhs_utils.metrics_util import serve_metrics
+    serve_metrics(5000)
+
+主要指标：
+- xhs_requests_total{endpoint,outcome}          每个接口的请求数，outcome 为 success 或错误类别（见 classify_msg）
+- xhs_request_duration_seconds{endpoint}        请求耗时（含签名）
+- xhs_requests_in_flight{endpoint}              正在进行的请求数
+- xhs_signer_queue_depth                        正在等待/执行签名的请求数
+- xhs_download_bytes_total{type}                下载字节数，rate() 即每秒下载量
+- xhs_cookie_healthy{cookie_id} / xhs_proxy_healthy{proxy}   最近一次请求是否成功
+- llm_tokens_total{purpose,kind}                LLM token 用量
+- xhs_jobs_total{kind,outcome} / xhs_job_queue{status}      worker任务数和队列积压（worker.py）
+"""
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    pairs = []
+    for k, v in zip(names, values):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{k}="{v}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric():
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'type': self.type_name, 'help': self.documentation, 'labelnames': list(self.labelnames),
+                    'values': [[list(k), v] for k, v in self._values.items()]}
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data['bucket_bounds'] = list(self.buckets)
+        data['values'] = [[k, {'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count']}] for k, v in data['values']]
+        return data
+
+
+class Registry():
+    """
+    指标注册表
+    多进程时每个子进程可以把 snapshot() 写出来，由主进程用 render(snapshots) 合并输出
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._health_checks = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_health_check(self, name: str, check):
+        """
+        :param check: 函数，参数为合并了各进程指标的 merge() 结果，返回 True 表示健康
+        """
+        self._health_checks[name] = check
+
+    def health(self, snapshots: list = None) -> dict:
+        """
+        :param snapshots: 其他进程的 snapshot()，与本进程的指标合并后交给各项检查
+        """
+        merged = self.merge(snapshots)
+        results = {}
+        for name, check in list(self._health_checks.items()):
+            try:
+                results[name] = bool(check(merged))
+            except Exception as e:
+                logger.warning(f'健康检查 {name} 异常: {e}')
+                results[name] = False
+        return results
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def merge(self, snapshots: list = None) -> dict:
+        """
+        合并本进程和其他进程的指标
+        :param snapshots: 其他进程的 snapshot()，counter / histogram 和 in-flight、队列深度等 gauge 按进程求和
+        :return: {指标名: {'type', 'help', 'labelnames', 'values': {标签值元组: 值}}}
+        """
+        merged = {}
+        for snapshot in [self.snapshot()] + list(snapshots or []):
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, {**data, 'values': {}})
+                for key, value in data['values']:
+                    key = tuple(key)
+                    if data['type'] == 'histogram':
+                        state = target['values'].setdefault(key, {'buckets': [0] * len(value['buckets']), 'sum': 0.0, 'count': 0})
+                        state['buckets'] = [a + b for a, b in zip(state['buckets'], value['buckets'])]
+                        state['sum'] += value['sum']
+                        state['count'] += value['count']
+                    elif name.endswith('_healthy') or name == 'process_start_time_seconds':
+                        # 健康状态取最差的进程，启动时间取最早的进程
+                        target['values'][key] = min(target['values'].get(key, value), value)
+                    else:
+                        target['values'][key] = target['values'].get(key, 0) + value
+        return merged
+
+    @staticmethod
+    def values(merged: dict, name: str) -> dict:
+        """
+        :param merged: merge() 的结果
+        :return: {标签值元组: 值}，没有该指标时为空
+        """
+        return merged.get(name, {}).get('values', {})
+
+    def render(self, snapshots: list = None) -> str:
+        """
+        输出 Prometheus 文本格式
+        :param snapshots: 其他进程的 snapshot()，合并方式见 merge()
+        """
+        merged = self.merge(snapshots)
+        lines = []
+        for name, data in merged.items():
+            lines.append(f'# HELP {name} {data["help"]}')
+            lines.append(f'# TYPE {name} {data["type"]}')
+            labelnames = data['labelnames']
+            for key, value in data['values'].items():
+                if data['type'] == 'histogram':
+                    # observe 时已经累加到所有上界不小于该值的桶，这里直接输出
+                    for bound, count in zip(data['bucket_bounds'], value['buckets']):
+                        le = 'le="%s"' % _format_value(float(bound))
+                        lines.append(f'{name}_bucket{_format_labels(labelnames, key, le)} {count}')
+                    le = 'le="+Inf"'
+                    lines.append(f'{name}_bucket{_format_labels(labelnames, key, le)} {value["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(labelnames, key)} {_format_value(value["sum"])}')
+                    lines.append(f'{name}_count{_format_labels(labelnames, key)} {value["count"]}')
+                else:
+                    lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter('xhs_requests_total', '小红书接口请求数', ('endpoint', 'outcome'))
+REQUEST_DURATION = REGISTRY.histogram('xhs_request_duration_seconds', '小红书接口请求耗时（含签名）', ('endpoint',))
+IN_FLIGHT = REGISTRY.gauge('xhs_requests_in_flight', '正在进行的小红书接口请求数', ('endpoint',))
+SIGNER_QUEUE = REGISTRY.gauge('xhs_signer_queue_depth', '正在等待或执行签名的请求数')
+DOWNLOAD_BYTES = REGISTRY.counter('xhs_download_bytes_total', '媒体下载字节数', ('type',))
+COOKIE_HEALTHY = REGISTRY.gauge('xhs_cookie_healthy', 'cookie最近一次请求是否成功（1成功 0失败）', ('cookie_id',))
+PROXY_HEALTHY = REGISTRY.gauge('xhs_proxy_healthy', '代理最近一次请求是否成功（1成功 0失败）', ('proxy',))
+LLM_TOKENS = REGISTRY.counter('llm_tokens_total', 'LLM token用量', ('purpose', 'kind'))
+LLM_CALLS = REGISTRY.counter('llm_calls_total', 'LLM调用次数', ('purpose', 'outcome'))
+JOBS = REGISTRY.counter('xhs_jobs_total', 'worker处理的任务数', ('kind', 'outcome'))
+JOB_DURATION = REGISTRY.histogram('xhs_job_duration_seconds', '任务耗时', ('kind',), buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+JOB_QUEUE = REGISTRY.gauge('xhs_job_queue', '任务队列中各状态的任务数', ('status',))
+WORKERS_ALIVE = REGISTRY.gauge('xhs_workers_alive', '存活的worker进程数')
+START_TIME = REGISTRY.gauge('process_start_time_seconds', '进程启动时间')
+START_TIME.set(time.time())
+
+
+# 用过的cookie全部失效时判定为不健康，交给编排系统重启或换号
+def _cookies_healthy(merged: dict) -> bool:
+    values = Registry.values(merged, COOKIE_HEALTHY.name)
+    return not values or any(values.values())
+
+
+REGISTRY.add_health_check('cookies', _cookies_healthy)
+
+# msg 关键字 -> 错误类别，用于 outcome 标签，避免把原始 msg 当作标签导致标签基数爆炸
+MSG_CLASSES = [
+    ('http_error', ('HTTP 4', 'HTTP 5')),
+    ('auth', ('登录', '未登录', 'cookie', 'Cookie', '-100', '无登录信息')),
+    ('rate_limit', ('频繁', '频次', '稍后', '-104', 'too many')),
+    ('captcha', ('验证', '滑块', 'captcha', '461', '471')),
+    ('not_found', ('不存在', '已删除', '无法浏览', 'not found', '404')),
+    ('signature', ('签名', 'sign', 'x-s')),
+    ('network', ('Connection', 'Timeout', 'timed out', 'Max retries', 'Proxy')),
+    ('decode', ('Expecting value', 'JSONDecodeError', 'decode')),
+]
+
+
+def classify_msg(msg) -> str:
+    msg = str(msg or '')
+    for name, keywords in MSG_CLASSES:
+        if any(keyword in msg for keyword in keywords):
+            return name
+    return 'other'
+
+
+def observe_request(endpoint: str, success: bool, msg, duration: float, cookie_id: str = '', proxy: str = ''):
+    """
+    记录一次接口请求的结果
+    """
+    REQUESTS.inc(endpoint=endpoint, outcome='success' if success else classify_msg(msg))
+    REQUEST_DURATION.observe(duration, endpoint=endpoint)
+    if cookie_id:
+        COOKIE_HEALTHY.set(1 if success else 0, cookie_id=cookie_id)
+    if proxy:
+        PROXY_HEALTHY.set(1 if success else 0, proxy=proxy)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            snapshots = self.server.snapshot_source() if self.server.snapshot_source else None
+            body = self.server.registry.render(snapshots).encode('utf-8')
+            self._send(200, body, 'text/plain; version=0.0.4; charset=utf-8')
+        elif path == '/healthz':
+            snapshots = self.server.snapshot_source() if self.server.snapshot_source else None
+            checks = self.server.registry.health(snapshots)
+            ok = all(checks.values())
+            body = json.dumps({'status': 'ok' if ok else 'fail', 'checks': checks, 'pid': os.getpid()}, ensure_ascii=False)
+            self._send(200 if ok else 503, body.encode('utf-8'), 'application/json; charset=utf-8')
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, host: str = '0.0.0.0', registry: Registry = None, snapshot_source=None):
+        """
+        :param snapshot_source: 返回其他进程 snapshot 列表的函数，多进程worker用来合并子进程指标
+        """
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry or REGISTRY
+        self.snapshot_source = snapshot_source
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        logger.info(f'指标服务已启动: http://{self.server_address[0]}:{self.server_address[1]}/metrics')
+        return self
+
+
+def serve_metrics(port: int, host: str = '0.0.0.0', snapshot_source=None) -> MetricsServer:
+    """
+    在后台线程启动 /metrics 和 /healthz
+    """
+    return MetricsServer(port, host, snapshot_source=snapshot_source).start()
@@ -0,0 +1,473 @@
+"""
+笔记、用户、评论的数据模型
+使用 __slots__ 数据类保存，数量字段为 int，时间为毫秒时间戳 int，比同样内容的 dict 占用内存少得多，
+大量评论常驻内存时差别明显（见 benchmarks/bench_memory.py）
+- to_dict()：字段名与原来 handle_*_info 返回的 dict 一致，时间格式化为字符串，用于JSON输出
+- to_row()：按 data_util.HEADERS 的顺序输出一行，用于 xlsx / csv
+用户主页url等可以由其他字段推出的内容不单独保存
+"""
+import functools
+import time
+from dataclasses import dataclass, fields
+from xhs_utils.media_util import no_water_img_url, no_water_video_url
+
+GENDERS = {0: '男', 1: '女'}
+
+# 评论数据中表示回复目标评论id的字段，按顺序取第一个非空的
+TARGET_KEYS = ('target_comment_id', 'target_id', 'reply_to_comment_id')
+
+
+def slots_dataclass(cls):
+    """
+    带 __slots__ 的数据类，效果同 Python 3.10 的 @dataclass(slots=True)，3.7 也能用
+    字段默认值已经保存在生成的 __init__ 里，重建类时去掉同名的类属性，否则和 __slots__ 冲突
+    """
+    cls = dataclass(cls)
+    names = tuple(f.name for f in fields(cls))
+    body = {key: value for key, value in cls.__dict__.items() if key not in names and key not in ('__dict__', '__weakref__')}
+    body['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, body)
+
+
+def parse_count(value) -> int:
+    """
+    把接口返回的数量转为int，如 '1024' / '1.2万' / '10万+' / '' / None
+    """
+    if isinstance(value, int):
+        return value
+    if value is None:
+        return 0
+    text = str(value).strip().rstrip('+')
+    if not text:
+        return 0
+    scale = 1
+    if text.endswith('万'):
+        text, scale = text[:-1], 10000
+    elif text.endswith('亿'):
+        text, scale = text[:-1], 100000000
+    try:
+        return int(float(text) * scale)
+    except ValueError:
+        return 0
+
+
+# 按15分钟分段缓存格式化结果（所有时区偏移和夏令时切换都是15分钟的整数倍），段内的分和秒直接计算
+_TIME_BUCKET = 900
+
+
+@functools.lru_cache(maxsize=4096)
+def _bucket_prefix(bucket: int):
+    local = time.localtime(bucket * _TIME_BUCKET)
+    return time.strftime("%Y-%m-%d %H:", local), local.tm_min
+
+
+def format_time(timestamp: int) -> str:
+    """
+    等价于 time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp / 1000))，同一时间段内的评论不再重复调用 localtime
+    :param timestamp: 毫秒时间戳
+    """
+    seconds = int(timestamp // 1000)
+    bucket, offset = divmod(seconds, _TIME_BUCKET)
+    prefix, minute = _bucket_prefix(bucket)
+    return f'{prefix}{minute + offset // 60:02d}:{offset % 60:02d}'
+
+
+def home_url_of(user_id: str) -> str:
+    return f'https://www.xiaohongshu.com/user/profile/{user_id}'
+
+
+def target_id_of(data: dict):
+    """
+    评论回复的目标评论id，没有时返回None
+    """
+    for key in TARGET_KEYS:
+        value = data.get(key)
+        if value:
+            return value
+    target = data.get('target_comment')
+    return target.get('id') if isinstance(target, dict) else None
+
+
+def _names(items) -> tuple:
+    names = []
+    for item in items or ():
+        try:
+            names.append(item['name'])
+        except (KeyError, TypeError):
+            pass
+    return tuple(names)
+
+
+def _image_urls(images) -> tuple:
+    urls = []
+    for image in images or ():
+        try:
+            urls.append(image['info_list'][1]['url'])
+        except (KeyError, IndexError, TypeError):
+            pass
+    return tuple(urls)
+
+
+@slots_dataclass
+class User:
+    user_id: str
+    nickname: str
+    avatar: str
+    red_id: str
+    gender: str
+    ip_location: str
+    desc: str
+    follows: int
+    fans: int
+    interaction: int
+    tags: tuple
+
+    @property
+    def home_url(self) -> str:
+        return home_url_of(self.user_id)
+
+    @classmethod
+    def from_raw(cls, data: dict, user_id: str) -> 'User':
+        """
+        :param data: get_user_info 返回的 data
+        :param user_id: 用户id
+        """
+        basic_info = data['basic_info']
+        interactions = data['interactions']
+        return cls(
+            user_id=user_id,
+            nickname=basic_info['nickname'],
+            avatar=basic_info['imageb'],
+            red_id=basic_info['red_id'],
+            gender=GENDERS.get(basic_info['gender'], '未知'),
+            ip_location=basic_info['ip_location'],
+            desc=basic_info['desc'],
+            follows=parse_count(interactions[0]['count']),
+            fans=parse_count(interactions[1]['count']),
+            interaction=parse_count(interactions[2]['count']),
+            tags=_names(data['tags']),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'user_id': self.user_id,
+            'home_url': self.home_url,
+            'nickname': self.nickname,
+            'avatar': self.avatar,
+            'red_id': self.red_id,
+            'gender': self.gender,
+            'ip_location': self.ip_location,
+            'desc': self.desc,
+            'follows': self.follows,
+            'fans': self.fans,
+            'interaction': self.interaction,
+            'tags': list(self.tags),
+        }
+
+    def to_row(self) -> list:
+        return list(self.to_dict().values())
+
+
+@slots_dataclass
+class Note:
+    note_id: str
+    note_url: str
+    note_type: str
+    user_id: str
+    nickname: str
+    avatar: str
+    title: str
+    desc: str
+    liked_count: int
+    collected_count: int
+    comment_count: int
+    share_count: int
+    video_cover: str
+    video_addr: str
+    image_list: tuple
+    tags: tuple
+    upload_time: int
+    ip_location: str
+
+    @property
+    def home_url(self) -> str:
+        return home_url_of(self.user_id)
+
+    @classmethod
+    def from_raw(cls, data: dict, no_water: bool = True) -> 'Note':
+        """
+        :param data: get_note_info 返回的 items[0]，url 字段为笔记链接
+        :param no_water: 图片地址改写为无水印原图（不发请求）；视频笔记数据里没有原视频时 video_addr 为None，
+                         由 MediaResolver.resolve_many 请求网页补全
+        """
+        note_card = data['note_card']
+        interact_info = note_card['interact_info']
+        note_type = '图集' if note_card['type'] == 'normal' else '视频'
+        image_list = _image_urls(note_card['image_list'])
+        if no_water:
+            image_list = tuple(no_water_img_url(url) for url in image_list)
+        video_cover = video_addr = None
+        if note_type == '视频':
+            video_cover = image_list[0] if image_list else None
+            video_addr = no_water_video_url(note_card)
+        title = note_card['title']
+        return cls(
+            note_id=data['id'],
+            note_url=data['url'],
+            note_type=note_type,
+            user_id=note_card['user']['user_id'],
+            nickname=note_card['user']['nickname'],
+            avatar=note_card['user']['avatar'],
+            title=title if title.strip() else '无标题',
+            desc=note_card['desc'],
+            liked_count=parse_count(interact_info['liked_count']),
+            collected_count=parse_count(interact_info['collected_count']),
+            comment_count=parse_count(interact_info['comment_count']),
+            share_count=parse_count(interact_info['share_count']),
+            video_cover=video_cover,
+            video_addr=video_addr,
+            image_list=image_list,
+            tags=_names(note_card['tag_list']),
+            upload_time=int(note_card['time']),
+            ip_location=note_card.get('ip_location', '未知'),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'note_id': self.note_id,
+            'note_url': self.note_url,
+            'note_type': self.note_type,
+            'user_id': self.user_id,
+            'home_url': self.home_url,
+            'nickname': self.nickname,
+            'avatar': self.avatar,
+            'title': self.title,
+            'desc': self.desc,
+            'liked_count': self.liked_count,
+            'collected_count': self.collected_count,
+            'comment_count': self.comment_count,
+            'share_count': self.share_count,
+            'video_cover': self.video_cover,
+            'video_addr': self.video_addr,
+            'image_list': list(self.image_list),
+            'tags': list(self.tags),
+            'upload_time': format_time(self.upload_time),
+            'ip_location': self.ip_location,
+        }
+
+    def to_row(self) -> list:
+        return list(self.to_dict().values())
+
+
+@slots_dataclass
+class Comment:
+    note_id: str
+    note_url: str
+    comment_id: str
+    root_comment_id: str
+    parent_comment_id: str
+    user_id: str
+    nickname: str
+    avatar: str
+    content: str
+    show_tags: tuple
+    like_count: int
+    upload_time: int
+    ip_location: str
+    pictures: tuple
+    # 回复层级：一级评论为0，回复一级评论为1，回复二级评论为2……
+    depth: int = 0
+    # 楼内序号：同一主评论下按出现（时间）顺序编号，一级评论为0
+    thread_position: int = 0
+
+    @property
+    def home_url(self) -> str:
+        return home_url_of(self.user_id)
+
+    @classmethod
+    def from_raw(cls, data: dict, note_id: str, note_url: str, root_comment_id: str = None, parent_comment_id: str = None) -> 'Comment':
+        """
+        :param data: 评论接口返回的一条评论，不会被修改
+        :param note_id: 笔记id（评论数据里有 note_id 时以评论数据为准）
+        :param note_url: 笔记的URL
+        :param root_comment_id: 主评论id，一级评论传None（主评论就是自己）
+        :param parent_comment_id: 父评论id，None 时尝试从评论数据的回复目标字段中获取
+        depth 按一级评论0、其他1填写，更深的层级和 thread_position 由 comment_util 根据整篇笔记的评论确定
+        """
+        comment_id = data['id']
+        user_info = data['user_info']
+        show_tags = data['show_tags']
+        pictures = data.get('pictures')
+        # 按位置传参，构造大量评论时比关键字参数快
+        return cls(
+            data.get('note_id', note_id),
+            note_url,
+            comment_id,
+            root_comment_id or comment_id,
+            parent_comment_id or target_id_of(data) or '',
+            user_info['user_id'],
+            user_info['nickname'],
+            user_info['image'],
+            data['content'],
+            tuple(show_tags) if show_tags else (),
+            parse_count(data['like_count']),
+            int(data['create_time']),
+            data.get('ip_location', '未知'),
+            _image_urls(pictures) if pictures else (),
+            0 if root_comment_id is None or root_comment_id == comment_id else 1,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'note_id': self.note_id,
+            'note_url': self.note_url,
+            'comment_id': self.comment_id,
+            'root_comment_id': self.root_comment_id,
+            'parent_comment_id': self.parent_comment_id,
+            'user_id': self.user_id,
+            'home_url': self.home_url,
+            'nickname': self.nickname,
+            'avatar': self.avatar,
+            'content': self.content,
+            'show_tags': list(self.show_tags),
+            'like_count': self.like_count,
+            'upload_time': format_time(self.upload_time),
+            'ip_location': self.ip_location,
+            'pictures': list(self.pictures),
+            'depth': self.depth,
+            'thread_position': self.thread_position,
+        }
+
+    def to_row(self) -> list:
+        # 评论数量大，不经过 to_dict 直接拼出一行
+        return [self.note_id, self.note_url, self.comment_id, self.root_comment_id, self.parent_comment_id,
+                self.user_id, home_url_of(self.user_id), self.nickname, self.avatar, self.content, list(self.show_tags),
+                self.like_count, format_time(self.upload_time), self.ip_location, list(self.pictures),
+                self.depth, self.thread_position]
+
+
+@slots_dataclass
+class FeedCard:
+    """
+    主页推荐、搜索结果中的笔记卡片，只有标题、作者、点赞数和封面，详情需要再请求 get_note_info
+    """
+    note_id: str
+    xsec_token: str
+    channel: str
+    note_type: str
+    user_id: str
+    nickname: str
+    title: str
+    liked_count: int
+    cover: str
+
+    @property
+    def note_url(self) -> str:
+        return f'https://www.xiaohongshu.com/explore/{self.note_id}?xsec_token={self.xsec_token}&xsec_source=pc_feed'
+
+    @classmethod
+    def from_raw(cls, data: dict, channel: str = '') -> 'FeedCard':
+        """
+        :param data: get_homefeed_recommend 返回的 items 中的一项
+        :param channel: 频道名
+        """
+        note_card = data['note_card']
+        user = note_card.get('user') or {}
+        cover = note_card.get('cover') or {}
+        return cls(
+            data['id'],
+            data.get('xsec_token', ''),
+            channel,
+            '视频' if note_card.get('type') == 'video' else '图集',
+            user.get('user_id', ''),
+            user.get('nickname') or user.get('nick_name', ''),
+            note_card.get('display_title') or '无标题',
+            parse_count((note_card.get('interact_info') or {}).get('liked_count')),
+            cover.get('url_default') or cover.get('url', ''),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'note_id': self.note_id,
+            'note_url': self.note_url,
+            'channel': self.channel,
+            'note_type': self.note_type,
+            'user_id': self.user_id,
+            'home_url': home_url_of(self.user_id),
+            'nickname': self.nickname,
+            'title': self.title,
+            'liked_count': self.liked_count,
+            'cover': self.cover,
+        }
+
+    def to_row(self) -> list:
+        return list(self.to_dict().values())
+
+
+@slots_dataclass
+class Message:
+    """
+    消息通知（评论和@、赞和收藏、新增关注）
+    """
+    account: str
+    stream: str
+    message_id: str
+    message_type: str
+    time: int
+    user_id: str
+    nickname: str
+    content: str
+    note_id: str
+
+    @classmethod
+    def from_raw(cls, data: dict, stream: str, account: str = '') -> 'Message':
+        """
+        :param data: get_metions / get_likesAndcollects / get_new_connections 返回的 message_list 中的一项
+        :param stream: mentions / likes / connections
+        :param account: 账号标识（cookie_id）
+        """
+        user_info = data.get('user_info') or {}
+        comment_info = data.get('comment_info') or {}
+        item_info = data.get('item_info') or {}
+        return cls(
+            account,
+            stream,
+            str(data['id']),
+            data.get('type', ''),
+            int(data.get('time') or 0),
+            user_info.get('userid') or user_info.get('user_id', ''),
+            user_info.get('nickname', ''),
+            comment_info.get('content') or data.get('title', ''),
+            item_info.get('id', ''),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'account': self.account,
+            'stream': self.stream,
+            'message_id': self.message_id,
+            'message_type': self.message_type,
+            'time': format_time(self.time * 1000),
+            'user_id': self.user_id,
+            'home_url': home_url_of(self.user_id),
+            'nickname': self.nickname,
+            'content': self.content,
+            'note_id': self.note_id,
+        }
+
+    def to_row(self) -> list:
+        return list(self.to_dict().values())
+
+
+def as_dict(record) -> dict:
+    """
+    模型或 dict 统一转成 dict
+    """
+    return record.to_dict() if hasattr(record, 'to_dict') else record
+
+
+def as_row(record) -> list:
+    """
+    模型或 dict 统一转成一行（按表头顺序）
+    """
+    return record.to_row() if hasattr(record, 'to_row') else list(record.values())
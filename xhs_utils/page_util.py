@@ -0,0 +1,138 @@
+"""
+翻页
+所有按页码或游标翻页的列表接口共用，逐条产出结果：
+- 页码翻页（numbered=True）：下一页的页码不依赖上一页的返回，提前并发请求后面 prefetch 页
+- 游标翻页：拿到下一页游标后立即在后台请求下一页，调用方处理当前页的同时下一页已经在路上
+- limit：达到数量立即停止，不再发出新的请求，还没开始的预取直接取消；页码翻页时按 page_size 估算还差几页，不多请求
+- 调用方提前结束遍历（break / close）时同样取消预取
+- iter_pages() 逐页产出，调用方可以在两页之间决定是否继续（不预取时停止后不会再发请求）
+
+    pages = Paginator(fetch, start=1, limit=50, numbered=True, page_size=20)
+    notes = list(pages)
+fetch(cursor) 返回 (本页结果列表, 下一页游标, 是否还有更多)，失败时抛出异常，异常会在遍历时抛出
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Paginator():
+    def __init__(self, fetch, start=None, limit: int = None, prefetch: int = 1, numbered: bool = False, page_size: int = None):
+        """
+        :param fetch: fetch(cursor) -> (items, next_cursor, has_more)
+        :param start: 第一页的游标，页码翻页时为起始页码
+        :param limit: 需要的数量，None 为全部
+        :param prefetch: 预取的页数，0 为不预取（逐页顺序请求）
+        :param numbered: 页码翻页，下一页为 cursor + 1
+        :param page_size: 每页数量，页码翻页且指定 limit 时用来避免多请求
+        """
+        self.fetch = fetch
+        self.start = start
+        self.limit = limit
+        self.prefetch = max(0, prefetch)
+        self.numbered = numbered
+        self.page_size = page_size
+        # 实际请求的页数
+        self.pages = 0
+
+    def _call(self, cursor):
+        self.pages += 1
+        return self.fetch(cursor)
+
+    def __iter__(self):
+        for page in self.iter_pages():
+            yield from page
+
+    def iter_pages(self):
+        """
+        :return: 每页结果列表的生成器，最后一页按 limit 截断
+        """
+        if self.limit is not None and self.limit <= 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix='xhs-prefetch') if self.prefetch else None
+        pending = deque()
+        try:
+            if self.numbered:
+                yield from self._iter_numbered(executor, pending)
+            else:
+                yield from self._iter_cursor(executor, pending)
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _emit(self, items, count: int):
+        """
+        :return: 本页中需要产出的部分（不超过 limit）
+        """
+        if self.limit is not None:
+            return items[:self.limit - count]
+        return items
+
+    def _iter_numbered(self, executor, pending):
+        count = received = 0
+        next_page = self.start if self.start is not None else 1
+        while True:
+            # 预计还不够 limit 时才提前请求后面的页
+            while len(pending) < 1 + self.prefetch:
+                if pending and self.limit is not None and self.page_size and received + len(pending) * self.page_size >= self.limit:
+                    break
+                pending.append(executor.submit(self._call, next_page) if executor else _Done(self._call, next_page))
+                next_page += 1
+            items, _, has_more = pending.popleft().result()
+            received += len(items)
+            emit = self._emit(items, count)
+            count += len(emit)
+            yield emit
+            if not items or not has_more or (self.limit is not None and count >= self.limit):
+                return
+
+    def _iter_cursor(self, executor, pending):
+        count = 0
+        cursor = self.start
+        current = _Done(self._call, cursor)
+        while True:
+            items, cursor, has_more = current.result()
+            emit = self._emit(items, count)
+            done = not items or not has_more or cursor is None or (self.limit is not None and count + len(emit) >= self.limit)
+            if not done:
+                # 先发出下一页的请求，再产出当前页
+                current = executor.submit(self._call, cursor) if executor else _Lazy(self._call, cursor)
+                pending.append(current)
+            count += len(emit)
+            yield emit
+            if done:
+                return
+            if pending:
+                pending.popleft()
+
+
+class _Done():
+    """
+    立即执行，接口与 Future.result() 一致
+    """
+
+    def __init__(self, func, *args):
+        self._result = func(*args)
+
+    def result(self):
+        return self._result
+
+    def cancel(self):
+        return False
+
+
+class _Lazy():
+    """
+    不预取时，第一次取结果才执行
+    """
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+
+    def result(self):
+        return self._func(*self._args)
+
+    def cancel(self):
+        return True
@@ -0,0 +1,197 @@
+"""
+基于SQLite的持久化任务队列
+多个进程（或多台机器共享的同一个文件）从同一个队列领取任务：
+- 领取时加租约（lease），worker崩溃后租约过期，任务会被其他worker重新领取
+- 失败按指数退避重试，超过最大次数进入死信（dead），可以用 requeue_dead() 重新放回队列
+"""
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+
+JOB_KINDS = ('note', 'user_all_note', 'search', 'note_comments')
+
+PENDING, LEASED, DONE, DEAD = 'pending', 'leased', 'done', 'dead'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at);
+"""
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue():
+    """
+    每个进程各自创建 JobQueue（sqlite连接不能跨进程共享）
+        queue = JobQueue('datas/jobs.db')
+        queue.push('note', {'url': note_url})
+        job = queue.lease('worker-1')
+        queue.complete(job.id, 'worker-1') / queue.fail(job.id, 'worker-1', '原因')
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def push(self, kind: str, payload: dict, max_attempts: int = 3) -> int:
+        """
+        :param kind: 任务类型，见 JOB_KINDS
+        :param payload: 任务参数
+        :return: 任务id
+        """
+        return self.push_many([(kind, payload)], max_attempts)[0]
+
+    def push_many(self, jobs: list, max_attempts: int = 3) -> list:
+        """
+        批量入队（一个事务）
+        :param jobs: [(kind, payload), ...]
+        """
+        now = time.time()
+        ids = []
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for kind, payload in jobs:
+                if kind not in JOB_KINDS:
+                    raise ValueError(f'未知的任务类型: {kind}，可选 {JOB_KINDS}')
+                cursor = self.conn.execute(
+                    'INSERT INTO jobs (kind, payload, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (kind, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now))
+                ids.append(cursor.lastrowid)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return ids
+
+    def lease(self, worker: str, lease_seconds: float = 300.0):
+        """
+        领取一个可执行的任务：待执行且已到重试时间，或者租约已过期（原worker崩溃）
+        接管过期租约记为一次失败，反复让worker崩溃的任务达到最大次数后进入死信，不会被无限重新领取
+        :return: Job，没有任务时返回None
+        """
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            while True:
+                row = self.conn.execute(
+                    'SELECT id, kind, payload, attempts, max_attempts, status FROM jobs '
+                    'WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) '
+                    'ORDER BY id LIMIT 1', (PENDING, now, LEASED, now)).fetchone()
+                if row is None:
+                    self.conn.execute('COMMIT')
+                    return None
+                job_id, kind, payload, attempts, max_attempts, status = row
+                if status == LEASED:
+                    attempts += 1
+                    if attempts >= max_attempts:
+                        self.conn.execute('UPDATE jobs SET status = ?, attempts = ?, last_error = ?, lease_until = NULL, updated_at = ? WHERE id = ?',
+                                          (DEAD, attempts, '租约过期（worker崩溃或超时）', now, job_id))
+                        continue
+                self.conn.execute('UPDATE jobs SET status = ?, worker = ?, attempts = ?, lease_until = ?, updated_at = ? WHERE id = ?',
+                                  (LEASED, worker, attempts, now + lease_seconds, now, job_id))
+                self.conn.execute('COMMIT')
+                break
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return Job(job_id, kind, json.loads(payload), attempts, max_attempts)
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = 300.0) -> bool:
+        """
+        延长租约，长任务执行期间定期调用
+        :return: 租约仍属于该worker时返回True
+        """
+        now = time.time()
+        cursor = self.conn.execute('UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?',
+                                   (now + lease_seconds, now, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result=None) -> bool:
+        """
+        :return: 租约已被其他worker接管时不做修改，返回False
+        """
+        now = time.time()
+        cursor = self.conn.execute('UPDATE jobs SET status = ?, result = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?',
+                                   (DONE, json.dumps(result, ensure_ascii=False) if result is not None else None, now, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, backoff: float = 30.0):
+        """
+        记录一次失败，未超过最大次数时按指数退避重新排队，否则进入死信
+        :return: 任务的新状态 pending / dead，租约已被其他worker接管时不做修改，返回None
+        """
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = ?',
+                                    (job_id, worker, LEASED)).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            attempts, max_attempts = row
+            attempts += 1
+            status = DEAD if attempts >= max_attempts else PENDING
+            self.conn.execute('UPDATE jobs SET status = ?, attempts = ?, last_error = ?, available_at = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?',
+                              (status, attempts, str(error)[:2000], now + backoff * 2 ** (attempts - 1), now, job_id, worker, LEASED))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return status
+
+    def requeue_dead(self) -> int:
+        """
+        把死信任务重新放回队列（重置重试次数）
+        :return: 重新入队的数量
+        """
+        now = time.time()
+        cursor = self.conn.execute('UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE status = ?',
+                                   (PENDING, now, now, DEAD))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        :return: {status: 数量}，租约过期的任务单独计为 expired
+        """
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        for status, count in self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        counts['expired'] = self.conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_until < ?',
+                                              (LEASED, time.time())).fetchone()[0]
+        return counts
+
+    def dead_jobs(self, limit: int = 100) -> list:
+        rows = self.conn.execute('SELECT id, kind, payload, attempts, last_error FROM jobs WHERE status = ? ORDER BY id LIMIT ?',
+                                 (DEAD, limit)).fetchall()
+        return [{'id': r[0], 'kind': r[1], 'payload': json.loads(r[2]), 'attempts': r[3], 'last_error': r[4]} for r in rows]
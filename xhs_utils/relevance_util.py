@@ -0,0 +1,149 @@
+"""
+评论相关性预分类
+在调用LLM之前，用纯CPU的规则 + 字符n-gram线性模型判断一段对话是否值得分析
+1. 规则：去掉表情、@提及后为空，或者只是"求链接"之类的噪声，直接跳过
+2. 关键词：提到已知产品/品牌/肤质关键词，直接保留
+3. 线性模型：其余对话用哈希字符n-gram逻辑回归打分，低于阈值跳过（没有模型时跳过）
+"""
+import json
+import math
+import random
+import re
+import zlib
+from xhs_utils.alias_util import ProductNormalizer
+
+# 小红书表情，如 [笑哭R]、[赞R]
+STICKER_RE = re.compile(r'\[[^\[\]]{1,10}\]')
+# @提及，如 @小红薯
+MENTION_RE = re.compile(r'@[^\s@]{1,30}')
+# 去掉表情和@后剩下的标点/空白
+PUNCT_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+# 常见的无信息量评论
+NOISE_RE = re.compile(r'^(求链接|求链|链接|蹲|蹲一个|蹲蹲|求分享|求|哪里买|怎么买|多少钱|好看|好美|哈+|h+|6+|1+|\+1|同问|mark|码住|马住|收藏了|已关注|互关|来了)$', re.IGNORECASE)
+
+
+def clean_comment(content: str) -> str:
+    """
+    去掉表情、@提及和标点，返回剩余的有效文本
+    """
+    content = STICKER_RE.sub('', content or '')
+    content = MENTION_RE.sub('', content)
+    return PUNCT_RE.sub('', content)
+
+
+class CharNgramModel():
+    """
+    哈希字符n-gram + 逻辑回归
+    特征用 crc32 哈希到固定维度，权重以稀疏字典保存，可序列化为JSON
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: tuple = (1, 3)):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.weights = {}
+        self.bias = 0.0
+
+    def featurize(self, text: str) -> dict:
+        """
+        文本 -> {特征下标: 归一化计数}
+        """
+        text = text.lower()
+        counts = {}
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            for i in range(len(text) - n + 1):
+                index = zlib.crc32(text[i:i + n].encode('utf-8')) % self.n_features
+                counts[index] = counts.get(index, 0) + 1
+        if counts:
+            norm = math.sqrt(sum(v * v for v in counts.values()))
+            counts = {k: v / norm for k, v in counts.items()}
+        return counts
+
+    def predict_proba(self, text: str) -> float:
+        """
+        返回文本属于"相关"的概率
+        """
+        z = self.bias
+        for index, value in self.featurize(text).items():
+            z += self.weights.get(index, 0.0) * value
+        z = max(min(z, 30.0), -30.0)
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def fit(self, texts: list, labels: list, epochs: int = 8, lr: float = 0.5, l2: float = 1e-5, seed: int = 42):
+        """
+        SGD训练逻辑回归
+        :param texts: 文本列表
+        :param labels: 标签列表，1 相关 0 无关
+        """
+        samples = [(self.featurize(text), 1.0 if label else 0.0) for text, label in zip(texts, labels)]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            step = lr / (1 + epoch)
+            for features, label in samples:
+                z = self.bias
+                for index, value in features.items():
+                    z += self.weights.get(index, 0.0) * value
+                z = max(min(z, 30.0), -30.0)
+                grad = 1.0 / (1.0 + math.exp(-z)) - label
+                self.bias -= step * grad
+                for index, value in features.items():
+                    w = self.weights.get(index, 0.0)
+                    self.weights[index] = w - step * (grad * value + l2 * w)
+        return self
+
+    def save(self, path: str):
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump({
+                'n_features': self.n_features,
+                'ngram_range': list(self.ngram_range),
+                'bias': self.bias,
+                'weights': {str(k): round(v, 6) for k, v in self.weights.items() if abs(v) > 1e-6},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, mode='r', encoding='utf-8') as f:
+            data = json.load(f)
+        model = cls(data['n_features'], data['ngram_range'])
+        model.bias = data['bias']
+        model.weights = {int(k): v for k, v in data['weights'].items()}
+        return model
+
+
+class RelevanceFilter():
+    """
+    对话相关性过滤器
+    """
+
+    def __init__(self, normalizer: ProductNormalizer = None, model: CharNgramModel = None, threshold: float = 0.5):
+        """
+        :param normalizer: 关键词匹配器，默认使用内置别称表
+        :param model: 线性模型，为None时只使用规则和关键词
+        :param threshold: 模型打分阈值，低于阈值的对话跳过
+        """
+        self.normalizer = normalizer or ProductNormalizer()
+        self.model = model
+        self.threshold = threshold
+
+    def check(self, conversation: list):
+        """
+        判断一段对话是否需要调用LLM
+        :param conversation: 对话列表（group_comments_by_conversation 的输出）
+        :return: keep, reason, score
+        """
+        contents = [comment.get('content', '') or '' for comment in conversation]
+        cleaned = [clean_comment(content) for content in contents]
+        if not any(cleaned):
+            return False, '只有表情或@提及', 0.0
+        if all(not text or NOISE_RE.match(text) for text in cleaned):
+            return False, '无信息量评论（求链接/+1等）', 0.0
+        text = '\n'.join(contents)
+        if self.normalizer.has_keyword(text):
+            return True, '命中产品/肤质关键词', 1.0
+        if self.model is None:
+            return False, '未提及已知产品或肤质关键词', 0.0
+        score = self.model.predict_proba(' '.join(cleaned))
+        if score >= self.threshold:
+            return True, f'模型判定相关({score:.2f})', score
+        return False, f'模型判定无关({score:.2f} < {self.threshold})', score
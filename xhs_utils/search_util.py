@@ -0,0 +1,140 @@
+"""
+多关键词搜索
+很多关键词、多种筛选条件组合并发搜索，结果按笔记id去重：
+- 每篇笔记只保留一次（详情和媒体只需要获取一次），同时记录命中了它的所有搜索
+- 单个搜索失败只记录，不影响其他搜索
+
+    tasks = expand_tasks(['粉底液', '干皮粉底液'], sort_type_choice=[0, 2], note_type=[0, 2])
+    hits, failures = SearchFanout(xhs_apis, cookies_str, concurrency=4).run(tasks, require_num=50)
+"""
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from loguru import logger
+from xhs_utils.model_util import slots_dataclass
+
+# 筛选条件 -> 展示名，用于生成搜索标签
+FILTER_NAMES = {
+    'sort_type_choice': {1: '最新', 2: '最多点赞', 3: '最多评论', 4: '最多收藏'},
+    'note_type': {1: '视频笔记', 2: '普通笔记'},
+    'note_time': {1: '一天内', 2: '一周内', 3: '半年内'},
+    'note_range': {1: '已看过', 2: '未看过', 3: '已关注'},
+    'pos_distance': {1: '同城', 2: '附近'},
+}
+
+
+@dataclass(frozen=True)
+class SearchTask:
+    query: str
+    sort_type_choice: int = 0
+    note_type: int = 0
+    note_time: int = 0
+    note_range: int = 0
+    pos_distance: int = 0
+    geo: tuple = None
+
+    @property
+    def label(self) -> str:
+        """
+        搜索标签：关键词，有筛选条件时附在后面，如 粉底液[最多点赞,普通笔记]
+        """
+        filters = [names[getattr(self, name)] for name, names in FILTER_NAMES.items() if getattr(self, name) in names]
+        return f'{self.query}[{",".join(filters)}]' if filters else self.query
+
+    @property
+    def geo_dict(self):
+        return dict(self.geo) if self.geo else ''
+
+
+@slots_dataclass
+class SearchHit:
+    note_id: str
+    xsec_token: str
+    # 命中该笔记的搜索标签，按命中先后排列
+    queries: list = field(default_factory=list)
+
+    @property
+    def url(self) -> str:
+        return f'https://www.xiaohongshu.com/explore/{self.note_id}?xsec_token={self.xsec_token}&xsec_source=pc_search'
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def expand_tasks(queries: list, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None) -> list:
+    """
+    关键词和筛选条件的所有组合，每个筛选条件可以是单个值或列表，重复的组合只保留一个
+    :param queries: 关键词列表
+    :param sort_type_choice: 排序方式 0 综合排序, 1 最新, 2 最多点赞, 3 最多评论, 4 最多收藏
+    :param note_type: 笔记类型 0 不限, 1 视频笔记, 2 普通笔记
+    :param note_time: 笔记时间 0 不限, 1 一天内, 2 一周内天, 3 半年内
+    :param note_range: 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
+    :param pos_distance: 位置距离 0 不限, 1 同城, 2 附近 指定1或2必须要指定 geo
+    :param geo: 经纬度 {"latitude": ..., "longitude": ...}
+    :return: SearchTask 列表
+    """
+    geo = tuple(sorted(geo.items())) if geo else None
+    combos = list(itertools.product(_as_list(sort_type_choice), _as_list(note_type), _as_list(note_time),
+                                    _as_list(note_range), _as_list(pos_distance)))
+    tasks = [SearchTask(query, *combo, geo=geo if combo[-1] else None) for query in queries for combo in combos]
+    return list(dict.fromkeys(tasks))
+
+
+class SearchFanout():
+    def __init__(self, xhs_apis, cookies_str: str, proxies: dict = None, concurrency: int = 4):
+        """
+        :param xhs_apis: XHS_Apis
+        :param concurrency: 同时进行的搜索数
+        """
+        self.xhs_apis = xhs_apis
+        self.cookies_str = cookies_str
+        self.proxies = proxies
+        self.concurrency = max(1, concurrency)
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def _search(self, task: SearchTask, require_num: int) -> int:
+        """
+        :return: 该搜索新发现的笔记数
+        """
+        success, msg, notes = self.xhs_apis.search_some_note(
+            task.query, require_num, self.cookies_str, task.sort_type_choice, task.note_type, task.note_time,
+            task.note_range, task.pos_distance, task.geo_dict, self.proxies)
+        if not success:
+            raise Exception(msg)
+        new = 0
+        label = task.label
+        with self._lock:
+            for note in notes:
+                if note.get('model_type') != 'note':
+                    continue
+                hit = self.hits.get(note['id'])
+                if hit is None:
+                    hit = self.hits[note['id']] = SearchHit(note['id'], note['xsec_token'])
+                    new += 1
+                if label not in hit.queries:
+                    hit.queries.append(label)
+        logger.info(f'搜索 {label} 笔记数量: {len(notes)}，新笔记 {new}')
+        return new
+
+    def run(self, tasks: list, require_num: int):
+        """
+        并发执行全部搜索
+        :param tasks: SearchTask 列表（expand_tasks 生成）
+        :param require_num: 每个搜索的笔记数量
+        :return: ({note_id: SearchHit}, {搜索标签: 失败原因})，多次调用 run 时结果累积
+        """
+        failures = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._search, task, require_num): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[task.label] = str(e)
+                    logger.error(f'搜索 {task.label} 失败: {e}')
+        logger.info(f'{len(tasks)} 个搜索共 {len(self.hits)} 篇不重复的笔记，失败 {len(failures)} 个')
+        return self.hits, failures
@@ -0,0 +1,174 @@
+"""
+数据输出
+逐条写入 xlsx / jsonl / csv，表头与 save_to_xlsx 一致
+- jsonl：每行一个JSON，保留列表等原始结构，适合后续程序处理；路径为 - 时写到标准输出
+- csv：utf-8-sig 编码，Excel 直接打开不乱码
+- xlsx：openpyxl 只写模式，逐行写入，关闭时保存
+追加模式（append=True）下保留已有数据，existing_values() 可以读出已保存的id，用于增量爬取
+"""
+import csv
+import os
+import sys
+import threading
+from loguru import logger
+from xhs_utils import json_util
+from xhs_utils.data_util import HEADERS, norm_text
+from xhs_utils.model_util import as_dict, as_row
+
+SINK_FORMATS = ('xlsx', 'jsonl', 'csv')
+
+# 字段名 -> 表头，用于从 csv / xlsx 中按字段读取已保存的数据
+KEY_LABELS = {'note_id': '笔记id', 'comment_id': '评论id', 'user_id': '用户id', 'root_comment_id': '主评论id'}
+
+
+class Sink():
+    def __init__(self, path: str, type: str = 'note', append: bool = False):
+        """
+        :param path: 输出文件路径
+        :param type: note / user / comment，决定表头
+        :param append: 保留已有数据继续写入
+        """
+        self.path = path
+        self.type = type
+        self.append = append
+        self.headers = HEADERS.get(type, HEADERS['comment'])
+        self.count = 0
+        self._lock = threading.Lock()
+        if path != '-' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, row):
+        """
+        :param row: handle_*_info 返回的 dict 或 Note / User / Comment 模型
+        """
+        with self._lock:
+            self._write(row)
+            self.count += 1
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def existing_values(self, key: str) -> set:
+        """
+        已保存数据中某个字段的所有值，非追加模式或文件不存在时为空
+        """
+        return set()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _write(self, row: dict):
+        raise NotImplementedError
+
+    def _cells(self, row) -> list:
+        return [norm_text(str(v)) for v in as_row(row)]
+
+
+class JsonlSink(Sink):
+    def __init__(self, path: str, type: str = 'note', append: bool = False):
+        super().__init__(path, type, append)
+        if path == '-':
+            self.file = sys.stdout
+        else:
+            self.file = open(path, mode='a' if append else 'w', encoding='utf-8')
+
+    def existing_values(self, key: str) -> set:
+        values = set()
+        if self.path == '-' or not self.append or not os.path.exists(self.path):
+            return values
+        with open(self.path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    values.add(str(json_util.loads(line)[key]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return values
+
+    def _write(self, row: dict):
+        # 每行立即落盘，进程中断后已写入的数据可以用于增量续爬
+        self.file.write(json_util.dumps(as_dict(row)) + '\n')
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class CsvSink(Sink):
+    def __init__(self, path: str, type: str = 'note', append: bool = False):
+        super().__init__(path, type, append)
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, mode='a' if exists else 'w', encoding='utf-8-sig' if not exists else 'utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        if not exists:
+            self.writer.writerow(self.headers)
+
+    def existing_values(self, key: str) -> set:
+        if not self.append or not os.path.exists(self.path):
+            return set()
+        with open(self.path, mode='r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            label = KEY_LABELS.get(key, key)
+            if label not in header:
+                return set()
+            index = header.index(label)
+            return {row[index] for row in reader if len(row) > index}
+
+    def _write(self, row: dict):
+        self.writer.writerow(self._cells(row))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxSink(Sink):
+    def __init__(self, path: str, type: str = 'note', append: bool = False):
+        super().__init__(path, type, append)
+        import openpyxl
+        self._existing = []
+        if append and os.path.exists(path):
+            wb = openpyxl.load_workbook(path, read_only=True)
+            self._existing = [list(r) for r in wb.active.iter_rows(values_only=True)][1:]
+            wb.close()
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+        self.ws.append(self.headers)
+        for row in self._existing:
+            self.ws.append(row)
+
+    def existing_values(self, key: str) -> set:
+        label = KEY_LABELS.get(key, key)
+        if label not in self.headers:
+            return set()
+        index = self.headers.index(label)
+        return {str(row[index]) for row in self._existing if len(row) > index and row[index] is not None}
+
+    def _write(self, row: dict):
+        self.ws.append(self._cells(row))
+
+    def close(self):
+        self.wb.save(self.path)
+        logger.info(f'数据保存至 {self.path}')
+
+
+def open_sink(path: str, type: str = 'note', format: str = None, append: bool = False) -> Sink:
+    """
+    :param path: 输出路径，- 表示标准输出（jsonl）
+    :param format: xlsx / jsonl / csv，默认按扩展名判断
+    """
+    if path == '-':
+        return JsonlSink(path, type, append)
+    format = format or os.path.splitext(path)[1].lstrip('.').lower() or 'xlsx'
+    if format not in SINK_FORMATS:
+        raise ValueError(f'不支持的输出格式: {format}，可选 {SINK_FORMATS}')
+    return {'xlsx': XlsxSink, 'jsonl': JsonlSink, 'csv': CsvSink}[format](path, type, append)
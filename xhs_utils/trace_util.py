@@ -0,0 +1,273 @@
+"""
+请求耗时分段追踪
+默认关闭，关闭时 span() 返回共享的空上下文，几乎没有开销
+开启后记录每次接口调用的 签名 / 建连+TLS / 首字节 / 解析 / 数据转换 各阶段耗时，可以导出为：
+- Chrome trace（chrome://tracing 或 https://ui.perfetto.dev 打开，火焰图查看热点）
+- OpenTelemetry OTLP/JSON 格式
+
+开启方式：
+1. 代码中调用 enable_tracing('trace.json')
+2. 环境变量 XHS_TRACE=trace.json（XHS_TRACE_FORMAT=chrome|otel，默认chrome），进程退出时自动导出
+内存中只保留最近的 max_spans 个span（XHS_TRACE_MAX_SPANS，默认100000），长时间运行的 worker / watch 不会无限增长
+"""
+import atexit
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import deque
+
+DEFAULT_MAX_SPANS = 100000
+
+_enabled = False
+_spans = deque(maxlen=DEFAULT_MAX_SPANS)
+_dropped = 0
+_lock = threading.Lock()
+_local = threading.local()
+_pid = os.getpid()
+
+
+class Span():
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'tid')
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        stack = _stack()
+        if stack:
+            self.trace_id, self.parent_id = stack[-1].trace_id, stack[-1].span_id
+        else:
+            self.trace_id, self.parent_id = uuid.uuid4().hex, ''
+        self.tid = threading.get_ident()
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        _stack().append(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.attributes['error'] = f'{exc_type.__name__}: {exc}'
+        global _dropped
+        with _lock:
+            if len(_spans) == _spans.maxlen:
+                _dropped += 1
+            _spans.append(self)
+        return False
+
+
+class _NoopSpan():
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attributes):
+    """
+    记录一段耗时
+        with span('sign', endpoint=api):
+            ...
+    """
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def traced(name: str = None):
+    """
+    函数装饰器，整个函数调用记录为一个span
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=4096)
+def cookie_id(cookies_str: str) -> str:
+    """
+    cookie的短标识（a1 的哈希），用于区分账号又不泄露cookie
+    每个请求都会调用（指标的标签），按cookie缓存结果
+    """
+    if not cookies_str:
+        return ''
+    for item in cookies_str.replace('; ', ';').split(';'):
+        if item.startswith('a1='):
+            return hashlib.sha1(item.encode('utf-8')).hexdigest()[:8]
+    return hashlib.sha1(cookies_str.encode('utf-8')).hexdigest()[:8]
+
+
+def proxy_id(proxies: dict) -> str:
+    """
+    代理地址（去掉账号密码）
+    """
+    if not proxies:
+        return ''
+    return _proxy_id(proxies.get('https') or proxies.get('http') or '')
+
+
+@functools.lru_cache(maxsize=4096)
+def _proxy_id(proxy: str) -> str:
+    parsed = urllib.parse.urlparse(proxy)
+    return f'{parsed.hostname}:{parsed.port}' if parsed.hostname else proxy
+
+
+def _install_connect_hook():
+    """
+    包装 urllib3 的建连方法，记录 TCP 建连 + TLS 握手耗时（连接复用时不会出现）
+    """
+    try:
+        from urllib3.connection import HTTPConnection
+    except ImportError:
+        return
+    if getattr(HTTPConnection.connect, '_xhs_traced', False):
+        return
+    original = HTTPConnection.connect
+
+    def connect(self, *args, **kwargs):
+        with span('connect', host=getattr(self, 'host', ''), port=getattr(self, 'port', '')):
+            return original(self, *args, **kwargs)
+    connect._xhs_traced = True
+    HTTPConnection.connect = connect
+
+
+def enable_tracing(export_path: str = None, export_format: str = 'chrome', max_spans: int = None):
+    """
+    开启追踪
+    :param export_path: 进程退出时自动导出的文件路径，为None时需要手动调用 export_*
+    :param export_format: chrome 或 otel
+    :param max_spans: 内存中保留的span数量上限，超出时丢弃最早的，默认 XHS_TRACE_MAX_SPANS 或 100000
+    """
+    global _enabled, _spans
+    max_spans = max_spans or int(os.getenv('XHS_TRACE_MAX_SPANS') or DEFAULT_MAX_SPANS)
+    with _lock:
+        if max_spans != _spans.maxlen:
+            _spans = deque(_spans, maxlen=max_spans)
+    _enabled = True
+    _install_connect_hook()
+    if export_path:
+        atexit.register(export, export_path, export_format)
+
+
+def disable_tracing():
+    global _enabled
+    _enabled = False
+
+
+def get_spans() -> list:
+    with _lock:
+        return list(_spans)
+
+
+def dropped_spans() -> int:
+    """
+    :return: 超出上限被丢弃的span数量
+    """
+    return _dropped
+
+
+def clear():
+    global _dropped
+    with _lock:
+        _spans.clear()
+        _dropped = 0
+
+
+def export(path: str, export_format: str = 'chrome'):
+    if export_format == 'otel':
+        return export_otel_json(path)
+    return export_chrome_trace(path)
+
+
+def export_chrome_trace(path: str):
+    """
+    导出为 Chrome trace 事件格式（完整事件 ph=X，时间单位微秒）
+    """
+    events = []
+    for s in get_spans():
+        events.append({
+            'name': s.name,
+            'cat': s.name.split('.')[0],
+            'ph': 'X',
+            'ts': s.start_ns / 1000,
+            'dur': (s.end_ns - s.start_ns) / 1000,
+            'pid': _pid,
+            'tid': s.tid,
+            'args': {k: str(v) for k, v in s.attributes.items()},
+        })
+    with open(path, mode='w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'dropped_spans': _dropped}}, f, ensure_ascii=False)
+    return path
+
+
+def export_otel_json(path: str):
+    """
+    导出为 OpenTelemetry OTLP/JSON（可以被 otel-collector 的 otlpjsonfile receiver 读取）
+    """
+    spans = []
+    for s in get_spans():
+        spans.append({
+            'traceId': s.trace_id,
+            'spanId': s.span_id,
+            'parentSpanId': s.parent_id,
+            'name': s.name,
+            'kind': 3 if s.name == 'xhs.request' else 1,
+            'startTimeUnixNano': str(s.start_ns),
+            'endTimeUnixNano': str(s.end_ns),
+            'attributes': [{'key': k, 'value': {'stringValue': str(v)}} for k, v in s.attributes.items()],
+            'status': {'code': 2, 'message': s.attributes['error']} if 'error' in s.attributes else {},
+        })
+    data = {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'spider_xhs'}},
+                                    {'key': 'process.pid', 'value': {'intValue': str(_pid)}}]},
+        'scopeSpans': [{'scope': {'name': 'xhs_utils.trace_util'}, 'spans': spans}],
+    }]}
+    with open(path, mode='w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+
+if os.getenv('XHS_TRACE'):
+    enable_tracing(os.getenv('XHS_TRACE'), os.getenv('XHS_TRACE_FORMAT', 'chrome'))
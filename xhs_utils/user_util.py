@@ -0,0 +1,133 @@
+"""
+批量补全用户信息
+笔记和评论的导出只有作者的 user_id / 昵称 / 头像，粉丝数等需要再请求用户信息：
+- 从采集结果（Note / Comment 模型或 dict）或已导出的文件中收集不重复的 user_id
+- 并发请求，同一个用户只请求一次；XHS_Apis 开启了响应缓存（cache_util）时多次运行之间也不重复请求
+- 单个用户失败只记录，不影响其他用户
+
+    user_ids = collect_user_ids(comment_list)
+    users, failures = UserEnricher(xhs_apis, cookies_str, concurrency=8).run(user_ids)
+    save_to_xlsx(list(users.values()), 'users.xlsx', type='user')
+"""
+import csv
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from loguru import logger
+from xhs_utils import json_util
+from xhs_utils.model_util import User
+
+# 导出文件中用户id所在的列
+USER_ID_LABEL = '用户id'
+
+
+def user_id_of(value: str) -> str:
+    """
+    :param value: 用户id 或 用户主页链接
+    """
+    value = value.strip()
+    if '://' in value:
+        return urllib.parse.urlparse(value).path.rstrip('/').split('/')[-1]
+    return value
+
+
+def collect_user_ids(records) -> list:
+    """
+    :param records: Note / Comment / User 模型、含 user_id 字段的 dict 或 user_id 本身
+    :return: 不重复的 user_id 列表，按第一次出现的顺序
+    """
+    user_ids = {}
+    for record in records:
+        if isinstance(record, str):
+            user_id = record
+        elif isinstance(record, dict):
+            user_id = record.get('user_id')
+        else:
+            user_id = getattr(record, 'user_id', None)
+        if user_id:
+            user_ids[user_id] = None
+    return list(user_ids)
+
+
+def read_user_ids(path: str) -> list:
+    """
+    从已导出的 xlsx / csv / jsonl 文件中读取不重复的 user_id（笔记、评论、用户导出都可以）
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.jsonl':
+        records = []
+        with open(path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json_util.loads(line))
+                except (ValueError, TypeError):
+                    continue
+        return collect_user_ids(records)
+    if ext == '.csv':
+        with open(path, mode='r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+    else:
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True)
+        rows = [list(row) for row in wb.active.iter_rows(values_only=True)]
+        wb.close()
+    if not rows or USER_ID_LABEL not in rows[0]:
+        raise ValueError(f'{path} 中没有 {USER_ID_LABEL} 列')
+    index = rows[0].index(USER_ID_LABEL)
+    return list(dict.fromkeys(str(row[index]) for row in rows[1:] if len(row) > index and row[index]))
+
+
+class UserEnricher():
+    def __init__(self, xhs_apis, cookies_str: str, proxies: dict = None, concurrency: int = 8):
+        """
+        :param xhs_apis: XHS_Apis
+        :param concurrency: 同时进行的请求数
+        """
+        self.xhs_apis = xhs_apis
+        self.cookies_str = cookies_str
+        self.proxies = proxies
+        self.concurrency = max(1, concurrency)
+        self.users = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, user_id: str) -> User:
+        success, msg, res_json = self.xhs_apis.get_user_info(user_id, self.cookies_str, self.proxies)
+        if not success:
+            raise Exception(msg)
+        return User.from_raw(res_json['data'], user_id)
+
+    def iter_users(self, user_ids: list, failures: dict = None):
+        """
+        并发获取用户信息，按完成顺序产出 User，可以直接写入 sink
+        :param user_ids: 用户id列表，重复的和之前已获取的只请求一次
+        :param failures: 传入时记录失败的 {user_id: 失败原因}
+        """
+        with self._lock:
+            todo = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self.users]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._fetch, user_id): user_id for user_id in todo}
+            for future in as_completed(futures):
+                user_id = futures[future]
+                try:
+                    user = future.result()
+                except Exception as e:
+                    if failures is not None:
+                        failures[user_id] = str(e)
+                    logger.error(f'获取用户 {user_id} 信息失败: {e}')
+                    continue
+                with self._lock:
+                    self.users[user_id] = user
+                yield user
+
+    def run(self, user_ids: list):
+        """
+        :param user_ids: 用户id列表（collect_user_ids / read_user_ids 生成）
+        :return: ({user_id: User}，按 user_ids 的顺序, {user_id: 失败原因})，多次调用 run 时已获取的用户不再请求
+        """
+        failures = {}
+        for _ in self.iter_users(user_ids, failures):
+            pass
+        users = {user_id: self.users[user_id] for user_id in dict.fromkeys(user_ids) if user_id in self.users}
+        logger.info(f'{len(users)} 个用户的信息已获取，失败 {len(failures)} 个')
+        return users, failures
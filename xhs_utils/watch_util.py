@@ -0,0 +1,317 @@
+"""
+关注列表轮询
+定期重新获取一批笔记的互动数（点赞、收藏、评论、分享）和用户的关注/粉丝/获赞与收藏数，只保存变化：
+- 关注列表和时间序列存放在SQLite中，进程重启后继续
+- 每个条目有自己的轮询间隔：有变化时间隔减半（变化快的笔记更频繁），没有变化时逐渐放大，限制在 [min_interval, max_interval]
+- 新加入的条目按id的哈希把第一次轮询分散在一个间隔内，轮询时按 rate 限制每秒请求数，请求量均匀分布，不会集中爆发
+- 时间序列只在数值变化时写一行（新值和变化量），第一次轮询写入基线（变化量为空）
+- 失败按指数退避重试，不影响其他条目
+
+    watchlist = Watchlist('datas/watch.db')
+    watchlist.add('note', note_url)
+    watchlist.add('user', user_id)
+    WatchPoller(watchlist, XHS_Apis(), cookies_str, rate=2).run()
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from loguru import logger
+from xhs_utils.model_util import Note, User
+
+WATCH_KINDS = ('note', 'user')
+
+# 每种条目记录的指标（Note / User 的字段）
+METRICS = {
+    'note': ('liked_count', 'collected_count', 'comment_count', 'share_count'),
+    'user': ('follows', 'fans', 'interaction'),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    interval REAL NOT NULL,
+    next_at REAL NOT NULL,
+    last_at REAL,
+    last_values TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_watches_next ON watches (next_at);
+CREATE TABLE IF NOT EXISTS series (
+    key TEXT NOT NULL,
+    ts REAL NOT NULL,
+    metric TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    delta INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_series_key ON series (key, ts);
+"""
+
+
+@dataclass
+class Watch:
+    key: str
+    kind: str
+    target: str
+    interval: float
+    next_at: float
+    last_values: dict
+    failures: int
+
+
+def watch_key(kind: str, target: str) -> str:
+    """
+    :param target: 笔记链接，或 用户id / 用户主页链接
+    :return: 笔记id 或 用户id
+    """
+    if '://' in target:
+        return urllib.parse.urlparse(target).path.rstrip('/').split('/')[-1]
+    return target.strip()
+
+
+class Watchlist():
+    """
+    每个进程各自创建 Watchlist（sqlite连接不能跨进程共享）
+    """
+
+    def __init__(self, path: str, interval: float = 3600.0, min_interval: float = 300.0, max_interval: float = 86400.0, busy_timeout: float = 30.0):
+        """
+        :param interval: 新条目的初始轮询间隔（秒）
+        :param min_interval: 变化最快的条目的轮询间隔
+        :param max_interval: 长期不变的条目的轮询间隔
+        """
+        self.path = path
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_many(self, kind: str, targets: list, interval: float = None) -> int:
+        """
+        批量加入（一个事务），已在列表中的条目只更新链接（新的 xsec_token）
+        :param kind: note / user
+        :param targets: 笔记链接（需要带 xsec_token），或 用户id / 用户主页链接
+        :param interval: 初始轮询间隔，默认为 Watchlist 的 interval
+        :return: 新加入的数量
+        """
+        if kind not in WATCH_KINDS:
+            raise ValueError(f'未知的类型: {kind}，可选 {WATCH_KINDS}')
+        interval = min(self.max_interval, max(self.min_interval, interval or self.interval))
+        now = time.time()
+        added = 0
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for target in targets:
+                key = watch_key(kind, target)
+                # 第一次轮询按id哈希分散在一个间隔内
+                offset = zlib.crc32(key.encode('utf-8')) / 0xFFFFFFFF * interval
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO watches (key, kind, target, interval, next_at, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, kind, target, interval, now + offset, now))
+                if cursor.rowcount:
+                    added += 1
+                else:
+                    self.conn.execute('UPDATE watches SET target = ? WHERE key = ?', (target, key))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def add(self, kind: str, target: str, interval: float = None) -> str:
+        self.add_many(kind, [target], interval)
+        return watch_key(kind, target)
+
+    def remove(self, key: str):
+        self.conn.execute('DELETE FROM watches WHERE key = ?', (key,))
+
+    def due(self, limit: int, now: float = None) -> list:
+        """
+        :return: 已到轮询时间的条目，最早到期的在前
+        """
+        now = time.time() if now is None else now
+        rows = self.conn.execute(
+            'SELECT key, kind, target, interval, next_at, last_values, failures FROM watches '
+            'WHERE next_at <= ? ORDER BY next_at LIMIT ?', (now, limit)).fetchall()
+        return [Watch(row[0], row[1], row[2], row[3], row[4], json.loads(row[5]) if row[5] else {}, row[6]) for row in rows]
+
+    def next_due_at(self):
+        """
+        :return: 最早的下次轮询时间，列表为空时返回None
+        """
+        return self.conn.execute('SELECT MIN(next_at) FROM watches').fetchone()[0]
+
+    def record(self, watch: Watch, values: dict, now: float = None) -> dict:
+        """
+        保存一次轮询结果，只写入变化的指标，并调整轮询间隔
+        :param values: {指标: 数值}
+        :return: 变化的指标 {指标: 变化量}，第一次轮询时为空
+        """
+        now = time.time() if now is None else now
+        first = not watch.last_values
+        changes = {}
+        rows = []
+        for metric, value in values.items():
+            last = watch.last_values.get(metric)
+            if first or last is None:
+                rows.append((watch.key, now, metric, value, None))
+            elif value != last:
+                changes[metric] = value - last
+                rows.append((watch.key, now, metric, value, value - last))
+        if first:
+            interval = watch.interval
+        elif changes:
+            interval = max(self.min_interval, watch.interval / 2)
+        else:
+            interval = min(self.max_interval, watch.interval * 1.5)
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany('INSERT INTO series (key, ts, metric, value, delta) VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.execute(
+                'UPDATE watches SET interval = ?, next_at = ?, last_at = ?, last_values = ?, failures = 0, last_error = NULL WHERE key = ?',
+                (interval, now + interval, now, json.dumps({**watch.last_values, **values}), watch.key))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return changes
+
+    def fail(self, watch: Watch, error: str, now: float = None):
+        """
+        记录一次失败，按失败次数指数退避，最长 max_interval
+        """
+        now = time.time() if now is None else now
+        delay = min(self.max_interval, watch.interval * 2 ** watch.failures)
+        self.conn.execute('UPDATE watches SET failures = failures + 1, last_error = ?, next_at = ? WHERE key = ?',
+                          (error, now + delay, watch.key))
+
+    def series(self, key: str = None, since: float = None) -> list:
+        """
+        :param key: 笔记id / 用户id，None 为全部
+        :param since: 只返回该时间戳之后的
+        :return: [(key, ts, metric, value, delta), ...]，按 key 和时间排序
+        """
+        sql = 'SELECT key, ts, metric, value, delta FROM series WHERE 1 = 1'
+        params = []
+        if key is not None:
+            sql += ' AND key = ?'
+            params.append(key)
+        if since is not None:
+            sql += ' AND ts > ?'
+            params.append(since)
+        return self.conn.execute(sql + ' ORDER BY key, ts', params).fetchall()
+
+    def stats(self) -> dict:
+        now = time.time()
+        row = self.conn.execute(
+            'SELECT COUNT(*), SUM(next_at <= ?), SUM(failures > 0), MIN(interval), AVG(interval), MAX(interval) FROM watches',
+            (now,)).fetchone()
+        points = self.conn.execute('SELECT COUNT(*) FROM series').fetchone()[0]
+        return {'watches': row[0], 'due': row[1] or 0, 'failing': row[2] or 0, 'min_interval': row[3],
+                'avg_interval': round(row[4], 1) if row[4] else None, 'max_interval': row[5], 'points': points,
+                'polls_per_hour': round(self._polls_per_hour(), 1)}
+
+    def _polls_per_hour(self) -> float:
+        return self.conn.execute('SELECT COALESCE(SUM(3600.0 / interval), 0) FROM watches').fetchone()[0]
+
+
+class WatchPoller():
+    def __init__(self, watchlist: Watchlist, xhs_apis, cookies_str: str, proxies: dict = None, concurrency: int = 4, rate: float = 1.0):
+        """
+        :param xhs_apis: XHS_Apis，不要开启响应缓存（cache_util），否则缓存有效期内读到的是旧数据
+        :param concurrency: 同时进行的请求数
+        :param rate: 每秒最多发起的轮询数
+        """
+        self.watchlist = watchlist
+        self.xhs_apis = xhs_apis
+        self.cookies_str = cookies_str
+        self.proxies = proxies
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.stats = {'polled': 0, 'changed': 0, 'failed': 0}
+
+    def poll(self, watch: Watch) -> dict:
+        """
+        获取一个条目的当前指标，失败时抛出异常
+        :return: {指标: 数值}
+        """
+        if watch.kind == 'note':
+            success, msg, res_json = self.xhs_apis.get_note_info(watch.target, self.cookies_str, self.proxies)
+            if not success:
+                raise Exception(msg)
+            data = res_json['data']['items'][0]
+            data['url'] = watch.target
+            record = Note.from_raw(data)
+        else:
+            success, msg, res_json = self.xhs_apis.get_user_info(watch.key, self.cookies_str, self.proxies)
+            if not success:
+                raise Exception(msg)
+            record = User.from_raw(res_json['data'], watch.key)
+        return {metric: getattr(record, metric) for metric in METRICS[watch.kind]}
+
+    def run_once(self, limit: int = None, now: float = None) -> int:
+        """
+        并发轮询一批已到期的条目，结果在当前线程写入（sqlite连接不跨线程）
+        :param limit: 最多轮询的数量，默认为 concurrency
+        :return: 本次轮询的数量
+        """
+        watches = self.watchlist.due(limit or self.concurrency, now)
+        if not watches:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(watches))) as pool:
+            futures = [(watch, pool.submit(self.poll, watch)) for watch in watches]
+            for watch, future in futures:
+                try:
+                    values = future.result()
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    self.watchlist.fail(watch, str(e))
+                    logger.warning(f'轮询 {watch.kind} {watch.key} 失败: {e}')
+                    continue
+                self.stats['polled'] += 1
+                changes = self.watchlist.record(watch, values)
+                if changes:
+                    self.stats['changed'] += 1
+                    logger.info(f'{watch.kind} {watch.key} 变化: {changes}')
+        return len(watches)
+
+    def run(self, stop_event: threading.Event = None, exit_when_idle: bool = False, max_sleep: float = 5.0):
+        """
+        持续轮询，每批之间按 rate 等待，请求量均匀分布
+        :param stop_event: 设置后在当前批次结束时退出
+        :param exit_when_idle: 没有已到期的条目时退出（用于定时任务每次跑一轮）
+        :param max_sleep: 空闲时最长等待时间（秒），新加入的条目最迟在这之后被发现
+        """
+        stop_event = stop_event or threading.Event()
+        batch = max(1, min(self.concurrency, int(self.rate) or 1))
+        while not stop_event.is_set():
+            start = time.monotonic()
+            count = self.run_once(batch)
+            if count == 0:
+                if exit_when_idle:
+                    break
+                next_at = self.watchlist.next_due_at()
+                wait = max_sleep if next_at is None else min(max_sleep, max(0.0, next_at - time.time()))
+            else:
+                wait = count / self.rate - (time.monotonic() - start) if self.rate > 0 else 0
+            if wait > 0:
+                stop_event.wait(wait)
+        logger.info(f'轮询结束: {self.stats}')
+        return self.stats
@@ -1,15 +1,10 @@
 import json
 
-import execjs
-
-try:
-    js = execjs.compile(open(r'../static/xhs_creator_xs.js', 'r', encoding='utf-8').read())
-except:
-    js = execjs.compile(open(r'static/xhs_creator_xs.js', 'r', encoding='utf-8').read())
+from xhs_utils.xhs_util import load_js
 
 
 def generate_xs(a1, api, data=''):
-    ret = js.call('get_request_headers_params', api, data, a1)
+    ret = load_js('xhs_creator_xs.js').call('get_request_headers_params', api, data, a1)
     xs, xt = ret['xs'], ret['xt']
     if data:
         data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
@@ -1,18 +1,23 @@
+import functools
 import json
 import math
+import os
 import random
-import execjs
 from xhs_utils.cookie_util import trans_cookies
 
-try:
-    js = execjs.compile(open(r'../static/xhs_xs_xsc_56.js', 'r', encoding='utf-8').read())
-except:
-    js = execjs.compile(open(r'static/xhs_xs_xsc_56.js', 'r', encoding='utf-8').read())
+# 相对包所在目录查找，不依赖运行时的工作目录
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
 
-try:
-    xray_js = execjs.compile(open(r'../static/xhs_xray.js', 'r', encoding='utf-8').read())
-except:
-    xray_js = execjs.compile(open(r'static/xhs_xray.js', 'r', encoding='utf-8').read())
+
+@functools.lru_cache(maxsize=None)
+def load_js(name: str):
+    """
+    第一次签名时才编译JS，只导入模块（如 --help、worker 主进程）不付出这部分开销
+    :param name: static 目录下的文件名
+    """
+    import execjs
+    with open(os.path.join(STATIC_DIR, name), 'r', encoding='utf-8') as f:
+        return execjs.compile(f.read())
 
 def generate_x_b3_traceid(len=16):
     x_b3_traceid = ""
@@ -21,17 +26,17 @@ def generate_x_b3_traceid(len=16):
     return x_b3_traceid
 
 def generate_xs_xs_common(a1, api, data='', method='POST'):
-    ret = js.call('get_request_headers_params', api, data, a1, method)
+    ret = load_js('xhs_xs_xsc_56.js').call('get_request_headers_params', api, data, a1, method)
     xs, xt, xs_common = ret['xs'], ret['xt'], ret['xs_common']
     return xs, xt, xs_common
 
 def generate_xs(a1, api, data=''):
-    ret = js.call('get_xs', api, data, a1)
+    ret = load_js('xhs_xs_xsc_56.js').call('get_xs', api, data, a1)
     xs, xt = ret['X-s'], ret['X-t']
     return xs, xt
 
 def generate_xray_traceid():
-    return xray_js.call('traceId')
+    return load_js('xhs_xray.js').call('traceId')
 def get_common_headers():
     return {
         "authority": "www.xiaohongshu.com",